@@ -0,0 +1,232 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+DOCUMENTATION = r"""
+    name: launchdarkly_perf
+    type: aggregate
+    short_description: Summarize LaunchDarkly API usage for a playbook run
+    version_added: "0.4.0"
+    description:
+        - Collects the C(perf) statistics returned by LaunchDarkly tasks run with C(debug_timing), and prints a summary at the end of the playbook run.
+        - The summary has the calls, latency percentiles and rate limited responses for each API endpoint, the total time spent waiting for rate limits, and the slowest tasks.
+        - Set the C(LAUNCHDARKLY_DEBUG_TIMING) environment variable to turn on C(debug_timing) for every LaunchDarkly task.
+    requirements:
+        - Enable the callback with C(callbacks_enabled) in C(ansible.cfg), or the C(ANSIBLE_CALLBACKS_ENABLED) environment variable.
+    options:
+        output_path:
+            description:
+                - Also write the summary as JSON to this file, for tracking API usage across runs.
+            type: path
+            env:
+                - name: LAUNCHDARKLY_PERF_OUTPUT
+            ini:
+                - section: callback_launchdarkly_perf
+                  key: output_path
+        slowest:
+            description:
+                - Number of slowest tasks to include in the summary.
+            type: int
+            default: 10
+            env:
+                - name: LAUNCHDARKLY_PERF_SLOWEST
+            ini:
+                - section: callback_launchdarkly_perf
+                  key: slowest
+"""
+
+import json
+import os
+import time
+
+from ansible.module_utils._text import to_native
+from ansible.plugins.callback import CallbackBase
+
+COUNTERS = ("calls", "errors", "retries", "rate_limited", "bytes", "seconds")
+
+
+def _percentile(histogram, buckets, max_seconds, q):
+    # Estimates a latency percentile from histogram bucket counts, assuming
+    # calls are spread evenly inside a bucket.
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    target = q * total
+    seen = 0
+    for idx, count in enumerate(histogram):
+        if count and seen + count >= target:
+            lower = buckets[idx - 1] if idx else 0.0
+            upper = buckets[idx] if idx < len(buckets) else max_seconds
+            estimate = lower + (upper - lower) * (target - seen) / count
+            return round(min(estimate, max_seconds), 6)
+        seen += count
+    return round(max_seconds, 6)
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "launchdarkly_labs.collection.launchdarkly_perf"
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, display=None):
+        super(CallbackModule, self).__init__(display=display)
+        self.starts = {}
+        self.tasks = []
+        self.endpoints = {}
+        self.buckets = None
+        self.rate_limit_sleeps = 0
+        self.rate_limit_seconds = 0.0
+
+    def v2_runner_on_start(self, host, task):
+        self.starts[(host.get_name(), task._uuid)] = time.time()
+
+    def v2_runner_on_ok(self, result):
+        self._record(result, False)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result, True)
+
+    def _record(self, result, failed):
+        host = result._host.get_name()
+        start = self.starts.pop((host, result._task._uuid), None)
+        res = result._result
+        perfs = [res["perf"]] if isinstance(res.get("perf"), dict) else []
+        # Loops return one result per item.
+        for item in res.get("results") or []:
+            if isinstance(item, dict) and isinstance(item.get("perf"), dict):
+                perfs.append(item["perf"])
+        if not perfs:
+            return
+
+        for perf in perfs:
+            self._merge(perf)
+        if start:
+            seconds = time.time() - start
+        else:
+            seconds = sum(p.get("elapsed", 0) for p in perfs)
+        self.tasks.append(
+            dict(
+                task=result._task.get_name(),
+                action=result._task.action,
+                host=host,
+                failed=failed,
+                seconds=round(seconds, 6),
+                api_calls=sum(p.get("api_calls", 0) for p in perfs),
+                api_seconds=round(sum(p.get("api_seconds", 0) for p in perfs), 6),
+                rate_limited=sum(p.get("rate_limited", 0) for p in perfs),
+                rate_limit_seconds=round(
+                    sum(p.get("rate_limit_seconds", 0) for p in perfs), 6
+                ),
+            )
+        )
+
+    def _merge(self, perf):
+        self.rate_limit_sleeps += perf.get("rate_limit_sleeps", 0)
+        self.rate_limit_seconds += perf.get("rate_limit_seconds", 0)
+        buckets = perf.get("latency_buckets")
+        if self.buckets is None:
+            self.buckets = buckets
+        for endpoint, stats in (perf.get("endpoints") or {}).items():
+            merged = self.endpoints.get(endpoint)
+            if merged is None:
+                merged = self.endpoints[endpoint] = dict(
+                    (k, 0) for k in COUNTERS + ("max_seconds",)
+                )
+                merged["histogram"] = [0] * (len(self.buckets or []) + 1)
+            for key in COUNTERS:
+                merged[key] += stats.get(key, 0)
+            merged["max_seconds"] = max(merged["max_seconds"], stats["max_seconds"])
+            # Histograms from a collection version with other buckets are
+            # left out of the percentiles.
+            if buckets == self.buckets:
+                merged["histogram"] = [
+                    a + b for a, b in zip(merged["histogram"], stats["histogram"])
+                ]
+
+    def _latency(self, histogram, max_seconds):
+        return dict(
+            p50=_percentile(histogram, self.buckets, max_seconds, 0.5),
+            p95=_percentile(histogram, self.buckets, max_seconds, 0.95),
+            max=round(max_seconds, 6),
+        )
+
+    def summary(self):
+        endpoints = {}
+        histogram = [0] * (len(self.buckets or []) + 1)
+        for endpoint, stats in self.endpoints.items():
+            summary = dict((k, stats[k]) for k in COUNTERS)
+            summary["seconds"] = round(summary["seconds"], 6)
+            summary.update(self._latency(stats["histogram"], stats["max_seconds"]))
+            endpoints[endpoint] = summary
+            histogram = [a + b for a, b in zip(histogram, stats["histogram"])]
+        max_seconds = max([s["max_seconds"] for s in self.endpoints.values()] or [0])
+        slowest = sorted(self.tasks, key=lambda t: t["seconds"], reverse=True)
+        return dict(
+            tasks=len(self.tasks),
+            api_calls=sum(s["calls"] for s in endpoints.values()),
+            api_seconds=round(sum(s["seconds"] for s in endpoints.values()), 6),
+            bytes=sum(s["bytes"] for s in endpoints.values()),
+            rate_limited=sum(s["rate_limited"] for s in endpoints.values()),
+            rate_limit_sleeps=self.rate_limit_sleeps,
+            rate_limit_seconds=round(self.rate_limit_seconds, 6),
+            latency=self._latency(histogram, max_seconds),
+            endpoints=endpoints,
+            slowest_tasks=slowest[: self.get_option("slowest")],
+        )
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.tasks:
+            return
+        summary = self.summary()
+
+        self._display.banner("LAUNCHDARKLY API SUMMARY")
+        self._display.display(
+            "%d tasks, %d API calls in %.2fs, p50 %.3fs, p95 %.3fs, "
+            "%d rate limited, %.2fs waiting for rate limits"
+            % (
+                summary["tasks"],
+                summary["api_calls"],
+                summary["api_seconds"],
+                summary["latency"]["p50"],
+                summary["latency"]["p95"],
+                summary["rate_limited"],
+                summary["rate_limit_seconds"],
+            )
+        )
+        width = max(len(e) for e in summary["endpoints"]) if summary["endpoints"] else 0
+        for endpoint, stats in sorted(
+            summary["endpoints"].items(), key=lambda e: e[1]["seconds"], reverse=True
+        ):
+            self._display.display(
+                "%s  calls=%d  p50=%.3fs  p95=%.3fs  max=%.3fs  429s=%d  errors=%d"
+                % (
+                    endpoint.ljust(width),
+                    stats["calls"],
+                    stats["p50"],
+                    stats["p95"],
+                    stats["max"],
+                    stats["rate_limited"],
+                    stats["errors"],
+                )
+            )
+        self._display.display("Slowest tasks:")
+        for task in summary["slowest_tasks"]:
+            self._display.display(
+                "  %.2fs  %s (%s, %d API calls)"
+                % (task["seconds"], task["task"], task["host"], task["api_calls"])
+            )
+
+        path = self.get_option("output_path")
+        if path:
+            try:
+                directory = os.path.dirname(os.path.abspath(path))
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                with open(path, "w") as f:
+                    json.dump(summary, f, indent=2, sort_keys=True)
+            except (IOError, OSError) as e:
+                self._display.warning(
+                    "Unable to write LaunchDarkly API summary to %s: %s"
+                    % (path, to_native(e))
+                )
@@ -7,4 +7,12 @@ class ModuleDocFragment(object):
                 - LaunchDarkly API access token. May be set as C(LAUNCHDARKLY_ACCESS_TOKEN) environment variable.
             type: str
             required: yes
+        debug_timing:
+            description:
+                - Record every LaunchDarkly API call made by the task and return the statistics as C(perf).
+                - C(perf) has the call count, bytes received, latency histogram, and number of rate limited responses for each endpoint, and the time spent waiting for rate limits to reset.
+                - May be set as C(LAUNCHDARKLY_DEBUG_TIMING) environment variable. The C(launchdarkly_labs.collection.launchdarkly_perf) callback summarizes C(perf) for a whole play.
+            type: bool
+            required: no
+            default: no
     """
@@ -24,4 +24,19 @@ class ModuleDocFragment(object):
                     type: str
                     required: no
                     default: launchdarkly
+                backend:
+                    description:
+                        - How to evaluate the policy. C(conftest) runs the Conftest binary, C(python) evaluates the policy in-process without Conftest.
+                        - The C(python) backend supports the common subset of Rego used for C(deny) and C(violation) rules, but not C(with), C(else) or object comprehensions.
+                    type: str
+                    required: no
+                    choices: [ conftest, python ]
+                    default: conftest
+                cache_dir:
+                    description:
+                        - Directory used by the C(python) backend to cache parsed policies. Entries are keyed by a hash of the policy files and the namespace, so a policy is only parsed again after a C(.rego) file changes.
+                        - Defaults to C(~/.ansible/launchdarkly/policy_cache) on the managed host. Set to an empty string to disable the cache.
+                    type: path
+                    required: no
+                    default: ~/.ansible/launchdarkly/policy_cache
     """
@@ -2,6 +2,7 @@ from ansible.plugins.lookup import LookupBase
 from ansible.errors import AnsibleError
 import os
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
 )
 
@@ -20,9 +21,7 @@ class LookupModule(LookupBase):
             api_key = os.environ.get("LAUNCHDARKLY_ACCESS_TOKEN", api_key)
             configuration = configure_instance(api_key)
 
-            api_instance = launchdarkly_api.EnvironmentsApi(
-                launchdarkly_api.ApiClient(configuration)
-            )
+            api_instance = launchdarkly_api.EnvironmentsApi(api_client(configuration))
         except Exception as e:
             raise AnsibleError("Error starting LaunchDarkly SDK: %s" % e)
 
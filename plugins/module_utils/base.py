@@ -1,21 +1,66 @@
+import functools
 import launchdarkly_api
+import os
+import shutil
+import sys
+import tempfile
+import threading
 import time
-from ansible.module_utils._text import to_native
+from ansible.module_utils._text import to_native, to_text
 from ansible.errors import AnsibleError, AnsibleAuthenticationFailure
 from ansible.module_utils.common._json_compat import json
 from ansible.module_utils.basic import env_fallback
-from collections import MutableMapping
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils import (
+    json_codec,
+    trace,
+)
 
 VERSION = "0.3.4"
 
+# Parsed policies by directory and namespace, reused for every check in the
+# same run.
+_POLICIES = {}
+
+# API call statistics, set by debug_timing for the rest of the run.
+_TIMING = None
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def base_uri():
+    # LAUNCHDARKLY_BASE_URI points every request at another server, such as
+    # the mock server used by the benchmarks in tests/perf.
+    return os.environ.get(
+        "LAUNCHDARKLY_BASE_URI", "https://app.launchdarkly.com"
+    ).rstrip("/")
+
+
+def stream_uri():
+    return os.environ.get(
+        "LAUNCHDARKLY_STREAM_URI", "https://stream.launchdarkly.com"
+    ).rstrip("/")
+
 
 def configure_instance(api_key):
     configuration = launchdarkly_api.Configuration()
+    configuration.host = base_uri() + "/api/v2"
     configuration.api_key["Authorization"] = api_key
     configuration.user_agent = "launchdarkly-ansible-collection/%s" % VERSION
+    json_codec.install()
     return configuration
 
 
+def api_client(configuration):
+    # Asks for gzip responses, which urllib3 decompresses as they are read.
+    # Flag listings are large and repetitive, so this cuts transfer time.
+    # The generated client also ignores configuration.user_agent.
+    client = launchdarkly_api.ApiClient(configuration)
+    client.user_agent = configuration.user_agent
+    client.set_default_header("Accept-Encoding", "gzip")
+    return client
+
+
 def _patch_path(env, op):
     return "/environments/" + env + "/" + op
 
@@ -28,25 +73,38 @@ def _build_comment(module):
     return comment
 
 
+class PatchOp(dict):
+    # A JSON patch operation, used in place of launchdarkly_api.PatchOperation.
+    # It is already the dict the API client sends and modules return, so
+    # building one skips the model's validation, and sending or returning it
+    # needs no conversion. Like PatchOperation, a None value is left out.
+    __slots__ = ()
+
+    def __init__(self, op=None, path=None, value=None):
+        # Ansible copies returned mappings by calling their type with no
+        # arguments, so an empty PatchOp has to be possible.
+        if op is not None:
+            dict.__init__(self, op=op, path=path)
+        if value is not None:
+            self["value"] = value
+
+
 def _patch_op(op, path, value):
-    return launchdarkly_api.PatchOperation(op=op, path=path, value=value)
+    return PatchOp(op, path, value)
 
 
 def parse_env_param(module, param_name, key=None):
     if key is None:
         key = launchdarkly_api.Environment.attribute_map[param_name]
     path = "/" + key
-    return launchdarkly_api.PatchOperation(
-        path=path, op="replace", value=module[param_name]
-    )
+    return PatchOp("replace", path, module[param_name])
 
 
 def parse_user_param(module, param_name, key=None):
     if key is None:
         key = launchdarkly_api.UserSegment.attribute_map[param_name]
     path = "/" + key
-    patch = dict(path=path, op="replace", value=module[param_name])
-    return launchdarkly_api.PatchOperation(**patch)
+    return PatchOp("replace", path, module[param_name])
 
 
 def reset_rate(reset_time):
@@ -54,6 +112,305 @@ def reset_rate(reset_time):
     return int((float(reset_time) - current + 1000.0) / 1000.0)
 
 
+def rate_limit_sleep(seconds):
+    # Waits out a 429 response, counting the wait when debug_timing is on.
+    if _TIMING is not None:
+        _TIMING.sleep(seconds)
+    with trace.span("rate limit wait", "rate_limit", seconds=seconds):
+        time.sleep(seconds)
+
+
+class _Timing(object):
+    def __init__(self):
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.endpoints = {}
+        self.rate_limit_sleeps = 0
+        self.rate_limit_seconds = 0.0
+
+    def record(self, endpoint, status, seconds, size, retried=()):
+        with self.lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = dict(
+                    calls=0,
+                    errors=0,
+                    retries=0,
+                    rate_limited=0,
+                    bytes=0,
+                    seconds=0.0,
+                    max_seconds=0.0,
+                    histogram=[0] * (len(LATENCY_BUCKETS) + 1),
+                )
+            stats["calls"] += 1
+            stats["bytes"] += size
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            # Responses urllib3 retried before returning this one.
+            stats["retries"] += len(retried)
+            stats["rate_limited"] += sum(1 for code in retried if code == 429)
+            if status == 429:
+                stats["rate_limited"] += 1
+            elif not 200 <= status < 400:
+                stats["errors"] += 1
+            bucket = 0
+            while bucket < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[bucket]:
+                bucket += 1
+            stats["histogram"][bucket] += 1
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.rate_limit_sleeps += 1
+            self.rate_limit_seconds += max(seconds, 0)
+
+    def result(self):
+        with self.lock:
+            endpoints = {}
+            for endpoint, stats in self.endpoints.items():
+                stats = dict(stats, seconds=round(stats["seconds"], 6))
+                stats["max_seconds"] = round(stats["max_seconds"], 6)
+                endpoints[endpoint] = stats
+            return dict(
+                elapsed=round(time.time() - self.start, 6),
+                api_calls=sum(s["calls"] for s in endpoints.values()),
+                api_seconds=round(sum(s["seconds"] for s in endpoints.values()), 6),
+                bytes=sum(s["bytes"] for s in endpoints.values()),
+                rate_limited=sum(s["rate_limited"] for s in endpoints.values()),
+                rate_limit_sleeps=self.rate_limit_sleeps,
+                rate_limit_seconds=round(self.rate_limit_seconds, 6),
+                latency_buckets=list(LATENCY_BUCKETS),
+                endpoints=endpoints,
+            )
+
+
+def _instrument_api_client():
+    # call_api knows the endpoint template, request sees the HTTP exchange.
+    client = launchdarkly_api.ApiClient
+    if getattr(client, "_ld_instrumented", False):
+        return
+    call_api = client.call_api
+    request = client.request
+
+    def timed_call_api(self, resource_path, method, *args, **kwargs):
+        endpoint = "%s %s" % (method, resource_path)
+        if _TIMING is not None:
+            _TIMING.local.endpoint = endpoint
+        # The span covers serialization and deserialization around the
+        # request span.
+        with trace.span(endpoint, "api"):
+            return call_api(self, resource_path, method, *args, **kwargs)
+
+    def timed_request(self, method, url, *args, **kwargs):
+        timing = _TIMING
+        if timing is None and not trace.active():
+            return request(self, method, url, *args, **kwargs)
+        endpoint = "%s %s" % (method, url)
+        if timing is not None:
+            endpoint = getattr(timing.local, "endpoint", None) or endpoint
+            timing.local.endpoint = None
+        start = time.time()
+        with trace.span("HTTP " + method, "network", url=url) as span:
+            try:
+                response = request(self, method, url, *args, **kwargs)
+            except launchdarkly_api.rest.ApiException as e:
+                span["status"] = e.status
+                if timing is not None:
+                    timing.record(
+                        endpoint, e.status, time.time() - start, len(e.body or "")
+                    )
+                raise
+            raw = getattr(response, "urllib3_response", response)
+            if kwargs.get("_preload_content", True):
+                # Bytes on the wire, before any gzip decompression.
+                size = raw.tell() or len(response.data or "")
+            else:
+                size = int(response.getheader("Content-Length") or 0)
+            retries = raw.retries
+            retried = [h.status for h in retries.history] if retries else []
+            span.update(status=response.status, bytes=size)
+            if retried:
+                span["retried"] = retried
+        if timing is not None:
+            timing.record(endpoint, response.status, time.time() - start, size, retried)
+        return response
+
+    client.call_api = timed_call_api
+    client.request = timed_request
+    client._ld_instrumented = True
+
+
+def debug_timing(module):
+    # With the debug_timing option, records every API call made by the
+    # module and returns the statistics under "perf" in the module result.
+    global _TIMING
+    if not module.params.get("debug_timing"):
+        return None
+    _TIMING = _Timing()
+    _instrument_api_client()
+    timing = _TIMING
+
+    def add_perf(respond):
+        def wrapper(**kwargs):
+            kwargs["perf"] = timing.result()
+            respond(**kwargs)
+
+        return wrapper
+
+    module.exit_json = add_perf(module.exit_json)
+    module.fail_json = add_perf(module.fail_json)
+    return timing
+
+
+# Converters from decoded JSON to to_dict() output, by swagger type name.
+_CONVERTERS = {}
+
+
+def _identity(value):
+    return value
+
+
+def _converter(type_name):
+    # Builds, once per type, a function renaming the camelCase keys of
+    # decoded JSON to the attribute names of the generated model, with the
+    # same result as deserializing the model and calling to_dict().
+    conv = _CONVERTERS.get(type_name)
+    if conv is not None:
+        return conv
+    if type_name.startswith("list["):
+        item = _converter(type_name[5:-1])
+        if item is _identity:
+            conv = _identity
+        else:
+
+            def conv(value):
+                if value is None:
+                    return None
+                return [item(v) for v in value]
+
+    elif type_name.startswith("dict("):
+        item = _converter(type_name[5:-1].split(", ", 1)[1])
+        if item is _identity:
+            conv = _identity
+        else:
+
+            def conv(value):
+                if value is None:
+                    return None
+                return dict((k, item(v)) for k, v in value.items())
+
+    else:
+        klass = getattr(launchdarkly_api.models, type_name, None)
+        if klass is None or not klass.swagger_types:
+            conv = _identity
+        else:
+            plain = []
+            nested = []
+
+            def conv(value):
+                if value is None:
+                    return None
+                if not isinstance(value, dict):
+                    value = {}
+                result = dict((attr, value.get(key)) for attr, key in plain)
+                for attr, key, convert in nested:
+                    result[attr] = convert(value.get(key))
+                return result
+
+            # Registered before the fields are resolved, for recursive types.
+            _CONVERTERS[type_name] = conv
+            for attr, attr_type in klass.swagger_types.items():
+                convert = _converter(attr_type)
+                if convert is _identity:
+                    plain.append((attr, klass.attribute_map[attr]))
+                else:
+                    nested.append((attr, klass.attribute_map[attr], convert))
+    _CONVERTERS[type_name] = conv
+    return conv
+
+
+def _read_body(response, chunk_size=65536):
+    # Reads an unloaded urllib3 response in chunks, so a gzip body is
+    # decompressed as it arrives rather than after the whole download.
+    try:
+        return b"".join(response.stream(chunk_size))
+    finally:
+        response.release_conn()
+
+
+def fetch_json(method, response_type, *args, **kwargs):
+    # Calls a generated API method and decodes the response body into plain
+    # dicts, without building the model objects. With a response_type, the
+    # result has the snake_case keys of the model's to_dict(); with None it
+    # is the JSON as returned by the API.
+    kwargs["_preload_content"] = False
+    try:
+        response = method(*args, **kwargs)
+    except launchdarkly_api.rest.ApiException as e:
+        # The body of an unread response is bytes, fail_exit expects text.
+        if isinstance(e.body, bytes):
+            e.body = to_text(e.body, errors="surrogate_or_strict")
+        raise
+    with trace.span("read body", "network"):
+        body = _read_body(response)
+    with trace.span("decode", "decode", type=response_type):
+        data = json_codec.loads(body)
+        if response_type is None:
+            return data
+        return _converter(response_type)(data)
+
+
+def model_dict(response_type, data):
+    # Converts JSON decoded with fetch_json(method, None) to the dict the
+    # model's to_dict() would return.
+    return _converter(response_type)(data)
+
+
+def rate_limited_call(method, *args, **kwargs):
+    # Calls a generated API method, waiting out 429 responses until it
+    # succeeds. Other errors are raised.
+    while True:
+        try:
+            return method(*args, **kwargs)
+        except launchdarkly_api.rest.ApiException as e:
+            if e.status != 429:
+                raise
+            reset = e.headers.get("X-RateLimit-Reset") if e.headers else None
+            rate_limit_sleep(max(reset_rate(reset), 1) if reset else 1)
+
+
+def fetch_flag_pages(
+    api_instance, project_key, page_size=100, response_type="FeatureFlags", **params
+):
+    # Yields the flags of a project one page at a time, waiting out rate
+    # limits. With response_type None, the flags are the JSON returned by the
+    # API, as with fetch_json.
+    offset = 0
+    while True:
+        try:
+            response = fetch_json(
+                api_instance.get_feature_flags,
+                response_type,
+                project_key,
+                limit=page_size,
+                offset=offset,
+                **params
+            )
+        except launchdarkly_api.rest.ApiException as e:
+            if e.status == 429:
+                reset = e.headers.get("X-RateLimit-Reset") if e.headers else None
+                rate_limit_sleep(max(reset_rate(reset), 1) if reset else 1)
+                continue
+            raise
+        items = response["items"]
+        if items:
+            yield items
+        offset += len(items)
+        total = response.get("total_count" if response_type else "totalCount")
+        if len(items) < page_size or (total is not None and offset >= total):
+            return
+
+
 def fail_exit(module, e):
     if e.reason == "Unauthorized":
         raise AnsibleAuthenticationFailure(to_native(e.reason))
@@ -64,6 +421,99 @@ def fail_exit(module, e):
         return module.exit_json(failed=True, msg=to_native(e.reason))
 
 
+def _module_name(main):
+    # AnsiballZ runs the module with runpy, so __spec__ has its real name.
+    spec = main.__globals__.get("__spec__")
+    if spec is not None and spec.name != "__main__":
+        return spec.name.rsplit(".", 1)[-1]
+    path = main.__globals__.get("__file__") or sys.argv[0] or "module"
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _start_profile():
+    import cProfile
+
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler, tracemalloc
+
+
+def _write_profile(directory, name, profiler, tracemalloc):
+    import pstats
+
+    profiler.disable()
+    memory = None
+    if tracemalloc is not None:
+        current, peak = tracemalloc.get_traced_memory()
+        memory = (current, peak, tracemalloc.take_snapshot())
+        tracemalloc.stop()
+
+    top = int(os.environ.get("LAUNCHDARKLY_PROFILE_TOP", 30))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    base = os.path.join(
+        directory, "%s-%s-%d" % (name, time.strftime("%Y%m%dT%H%M%S"), os.getpid())
+    )
+    profiler.dump_stats(base + ".prof")
+    with open(base + ".txt", "w") as f:
+        stats = pstats.Stats(profiler, stream=f)
+        stats.sort_stats("cumulative").print_stats(top)
+        stats.sort_stats("tottime").print_stats(top)
+        if memory is not None:
+            current, peak, snapshot = memory
+            f.write(
+                "Memory: %.1f KiB at exit, %.1f KiB peak\n\n"
+                % (current / 1024.0, peak / 1024.0)
+            )
+            f.write("Top %d allocations by line:\n" % top)
+            for stat in snapshot.statistics("lineno")[:top]:
+                f.write("%s\n" % stat)
+
+
+def profile_main(main):
+    # With LAUNCHDARKLY_PROFILE_DIR set, runs the module under cProfile and
+    # tracemalloc and writes <module>-<time>-<pid>.prof (pstats) and .txt
+    # (top functions and allocations) to that directory on the managed host.
+    # With LAUNCHDARKLY_TRACE_DIR set, writes <module>-<time>-<pid>.trace.json
+    # with spans for the run, API calls, rate limit waits, diffs and policy
+    # checks, in the Chrome trace event format.
+    @functools.wraps(main)
+    def wrapper():
+        profile_dir = os.environ.get("LAUNCHDARKLY_PROFILE_DIR")
+        trace_dir = os.environ.get("LAUNCHDARKLY_TRACE_DIR")
+        if not profile_dir and not trace_dir:
+            return main()
+
+        name = _module_name(main)
+        if trace_dir:
+            trace.start(name)
+            _instrument_api_client()
+        profile = _start_profile() if profile_dir else None
+        try:
+            with trace.span(name, "module"):
+                return main()
+        finally:
+            # exit_json raises SystemExit, so this also runs after the result
+            # has been written.
+            try:
+                if profile is not None:
+                    _write_profile(os.path.expanduser(profile_dir), name, *profile)
+                tracer = trace.stop()
+                if tracer is not None:
+                    tracer.write(os.path.expanduser(trace_dir))
+            except (IOError, OSError) as e:
+                sys.stderr.write("Unable to write profile: %s\n" % to_native(e))
+
+    return wrapper
+
+
 def ld_common_argument_spec():
     return dict(
         api_key=dict(
@@ -72,6 +522,11 @@ def ld_common_argument_spec():
             no_log=True,
             fallback=(env_fallback, ["LAUNCHDARKLY_ACCESS_TOKEN"]),
         ),
+        debug_timing=dict(
+            type="bool",
+            default=False,
+            fallback=(env_fallback, ["LAUNCHDARKLY_DEBUG_TIMING"]),
+        ),
         conftest=dict(
             type="dict",
             apply_defaults=True,
@@ -79,33 +534,113 @@ def ld_common_argument_spec():
                 dir=dict(type="str", default="policy"),
                 namespace=dict(type="str", default="launchdarkly"),
                 enabled=dict(type="bool", default=False),
+                backend=dict(
+                    type="str", default="conftest", choices=["conftest", "python"]
+                ),
+                cache_dir=dict(
+                    type="path", default="~/.ansible/launchdarkly/policy_cache"
+                ),
             ),
         ),
     )
 
 
 def rego_test(module, validate):
-    try:
-        from policykit import Conftest
-    except ImportError:
-        module.fail_json(
-            msg=missing_required_lib("policykit"), exception=traceback.format_exc()
+    return rego_test_batch(module, [validate])[0]
+
+
+@trace.traced("load policy", "policy")
+def _load_policy(module):
+    # The evaluator is only imported when the python backend is used.
+    from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.rego import (
+        RegoError,
+        load_policy,
+    )
+
+    path = os.path.abspath(module.params["conftest"]["dir"])
+    namespace = module.params["conftest"]["namespace"]
+    if (path, namespace) not in _POLICIES:
+        cache_dir = module.params["conftest"]["cache_dir"]
+        try:
+            _POLICIES[path, namespace] = load_policy(
+                path,
+                namespace=namespace,
+                cache_dir=os.path.expanduser(cache_dir) if cache_dir else None,
+            )
+        except (RegoError, IOError, OSError) as e:
+            raise AnsibleError("Unable to load policy: %s" % to_native(e))
+    return _POLICIES[path, namespace]
+
+
+@trace.traced("policy check", "policy")
+def rego_test_batch(module, documents, chunk_size=1000):
+    # Returns one list of failure messages per document.
+    if module.params["conftest"]["backend"] == "python":
+        from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.rego import (
+            RegoError,
         )
+
+        policy = _load_policy(module)
+        namespace = module.params["conftest"]["namespace"]
+        try:
+            return [policy.failures(doc, namespace) for doc in documents]
+        except RegoError as e:
+            raise AnsibleError("Policy evaluation failed: %s" % to_native(e))
+
+    # Each document gets its own file so conftest reports results per file,
+    # which map back to the document position.
+    conftest = module.get_bin_path("conftest", required=True)
+    failures = [[] for _ in documents]
+    tmpdir = tempfile.mkdtemp(prefix="ld-conftest-")
     try:
-        run = Conftest(module.params["conftest"]["dir"]).test(
-            namespace=module.params["conftest"]["namespace"], json_input=validate
-        )
-    except Exception as e:
-        raise AnsibleError(e)
+        for start in range(0, len(documents), chunk_size):
+            files = {}
+            for idx in range(start, min(start + chunk_size, len(documents))):
+                path = os.path.join(tmpdir, "%d.json" % idx)
+                with open(path, "wb") as f:
+                    f.write(json_codec.dumps_bytes(documents[idx]))
+                files[os.path.basename(path)] = idx
+
+            cmd = [
+                conftest,
+                "test",
+                "--no-color",
+                "--output",
+                "json",
+                "--policy",
+                module.params["conftest"]["dir"],
+                "--namespace",
+                module.params["conftest"]["namespace"],
+            ]
+            cmd.extend(os.path.join(tmpdir, name) for name in sorted(files))
+            rc, out, err = module.run_command(cmd)
+            # conftest exits 1 when a policy fails, anything else is an error
+            if rc not in (0, 1):
+                raise AnsibleError("conftest failed: %s" % to_native(err or out))
+            try:
+                results = json_codec.loads(out)
+            except ValueError:
+                raise AnsibleError("Unable to parse conftest output: %s" % out)
+
+            for result in results:
+                idx = files.get(os.path.basename(result["filename"]))
+                if idx is None:
+                    continue
+                for failure in result.get("failures") or []:
+                    if isinstance(failure, dict):
+                        failure = failure["msg"]
+                    failures[idx].append(failure)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
 
-    return run
+    return failures
 
 
 def validate_params(module):
-    keys = ["api_key", "state"]
+    keys = ["api_key", "state", "debug_timing"]
 
     check_params = dict((k, module.params[k]) for k in module.params if k not in keys)
-    result = rego_test(module, check_params)
+    failures = rego_test(module, check_params)
 
-    if result.results[0].failures:
-        module.exit_json(failed=True, validation=result.results[0].failures)
+    if failures:
+        module.exit_json(failed=True, validation=failures)
@@ -0,0 +1,443 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+# Local evaluation of server-side flag data (the flags and segments returned by
+# /sdk/latest-all, or a snapshot file in the SDK file data source layout).
+#
+# Flags are compiled once: individual targets become a dict lookup, clause
+# values are parsed up front (regexes, semantic versions, timestamps) and
+# segment inclusion lists become sets, so evaluating many users against the
+# same data only does the per-user work. Results follow the server-side SDK
+# evaluation rules, including bucketing for rollouts.
+
+import calendar
+import hashlib
+import re
+from numbers import Number
+
+from ansible.module_utils.six import integer_types, iteritems, string_types
+
+_LONG_SCALE = float(0xFFFFFFFFFFFFFFF)
+
+_BUILTINS = frozenset(
+    [
+        "key",
+        "ip",
+        "country",
+        "email",
+        "firstName",
+        "lastName",
+        "avatar",
+        "name",
+        "anonymous",
+    ]
+)
+
+_SEMVER = re.compile(
+    r"^(?P<major>0|[1-9]\d*)(\.(?P<minor>0|[1-9]\d*))?(\.(?P<patch>0|[1-9]\d*))?"
+    r"(-(?P<pre>[0-9A-Za-z-]+(\.[0-9A-Za-z-]+)*))?(\+[0-9A-Za-z-]+(\.[0-9A-Za-z-]+)*)?$"
+)
+
+_RFC3339 = re.compile(
+    r"^(\d{4})-(\d{2})-(\d{2})[Tt ](\d{2}):(\d{2}):(\d{2})(\.\d+)?"
+    r"([Zz]|[+-]\d{2}:\d{2})$"
+)
+
+# Sentinel for attributes that make a clause fail outright.
+_SKIP = object()
+
+
+def _error(kind):
+    return {"kind": "ERROR", "errorKind": kind}
+
+
+def snapshot_items(snapshot):
+    # Flags and segments by key, with flagValues expanded to always-on flags.
+    flags = dict(snapshot.get("flags") or {})
+    for flag_key, value in iteritems(snapshot.get("flagValues") or {}):
+        flags[flag_key] = dict(
+            key=flag_key, on=True, fallthrough=dict(variation=0), variations=[value]
+        )
+    return flags, dict(snapshot.get("segments") or {})
+
+
+def _user_attribute(user, attr):
+    if attr == "secondary":
+        return _SKIP
+    if attr in _BUILTINS:
+        value = user.get(attr)
+        if attr == "key" and value is not None and not isinstance(value, string_types):
+            value = str(value)
+        return value
+    custom = user.get("custom")
+    if custom is None or custom.get(attr) is None:
+        return _SKIP
+    return custom[attr]
+
+
+def _bucket(user, key, salt, bucket_by):
+    value = _user_attribute(user, bucket_by)
+    # Only strings and integers are bucketed; bool is an int subclass.
+    if isinstance(value, bool) or not isinstance(value, string_types + integer_types):
+        return 0.0
+    id_hash = "%s" % value
+    secondary = user.get("secondary")
+    if secondary is not None:
+        id_hash = "%s.%s" % (id_hash, secondary)
+    digest = hashlib.sha1(("%s.%s.%s" % (key, salt, id_hash)).encode("utf-8"))
+    return int(digest.hexdigest()[:15], 16) / _LONG_SCALE
+
+
+def _parse_semver(value):
+    if not isinstance(value, string_types):
+        return None
+    match = _SEMVER.match(value)
+    if match is None:
+        return None
+    pre = match.group("pre")
+    # Prerelease identifiers: numeric ones sort before alphanumeric ones.
+    pre_key = (
+        tuple((0, int(p), "") if p.isdigit() else (1, 0, p) for p in pre.split("."))
+        if pre
+        else None
+    )
+    return (
+        int(match.group("major")),
+        int(match.group("minor") or 0),
+        int(match.group("patch") or 0),
+        pre_key,
+    )
+
+
+def _semver_cmp(a, b):
+    if a[:3] != b[:3]:
+        return -1 if a[:3] < b[:3] else 1
+    if a[3] == b[3]:
+        return 0
+    # A release has higher precedence than any of its prereleases.
+    if a[3] is None:
+        return 1
+    if b[3] is None:
+        return -1
+    return -1 if a[3] < b[3] else 1
+
+
+def _parse_time(value):
+    # Milliseconds since the epoch, from a number or an RFC 3339 timestamp.
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, Number):
+        return float(value)
+    if not isinstance(value, string_types):
+        return None
+    match = _RFC3339.match(value)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second = [int(g) for g in match.groups()[:6]]
+    seconds = calendar.timegm((year, month, day, hour, minute, second))
+    if match.group(7):
+        seconds += float(match.group(7))
+    offset = match.group(8)
+    if offset not in ("Z", "z"):
+        sign = -1 if offset[0] == "+" else 1
+        seconds += sign * (int(offset[1:3]) * 3600 + int(offset[4:6]) * 60)
+    return seconds * 1000.0
+
+
+def _string_matcher(values, fn):
+    values = [v for v in values if isinstance(v, string_types)]
+
+    def match(u):
+        return isinstance(u, string_types) and any(fn(u, v) for v in values)
+
+    return match
+
+
+def _regex_matcher(values):
+    patterns = []
+    for value in values:
+        if isinstance(value, string_types):
+            try:
+                patterns.append(re.compile(value))
+            except re.error:
+                pass
+
+    def match(u):
+        return isinstance(u, string_types) and any(p.search(u) for p in patterns)
+
+    return match
+
+
+def _in_matcher(values):
+    try:
+        lookup = frozenset(values)
+    except TypeError:
+        lookup = None
+
+    def match(u):
+        if lookup is not None:
+            try:
+                return u in lookup
+            except TypeError:
+                pass
+        return any(u == v for v in values)
+
+    return match
+
+
+def _numeric_matcher(values, fn):
+    values = [v for v in values if isinstance(v, Number)]
+
+    def match(u):
+        return isinstance(u, Number) and any(fn(u, v) for v in values)
+
+    return match
+
+
+def _time_matcher(values, fn):
+    times = [t for t in (_parse_time(v) for v in values) if t is not None]
+
+    def match(u):
+        u_time = _parse_time(u)
+        return u_time is not None and any(fn(u_time, t) for t in times)
+
+    return match
+
+
+def _semver_matcher(values, fn):
+    versions = [s for s in (_parse_semver(v) for v in values) if s is not None]
+
+    def match(u):
+        u_ver = _parse_semver(u)
+        return u_ver is not None and any(fn(_semver_cmp(u_ver, v)) for v in versions)
+
+    return match
+
+
+def _compile_op(op, values):
+    if op == "in":
+        return _in_matcher(values)
+    if op == "startsWith":
+        return _string_matcher(values, lambda u, v: u.startswith(v))
+    if op == "endsWith":
+        return _string_matcher(values, lambda u, v: u.endswith(v))
+    if op == "contains":
+        return _string_matcher(values, lambda u, v: v in u)
+    if op == "matches":
+        return _regex_matcher(values)
+    if op == "lessThan":
+        return _numeric_matcher(values, lambda u, v: u < v)
+    if op == "lessThanOrEqual":
+        return _numeric_matcher(values, lambda u, v: u <= v)
+    if op == "greaterThan":
+        return _numeric_matcher(values, lambda u, v: u > v)
+    if op == "greaterThanOrEqual":
+        return _numeric_matcher(values, lambda u, v: u >= v)
+    if op == "before":
+        return _time_matcher(values, lambda u, v: u < v)
+    if op == "after":
+        return _time_matcher(values, lambda u, v: u > v)
+    if op == "semVerEqual":
+        return _semver_matcher(values, lambda c: c == 0)
+    if op == "semVerLessThan":
+        return _semver_matcher(values, lambda c: c < 0)
+    if op == "semVerGreaterThan":
+        return _semver_matcher(values, lambda c: c > 0)
+    # Unknown operators never match.
+    return lambda u: False
+
+
+class _Clause(object):
+    __slots__ = ("attribute", "match", "negate", "segments")
+
+    def __init__(self, clause):
+        self.attribute = clause.get("attribute")
+        self.negate = clause.get("negate", False) is True
+        values = clause.get("values") or []
+        if clause.get("op") == "segmentMatch":
+            self.segments = list(values)
+            self.match = None
+        else:
+            self.segments = None
+            self.match = _compile_op(clause.get("op"), values)
+
+    def matches(self, user, evaluator):
+        if self.segments is not None:
+            for segment_key in self.segments:
+                segment = evaluator.segments.get(segment_key)
+                if segment is not None and segment.matches(user):
+                    return not self.negate
+            return self.negate
+        return self.matches_attribute(user)
+
+    def matches_attribute(self, user):
+        value = _user_attribute(user, self.attribute)
+        if value is _SKIP:
+            return False
+        if value is None:
+            return None
+        if isinstance(value, (list, tuple)):
+            result = any(self.match(v) for v in value)
+        else:
+            result = self.match(value)
+        return not result if self.negate else result
+
+
+class _Segment(object):
+    __slots__ = ("key", "salt", "included", "excluded", "rules")
+
+    def __init__(self, segment):
+        self.key = segment.get("key")
+        self.salt = segment.get("salt")
+        self.included = frozenset(segment.get("included") or [])
+        self.excluded = frozenset(segment.get("excluded") or [])
+        self.rules = [
+            (
+                [_Clause(c) for c in rule.get("clauses") or []],
+                rule.get("weight"),
+                rule.get("bucketBy") or "key",
+            )
+            for rule in segment.get("rules") or []
+        ]
+
+    def matches(self, user):
+        key = user.get("key")
+        if key is None:
+            return False
+        if key in self.included:
+            return True
+        if key in self.excluded:
+            return False
+        for clauses, weight, bucket_by in self.rules:
+            if not all(c.matches_attribute(user) for c in clauses):
+                continue
+            if weight is None:
+                return True
+            if _bucket(user, self.key, self.salt, bucket_by) < weight / 100000.0:
+                return True
+        return False
+
+
+class _Flag(object):
+    __slots__ = (
+        "key",
+        "on",
+        "salt",
+        "variations",
+        "off_variation",
+        "prerequisites",
+        "targets",
+        "rules",
+        "fallthrough",
+    )
+
+    def __init__(self, flag):
+        self.key = flag.get("key")
+        self.on = flag.get("on", False)
+        self.salt = flag.get("salt")
+        self.variations = flag.get("variations") or []
+        self.off_variation = flag.get("offVariation")
+        self.prerequisites = [
+            (p.get("key"), p.get("variation")) for p in flag.get("prerequisites") or []
+        ]
+        # The first target listing a user key wins, as in the SDKs.
+        self.targets = {}
+        for target in flag.get("targets") or []:
+            for value in target.get("values") or []:
+                self.targets.setdefault(value, target.get("variation"))
+        self.rules = [
+            (
+                [_Clause(c) for c in rule.get("clauses") or []],
+                rule,
+                {"kind": "RULE_MATCH", "ruleIndex": index, "ruleId": rule.get("id")},
+            )
+            for index, rule in enumerate(flag.get("rules") or [])
+        ]
+        self.fallthrough = flag.get("fallthrough")
+
+    def variation(self, index, reason):
+        if index is None or index < 0 or index >= len(self.variations):
+            return None, None, _error("MALFORMED_FLAG")
+        return self.variations[index], index, reason
+
+    def off_value(self, reason):
+        if self.off_variation is None:
+            return None, None, reason
+        return self.variation(self.off_variation, reason)
+
+    def rollout_value(self, user, vr, reason):
+        index = vr.get("variation")
+        if index is None and vr.get("rollout") is not None:
+            rollout = vr["rollout"]
+            bucket = _bucket(
+                user, self.key, self.salt, rollout.get("bucketBy") or "key"
+            )
+            weights = rollout.get("variations") or []
+            total = 0.0
+            for weighted in weights:
+                total += weighted.get("weight", 0.0) / 100000.0
+                if bucket < total:
+                    index = weighted.get("variation")
+                    break
+            else:
+                # Past the last bucket, from rounding or weights that add up
+                # to less than 100000: the user gets the last variation.
+                if weights:
+                    index = weights[-1].get("variation")
+        return self.variation(index, reason)
+
+
+class Evaluator(object):
+    def __init__(self, flags, segments=None):
+        self.flags = dict((k, _Flag(f)) for k, f in iteritems(flags))
+        self.segments = dict((k, _Segment(s)) for k, s in iteritems(segments or {}))
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        flags, segments = snapshot_items(snapshot)
+        return cls(flags, segments)
+
+    def evaluate(self, flag_key, user):
+        # Returns (value, variation_index, reason) like the SDK detail.
+        flag = self.flags.get(flag_key)
+        if flag is None:
+            return None, None, _error("FLAG_NOT_FOUND")
+        if user is None or user.get("key") is None:
+            return None, None, _error("USER_NOT_SPECIFIED")
+        return self._evaluate(flag, user, set())
+
+    def evaluate_all(self, user):
+        return dict((k, self.evaluate(k, user)) for k in self.flags)
+
+    def _evaluate(self, flag, user, visiting):
+        if not flag.on:
+            return flag.off_value({"kind": "OFF"})
+
+        for prereq_key, prereq_variation in flag.prerequisites:
+            prereq = self.flags.get(prereq_key)
+            if prereq is None or prereq_key in visiting:
+                failed = True
+            else:
+                visiting.add(flag.key)
+                result = self._evaluate(prereq, user, visiting)
+                visiting.discard(flag.key)
+                failed = not prereq.on or result[1] != prereq_variation
+            if failed:
+                return flag.off_value(
+                    {"kind": "PREREQUISITE_FAILED", "prerequisiteKey": prereq_key}
+                )
+
+        key = user["key"]
+        if not isinstance(key, string_types):
+            key = str(key)
+        if key in flag.targets:
+            return flag.variation(flag.targets[key], {"kind": "TARGET_MATCH"})
+
+        for clauses, rule, reason in flag.rules:
+            if all(c.matches(user, self) for c in clauses):
+                return flag.rollout_value(user, rule, reason)
+
+        if flag.fallthrough is None:
+            return None, None, _error("MALFORMED_FLAG")
+        return flag.rollout_value(user, flag.fallthrough, {"kind": "FALLTHROUGH"})
@@ -0,0 +1,142 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+# JSON encoding and decoding through the fastest library available on the
+# managed host: orjson, then ujson, then the standard library. Set
+# LAUNCHDARKLY_JSON_BACKEND to orjson, ujson or json to choose one. Every
+# backend writes compact JSON without escaping non-ASCII characters, so
+# output only differs between backends in how some numbers are formatted.
+
+import json as _json
+import os
+
+from ansible.module_utils._text import to_bytes, to_text
+
+BACKENDS = ("orjson", "ujson", "json")
+
+orjson = None
+ujson = None
+
+
+def _select(name=None):
+    global orjson, ujson
+    names = [name] if name else BACKENDS
+    for backend in names:
+        try:
+            if backend == "orjson":
+                import orjson
+            elif backend == "ujson":
+                import ujson
+            elif backend != "json":
+                continue
+        except ImportError:
+            continue
+        return backend
+    return "json"
+
+
+BACKEND = _select(os.environ.get("LAUNCHDARKLY_JSON_BACKEND"))
+
+_ENCODER = _json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+_SORTED_ENCODER = _json.JSONEncoder(
+    separators=(",", ":"), ensure_ascii=False, sort_keys=True
+)
+
+
+def loads(data):
+    # Accepts text or bytes. Invalid JSON raises ValueError with every backend.
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    if BACKEND == "ujson":
+        return ujson.loads(data)
+    return _json.loads(to_text(data, errors="surrogate_or_strict"))
+
+
+def load(f):
+    return loads(f.read())
+
+
+def _dumps_stdlib(value, sort_keys, default):
+    if default is None:
+        encoder = _SORTED_ENCODER if sort_keys else _ENCODER
+        return encoder.encode(value)
+    return _json.dumps(
+        value,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        sort_keys=sort_keys,
+        default=default,
+    )
+
+
+def dumps_bytes(value, sort_keys=False, default=None):
+    # Values the faster backends reject, such as integers over 64 bits, are
+    # encoded by the standard library instead.
+    if BACKEND == "orjson":
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(value, default=default, option=option)
+        except TypeError:
+            pass
+    elif BACKEND == "ujson" and default is None:
+        try:
+            return to_bytes(
+                ujson.dumps(
+                    value,
+                    ensure_ascii=False,
+                    escape_forward_slashes=False,
+                    sort_keys=sort_keys,
+                ),
+                errors="surrogate_or_strict",
+            )
+        except (TypeError, OverflowError):
+            pass
+    return to_bytes(
+        _dumps_stdlib(value, sort_keys, default), errors="surrogate_or_strict"
+    )
+
+
+def dumps(value, sort_keys=False, default=None):
+    if BACKEND == "json":
+        return _dumps_stdlib(value, sort_keys, default)
+    return to_text(dumps_bytes(value, sort_keys, default), errors="surrogate_or_strict")
+
+
+def dump(value, f, sort_keys=False, default=None):
+    # f is a file opened in binary mode, so the output is always UTF-8.
+    f.write(dumps_bytes(value, sort_keys, default))
+
+
+def iterencode(value):
+    # Yields the encoded bytes of value in chunks. The standard library
+    # encodes incrementally, so large documents are never held in memory
+    # twice; the faster backends encode in one piece.
+    if BACKEND == "json":
+        for chunk in _ENCODER.iterencode(value):
+            yield chunk.encode("utf-8")
+    else:
+        yield dumps_bytes(value)
+
+
+class _ClientJSON(object):
+    # Stands in for the json module inside the generated API client.
+    loads = staticmethod(loads)
+
+    @staticmethod
+    def dumps(value, **kwargs):
+        return dumps(value)
+
+
+def install():
+    # Makes the generated launchdarkly_api client encode request bodies and
+    # decode responses with the selected backend.
+    if BACKEND == "json":
+        return
+    import launchdarkly_api.api_client
+    import launchdarkly_api.rest
+
+    launchdarkly_api.api_client.json = _ClientJSON
+    launchdarkly_api.rest.json = _ClientJSON
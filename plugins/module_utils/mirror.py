@@ -0,0 +1,144 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+# Local copy of an environment's flag data kept current from the SDK streaming
+# endpoint. The store file has the same layout as /sdk/latest-all, so it can be
+# used anywhere a flag data snapshot is accepted.
+
+import os
+import tempfile
+
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils import (
+    json_codec,
+)
+
+KINDS = ("flags", "segments")
+
+
+def sse_events(fp):
+    # Yields (event, data) pairs from a server-sent events stream.
+    event = None
+    data = []
+    for raw in iter(fp.readline, b""):
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event or "message", "\n".join(data)
+            event = None
+            data = []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            event = value
+        elif field == "data":
+            data.append(value)
+    if data:
+        yield event or "message", "\n".join(data)
+
+
+def _split_path(path):
+    # "/flags/my-flag" -> ("flags", "my-flag")
+    parts = path.lstrip("/").split("/", 1)
+    if len(parts) != 2 or parts[0] not in KINDS or not parts[1]:
+        return None, None
+    return parts[0], parts[1]
+
+
+def _file_mode(path):
+    # Keep the mode of an existing file, otherwise the default for new files.
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+class FlagStore(object):
+    def __init__(self, path):
+        self.path = path
+        self.data = dict((kind, {}) for kind in KINDS)
+        # Versions of deleted items, so late patches cannot resurrect them.
+        self.deleted = dict((kind, {}) for kind in KINDS)
+        self.dirty = False
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                stored = json_codec.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+        for kind in KINDS:
+            self.data[kind] = dict(stored.get(kind) or {})
+        return True
+
+    def counts(self):
+        return dict((kind, len(self.data[kind])) for kind in KINDS)
+
+    def _version(self, kind, key):
+        item = self.data[kind].get(key)
+        if item is not None:
+            return item.get("version", 0)
+        return self.deleted[kind].get(key)
+
+    def put(self, data):
+        new = dict((kind, dict(data.get(kind) or {})) for kind in KINDS)
+        self.deleted = dict((kind, {}) for kind in KINDS)
+        if new == self.data:
+            return False
+        self.data = new
+        self.dirty = True
+        return True
+
+    def upsert(self, path, item):
+        kind, key = _split_path(path)
+        if kind is None:
+            return False
+        current = self._version(kind, key)
+        if current is not None and item.get("version", 0) <= current:
+            return False
+        self.data[kind][key] = item
+        self.deleted[kind].pop(key, None)
+        self.dirty = True
+        return True
+
+    def delete(self, path, version):
+        kind, key = _split_path(path)
+        if kind is None:
+            return False
+        current = self._version(kind, key)
+        if current is not None and version <= current:
+            return False
+        self.data[kind].pop(key, None)
+        self.deleted[kind][key] = version
+        self.dirty = True
+        return True
+
+    def apply(self, event, data):
+        # Applies one streaming event, returning whether the store changed.
+        message = json_codec.loads(data)
+        if event == "put":
+            return self.put(message.get("data") or {})
+        if event == "patch":
+            return self.upsert(message.get("path", ""), message.get("data") or {})
+        if event == "delete":
+            return self.delete(message.get("path", ""), message.get("version", 0))
+        return False
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".ld-mirror-", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                json_codec.dump(self.data, f)
+            os.chmod(tmp_path, _file_mode(self.path))
+            os.rename(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.dirty = False
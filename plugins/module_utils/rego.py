@@ -0,0 +1,992 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+# In-process evaluator for the subset of Rego used by conftest policies:
+# packages and imports, partial set rules (deny[msg] { ... }), complete rules,
+# functions, negation, unification with iteration over refs, comprehensions
+# and the common string/collection builtins.
+#
+# The parsed policy is built only from lists, dicts and scalars so it can be
+# serialized as JSON.
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+# Bump when the parsed format changes to invalidate cached policies.
+CACHE_VERSION = 1
+
+FAILURE_RULE = re.compile(r"^(deny|violation)(_[a-zA-Z0-9_]+)*$")
+
+_TOKEN = re.compile(
+    r"""
+    (?P<ws>[ \t\r]+)
+  | (?P<comment>\#[^\n]*)
+  | (?P<nl>\n)
+  | (?P<num>\d+(\.\d+)?([eE][-+]?\d+)?)
+  | (?P<str>"(\\.|[^"\\])*")
+  | (?P<raw>`[^`]*`)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>:=|==|!=|<=|>=|[<>=\[\]{}().,;:|+\-*/%])
+    """,
+    re.VERBOSE,
+)
+
+_CMP_OPS = ("==", "!=", "<", ">", "<=", ">=")
+
+
+class RegoError(Exception):
+    pass
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    line = 1
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match:
+            raise RegoError("line %d: unexpected character %r" % (line, text[pos]))
+        kind = match.lastgroup
+        value = match.group(kind)
+        pos = match.end()
+        if kind in ("ws", "comment"):
+            continue
+        if kind == "nl":
+            line += 1
+            if tokens and tokens[-1][0] == "nl":
+                continue
+        tokens.append((kind, value, line))
+    tokens.append(("eof", None, line))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.wildcards = 0
+
+    # Token helpers
+
+    def peek(self, offset=0):
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def at(self, value, kind=None):
+        token = self.peek()
+        return token[1] == value and (kind is None or token[0] == kind)
+
+    def accept(self, value):
+        if self.at(value) and self.peek()[0] in ("op", "ident"):
+            return self.next()
+        return None
+
+    def expect(self, value):
+        token = self.next()
+        if token[1] != value:
+            raise RegoError(
+                "line %d: expected %r, found %r" % (token[2], value, token[1])
+            )
+        return token
+
+    def skip_nl(self):
+        while self.peek()[0] == "nl":
+            self.pos += 1
+
+    def end_statement(self):
+        token = self.peek()
+        if token[0] == "nl" or token[1] == ";":
+            self.pos += 1
+        elif token[1] != "}" and token[0] != "eof":
+            raise RegoError("line %d: unexpected %r" % (token[2], token[1]))
+
+    # Module level
+
+    def parse_module(self):
+        self.skip_nl()
+        self.expect("package")
+        package = self.parse_dotted()
+        self.end_statement()
+        module = {"package": package, "imports": {}, "rules": {}}
+        self.skip_nl()
+        while self.peek()[0] != "eof":
+            if self.at("import", "ident"):
+                self.next()
+                path = self.parse_dotted()
+                if path[0] == "future":
+                    self.end_statement()
+                    self.skip_nl()
+                    continue
+                alias = path[-1]
+                if self.accept("as"):
+                    alias = self.next()[1]
+                module["imports"][alias] = path
+                self.end_statement()
+            else:
+                rule = self.parse_rule()
+                module["rules"].setdefault(rule["name"], []).append(rule)
+            self.skip_nl()
+        return module
+
+    def parse_dotted(self):
+        parts = [self.next()[1]]
+        while self.accept("."):
+            parts.append(self.next()[1])
+        return parts
+
+    def parse_rule(self):
+        token = self.next()
+        if token[0] != "ident":
+            raise RegoError("line %d: expected rule, found %r" % (token[2], token[1]))
+        if token[1] == "default":
+            name = self.next()[1]
+            if not (self.accept("=") or self.accept(":=")):
+                raise RegoError("line %d: expected '=' after default" % token[2])
+            value = self.parse_term()
+            self.end_statement()
+            return {"name": name, "kind": "default", "value": value, "bodies": []}
+
+        rule = {"name": token[1], "kind": "complete", "value": None}
+        if self.accept("("):
+            rule["kind"] = "function"
+            rule["args"] = self.parse_list(")")
+        elif self.accept("["):
+            self.skip_nl()
+            rule["kind"] = "set"
+            rule["key"] = self.parse_term()
+            self.skip_nl()
+            self.expect("]")
+        elif self.at("contains", "ident"):
+            self.next()
+            rule["kind"] = "set"
+            rule["key"] = self.parse_term()
+
+        if self.accept("=") or self.accept(":="):
+            if rule["kind"] == "set":
+                rule["kind"] = "object"
+            rule["value"] = self.parse_term()
+
+        rule["bodies"] = []
+        self.accept("if")
+        while self.at("{", "op"):
+            self.next()
+            rule["bodies"].append(self.parse_body("}"))
+            self.expect("}")
+            if self.accept("else"):
+                raise RegoError("line %d: 'else' is not supported" % token[2])
+        if not rule["bodies"]:
+            rule["bodies"].append([])
+        self.end_statement()
+        return rule
+
+    def parse_body(self, closing):
+        body = []
+        self.skip_nl()
+        while not self.at(closing, "op"):
+            body.append(self.parse_expr())
+            token = self.peek()
+            if token[1] == ";" or token[0] == "nl":
+                self.next()
+            elif token[1] != closing:
+                raise RegoError("line %d: unexpected %r" % (token[2], token[1]))
+            self.skip_nl()
+        return body
+
+    def parse_expr(self):
+        if self.at("not", "ident"):
+            self.next()
+            return ["not", self.parse_expr()]
+        if self.at("some", "ident"):
+            self.next()
+            names = [self.next()[1]]
+            while self.accept(","):
+                names.append(self.next()[1])
+            if self.at("in", "ident"):
+                raise RegoError("'some ... in' is not supported")
+            return ["some", names]
+        left = self.parse_term()
+        token = self.peek()
+        if token[0] == "op" and token[1] == ":=":
+            self.next()
+            return ["assign", left, self.parse_term()]
+        if token[0] == "op" and token[1] == "=":
+            self.next()
+            return ["unify", left, self.parse_term()]
+        if token[0] == "op" and token[1] in _CMP_OPS:
+            self.next()
+            return ["cmp", token[1], left, self.parse_term()]
+        if self.at("with", "ident"):
+            raise RegoError("line %d: 'with' is not supported" % token[2])
+        return ["expr", left]
+
+    def parse_list(self, closing):
+        items = []
+        self.skip_nl()
+        while not self.at(closing, "op"):
+            items.append(self.parse_term())
+            self.skip_nl()
+            if not self.accept(","):
+                break
+            self.skip_nl()
+        self.skip_nl()
+        self.expect(closing)
+        return items
+
+    # Terms
+
+    def parse_term(self):
+        left = self.parse_product()
+        while self.peek()[0] == "op" and self.peek()[1] in ("+", "-"):
+            op = self.next()[1]
+            left = ["arith", op, left, self.parse_product()]
+        return left
+
+    def parse_product(self):
+        left = self.parse_ref()
+        while self.peek()[0] == "op" and self.peek()[1] in ("*", "/", "%"):
+            op = self.next()[1]
+            left = ["arith", op, left, self.parse_ref()]
+        return left
+
+    def parse_ref(self):
+        head = self.parse_atom()
+        path = []
+        while True:
+            if self.at(".", "op") and self.peek(1)[0] == "ident":
+                self.next()
+                path.append(["lit", self.next()[1]])
+            elif self.at("[", "op"):
+                self.next()
+                self.skip_nl()
+                path.append(self.parse_term())
+                self.skip_nl()
+                self.expect("]")
+            elif self.at("(", "op") and head[0] == "var":
+                self.next()
+                name = [head[1]] + [part[1] for part in path]
+                if any(part[0] != "lit" for part in path):
+                    raise RegoError("invalid function name")
+                head = ["call", name, self.parse_list(")")]
+                path = []
+            else:
+                break
+        if path:
+            return ["ref", head, path]
+        return head
+
+    def parse_atom(self):
+        kind, value, line = self.next()
+        if kind == "num":
+            number = float(value)
+            if number.is_integer() and "." not in value:
+                number = int(number)
+            return ["lit", number]
+        if kind == "str":
+            return ["lit", _unquote(value)]
+        if kind == "raw":
+            return ["lit", value[1:-1]]
+        if kind == "ident":
+            if value in ("true", "false"):
+                return ["lit", value == "true"]
+            if value == "null":
+                return ["lit", None]
+            if value == "_":
+                self.wildcards += 1
+                return ["var", "_$%d" % self.wildcards]
+            return ["var", value]
+        if kind == "op" and value == "(":
+            self.skip_nl()
+            term = self.parse_term()
+            self.skip_nl()
+            self.expect(")")
+            return term
+        if kind == "op" and value == "-":
+            return ["arith", "-", ["lit", 0], self.parse_ref()]
+        if kind == "op" and value == "[":
+            return self.parse_collection("]", "array")
+        if kind == "op" and value == "{":
+            return self.parse_collection("}", "set")
+        raise RegoError("line %d: unexpected %r" % (line, value))
+
+    def parse_collection(self, closing, kind):
+        self.skip_nl()
+        if self.accept(closing):
+            return ["object", []] if kind == "set" else ["array", []]
+        first = self.parse_term()
+        self.skip_nl()
+        if kind == "set" and self.accept(":"):
+            return self.parse_object(first)
+        if self.accept("|"):
+            body = self.parse_body(closing)
+            self.expect(closing)
+            return ["compr", kind, first, body]
+        items = [first]
+        while self.accept(","):
+            self.skip_nl()
+            if self.at(closing, "op"):
+                break
+            items.append(self.parse_term())
+            self.skip_nl()
+        self.expect(closing)
+        return [kind, items]
+
+    def parse_object(self, key):
+        self.skip_nl()
+        pairs = [[key, self.parse_term()]]
+        self.skip_nl()
+        if self.at("|", "op"):
+            raise RegoError("object comprehensions are not supported")
+        while self.accept(","):
+            self.skip_nl()
+            if self.at("}", "op"):
+                break
+            key = self.parse_term()
+            self.skip_nl()
+            self.expect(":")
+            self.skip_nl()
+            pairs.append([key, self.parse_term()])
+            self.skip_nl()
+        self.expect("}")
+        return ["object", pairs]
+
+
+def _unquote(value):
+    return json.loads(value)
+
+
+def parse_module(text):
+    return _Parser(text).parse_module()
+
+
+def _read_policy_dir(path):
+    sources = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(".rego") or name.endswith("_test.rego"):
+                continue
+            filename = os.path.join(root, name)
+            with open(filename) as f:
+                sources.append((os.path.relpath(filename, path), f.read()))
+    return sources
+
+
+def _hash_sources(sources):
+    digest = hashlib.sha256()
+    for name, text in sources:
+        digest.update(name.encode("utf-8") + b"\0")
+        digest.update(text.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def _parse_sources(sources):
+    # Returns a dictionary of package name to parsed module, merging modules
+    # that share a package.
+    packages = {}
+    for name, text in sources:
+        try:
+            module = parse_module(text)
+        except RegoError as e:
+            raise RegoError("%s: %s" % (name, e))
+        package = ".".join(module["package"])
+        merged = packages.setdefault(
+            package, {"package": module["package"], "imports": {}, "rules": {}}
+        )
+        merged["imports"].update(module["imports"])
+        for rule_name, rules in module["rules"].items():
+            merged["rules"].setdefault(rule_name, []).extend(rules)
+    return packages
+
+
+def parse_policy_dir(path):
+    return _parse_sources(_read_policy_dir(path))
+
+
+def policy_hash(path):
+    # Content hash of every policy file in the directory.
+    return _hash_sources(_read_policy_dir(path))
+
+
+class _Undefined(Exception):
+    pass
+
+
+def _equal(a, b):
+    if isinstance(a, bool) != isinstance(b, bool):
+        return False
+    return a == b
+
+
+def _compare(op, a, b):
+    if op == "==":
+        return _equal(a, b)
+    if op == "!=":
+        return not _equal(a, b)
+    try:
+        if op == "<":
+            return a < b
+        if op == ">":
+            return a > b
+        if op == "<=":
+            return a <= b
+        return a >= b
+    except TypeError:
+        return False
+
+
+def _unique(values):
+    result = []
+    for value in values:
+        if not any(_equal(value, seen) for seen in result):
+            result.append(value)
+    return result
+
+
+def _string(value):
+    if not isinstance(value, str):
+        raise _Undefined()
+    return value
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise _Undefined()
+    return value
+
+
+def _format_value(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return json.dumps(value, sort_keys=True)
+
+
+_SPRINTF = re.compile(r"%([-+ #0]*\d*(?:\.\d+)?)([vsdqfgetx%])")
+
+
+def _sprintf(fmt, args):
+    args = list(args)
+
+    def replace(match):
+        flags, verb = match.groups()
+        if verb == "%":
+            return "%"
+        if not args:
+            return "%!" + verb + "(MISSING)"
+        value = args.pop(0)
+        if verb in ("v", "s"):
+            return ("%" + flags + "s") % _format_value(value)
+        if verb == "q":
+            return json.dumps(value)
+        if verb == "t":
+            return _format_value(value)
+        return ("%" + flags + verb) % value
+
+    return _SPRINTF.sub(replace, _string(fmt))
+
+
+def _regex_match(pattern, value):
+    return re.search(_string(pattern), _string(value)) is not None
+
+
+def _object_get(obj, key, default):
+    if isinstance(obj, dict):
+        return obj.get(key, default)
+    raise _Undefined()
+
+
+def _type_name(value):
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return "null"
+
+
+BUILTINS = {
+    "count": lambda x: len(x) if isinstance(x, (str, list, dict)) else _undef(),
+    "sum": lambda x: sum(_number(v) for v in x),
+    "product": lambda x: _product(x),
+    "max": lambda x: max(x) if x else _undef(),
+    "min": lambda x: min(x) if x else _undef(),
+    "abs": lambda x: abs(_number(x)),
+    "round": lambda x: int(round(_number(x))),
+    "to_number": lambda x: _to_number(x),
+    "startswith": lambda s, p: _string(s).startswith(_string(p)),
+    "endswith": lambda s, p: _string(s).endswith(_string(p)),
+    "contains": lambda s, p: _string(p) in _string(s),
+    "indexof": lambda s, p: _string(s).find(_string(p)),
+    "lower": lambda s: _string(s).lower(),
+    "upper": lambda s: _string(s).upper(),
+    "trim": lambda s, c: _string(s).strip(_string(c)),
+    "trim_space": lambda s: _string(s).strip(),
+    "trim_left": lambda s, c: _string(s).lstrip(_string(c)),
+    "trim_right": lambda s, c: _string(s).rstrip(_string(c)),
+    "trim_prefix": lambda s, p: _string(s)[len(p) :] if s.startswith(p) else s,
+    "trim_suffix": lambda s, p: _string(s)[: -len(p)] if p and s.endswith(p) else s,
+    "split": lambda s, d: _string(s).split(_string(d)),
+    "concat": lambda d, a: _string(d).join(_string(v) for v in a),
+    "replace": lambda s, o, n: _string(s).replace(_string(o), _string(n)),
+    "substring": lambda s, o, n: _string(s)[o : (o + n if n >= 0 else None)],
+    "sprintf": _sprintf,
+    "re_match": _regex_match,
+    "regex.match": _regex_match,
+    "object.get": _object_get,
+    "array.concat": lambda a, b: list(a) + list(b),
+    "array.slice": lambda a, i, j: list(a)[i:j],
+    "sort": lambda a: sorted(a),
+    "type_name": _type_name,
+    "is_string": lambda x: isinstance(x, str),
+    "is_number": lambda x: _type_name(x) == "number",
+    "is_boolean": lambda x: isinstance(x, bool),
+    "is_array": lambda x: isinstance(x, list),
+    "is_object": lambda x: isinstance(x, dict),
+    "is_null": lambda x: x is None,
+}
+
+
+def _undef():
+    raise _Undefined()
+
+
+def _product(values):
+    result = 1
+    for value in values:
+        result *= _number(value)
+    return result
+
+
+def _to_number(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        number = float(_string(value))
+    except ValueError:
+        raise _Undefined()
+    return int(number) if number.is_integer() else number
+
+
+_ARITH = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a / b,
+    "%": lambda a, b: a % b,
+}
+
+_GLOBALS = ("input", "data")
+_MISSING = object()
+
+
+class _Evaluation:
+    # State for evaluating one input document. Rule values are memoized
+    # because they only depend on the input.
+
+    def __init__(self, packages, document):
+        self.packages = packages
+        self.input = document
+        self.rules = {}
+
+    def rule_value(self, package, name):
+        key = (package, name)
+        if key in self.rules:
+            if self.rules[key] is _MISSING:
+                raise RegoError("recursion in rule %s.%s" % key)
+            return self.rules[key]
+        self.rules[key] = _MISSING
+        value = self._eval_rule(package, self.packages[package]["rules"][name])
+        self.rules[key] = value
+        return value
+
+    def _eval_rule(self, package, rules):
+        default = _MISSING
+        collected = []
+        kind = None
+        for rule in rules:
+            if rule["kind"] == "default":
+                default = rule["value"]
+                continue
+            kind = rule["kind"]
+            if kind == "function":
+                raise RegoError("function %s used as a value" % rule["name"])
+            for body in rule["bodies"]:
+                for env in self.eval_body(package, body, 0, {}):
+                    if kind == "set":
+                        for key, _ in self.eval_term(package, rule["key"], env):
+                            collected.append(key)
+                    elif kind == "object":
+                        for key, env2 in self.eval_term(package, rule["key"], env):
+                            for value, _ in self.eval_term(
+                                package, rule["value"], env2
+                            ):
+                                collected.append((key, value))
+                    else:
+                        if rule["value"] is None:
+                            return True
+                        for value, _ in self.eval_term(package, rule["value"], env):
+                            return value
+        if kind == "set":
+            return _unique(collected)
+        if kind == "object":
+            return dict(collected)
+        if default is not _MISSING:
+            for value, _ in self.eval_term(package, default, {}):
+                return value
+        return _MISSING
+
+    # Bodies and expressions
+
+    def eval_body(self, package, body, index, env):
+        if index == len(body):
+            yield env
+            return
+        for env2 in self.eval_expr(package, body[index], env):
+            for env3 in self.eval_body(package, body, index + 1, env2):
+                yield env3
+
+    def eval_expr(self, package, expr, env):
+        kind = expr[0]
+        if kind == "not":
+            for _ in self.eval_expr(package, expr[1], env):
+                return
+            yield env
+        elif kind == "some":
+            yield env
+        elif kind == "assign":
+            for env2 in self.unify(package, expr[1], expr[2], env, assign=True):
+                yield env2
+        elif kind == "unify":
+            for env2 in self.unify(package, expr[1], expr[2], env):
+                yield env2
+        elif kind == "cmp":
+            for left, env2 in self.eval_term(package, expr[2], env):
+                for right, env3 in self.eval_term(package, expr[3], env2):
+                    if _compare(expr[1], left, right):
+                        yield env3
+        else:
+            for value, env2 in self.eval_term(package, expr[1], env):
+                if value is not False:
+                    yield env2
+
+    def is_unbound(self, package, term, env):
+        if term[0] == "var":
+            name = term[1]
+            return name not in env and not self._resolves(package, name)
+        if term[0] == "array":
+            return any(self.is_unbound(package, t, env) for t in term[1])
+        return False
+
+    def _resolves(self, package, name):
+        module = self.packages[package]
+        return name in _GLOBALS or name in module["rules"] or name in module["imports"]
+
+    def unify(self, package, left, right, env, assign=False):
+        if assign or self.is_unbound(package, left, env):
+            for value, env2 in self.eval_term(package, right, env):
+                for env3 in self.bind(package, left, value, env2):
+                    yield env3
+        elif self.is_unbound(package, right, env):
+            for value, env2 in self.eval_term(package, left, env):
+                for env3 in self.bind(package, right, value, env2):
+                    yield env3
+        else:
+            for lvalue, env2 in self.eval_term(package, left, env):
+                for rvalue, env3 in self.eval_term(package, right, env2):
+                    if _equal(lvalue, rvalue):
+                        yield env3
+
+    def bind(self, package, pattern, value, env):
+        if pattern[0] == "var" and pattern[1] not in env:
+            env = dict(env)
+            env[pattern[1]] = value
+            yield env
+        elif pattern[0] == "array":
+            if not isinstance(value, list) or len(value) != len(pattern[1]):
+                return
+            envs = [env]
+            for item, item_value in zip(pattern[1], value):
+                envs = [
+                    env3
+                    for env2 in envs
+                    for env3 in self.bind(package, item, item_value, env2)
+                ]
+            for env2 in envs:
+                yield env2
+        else:
+            for expected, env2 in self.eval_term(package, pattern, env):
+                if _equal(expected, value):
+                    yield env2
+
+    # Terms
+
+    def eval_terms(self, package, terms, env, index=0, values=()):
+        if index == len(terms):
+            yield list(values), env
+            return
+        for value, env2 in self.eval_term(package, terms[index], env):
+            for result in self.eval_terms(
+                package, terms, env2, index + 1, values + (value,)
+            ):
+                yield result
+
+    def eval_term(self, package, term, env):
+        kind = term[0]
+        if kind == "lit":
+            yield term[1], env
+        elif kind == "var":
+            value = self.lookup(package, term[1], env)
+            if value is not _MISSING:
+                yield value, env
+        elif kind == "ref":
+            for result in self.eval_ref(package, term[1], term[2], env):
+                yield result
+        elif kind == "call":
+            for result in self.eval_call(package, term[1], term[2], env):
+                yield result
+        elif kind == "array":
+            for values, env2 in self.eval_terms(package, term[1], env):
+                yield values, env2
+        elif kind == "set":
+            for values, env2 in self.eval_terms(package, term[1], env):
+                yield _unique(values), env2
+        elif kind == "object":
+            flat = [t for pair in term[1] for t in pair]
+            for values, env2 in self.eval_terms(package, flat, env):
+                yield dict(zip(values[::2], values[1::2])), env2
+        elif kind == "compr":
+            collected = []
+            for env2 in self.eval_body(package, term[3], 0, env):
+                for value, _ in self.eval_term(package, term[2], env2):
+                    collected.append(value)
+            yield (_unique(collected) if term[1] == "set" else collected), env
+        elif kind == "arith":
+            for left, env2 in self.eval_term(package, term[2], env):
+                for right, env3 in self.eval_term(package, term[3], env2):
+                    try:
+                        yield _ARITH[term[1]](_number(left), _number(right)), env3
+                    except (_Undefined, ZeroDivisionError):
+                        pass
+        else:
+            raise RegoError("unknown term %r" % kind)
+
+    def lookup(self, package, name, env):
+        if name in env:
+            return env[name]
+        if name == "input":
+            return self.input
+        module = self.packages[package]
+        if name in module["rules"]:
+            return self.rule_value(package, name)
+        if name in module["imports"]:
+            return self.lookup_path(package, module["imports"][name])
+        return _MISSING
+
+    def lookup_path(self, package, path):
+        # Resolve a static path such as data.pkg.rule.field or input.field.
+        if path[0] == "input":
+            value, rest = self.input, path[1:]
+        elif path[0] == "data":
+            for end in range(len(path) - 1, 1, -1):
+                name = ".".join(path[1:end])
+                if name in self.packages and path[end] in self.packages[name]["rules"]:
+                    value = self.rule_value(name, path[end])
+                    rest = path[end + 1 :]
+                    break
+            else:
+                return _MISSING
+        else:
+            return self.lookup(package, path[0], {})
+        for key in rest:
+            if isinstance(value, dict) and key in value:
+                value = value[key]
+            else:
+                return _MISSING
+        return value
+
+    def eval_ref(self, package, head, path, env):
+        if head[0] == "var" and head[1] not in env:
+            # Collect the static prefix so data and import refs resolve to rules
+            static = [head[1]]
+            module = self.packages[package]
+            if head[1] in module["imports"]:
+                static = list(module["imports"][head[1]])
+            if static[0] == "data":
+                index = 0
+                while index < len(path) and path[index][0] == "lit":
+                    static.append(path[index][1])
+                    index += 1
+                for split in range(len(static), 1, -1):
+                    value = self.lookup_path(package, static[:split])
+                    if value is not _MISSING:
+                        rest = [["lit", part] for part in static[split:]]
+                        for result in self.walk(
+                            package, value, rest + path[index:], 0, env
+                        ):
+                            yield result
+                        return
+                return
+        for value, env2 in self.eval_term(package, head, env):
+            for result in self.walk(package, value, path, 0, env2):
+                yield result
+
+    def walk(self, package, value, path, index, env):
+        if index == len(path):
+            yield value, env
+            return
+        element = path[index]
+        if element[0] == "var" and self.is_unbound(package, element, env):
+            if isinstance(value, list):
+                keys = range(len(value))
+            elif isinstance(value, dict):
+                keys = list(value)
+            else:
+                return
+            for key in keys:
+                env2 = dict(env)
+                env2[element[1]] = key
+                for result in self.walk(package, value[key], path, index + 1, env2):
+                    yield result
+            return
+        for key, env2 in self.eval_term(package, element, env):
+            if isinstance(value, dict) and key in value:
+                child = value[key]
+            elif (
+                isinstance(value, list)
+                and isinstance(key, int)
+                and not isinstance(key, bool)
+                and -1 < key < len(value)
+            ):
+                child = value[key]
+            else:
+                continue
+            for result in self.walk(package, child, path, index + 1, env2):
+                yield result
+
+    def eval_call(self, package, name, args, env):
+        target = self.resolve_function(package, name)
+        for values, env2 in self.eval_terms(package, args, env):
+            if target is None:
+                builtin = BUILTINS.get(".".join(name))
+                if builtin is None:
+                    raise RegoError("unknown function %s" % ".".join(name))
+                try:
+                    result = builtin(*values)
+                except (_Undefined, TypeError, ValueError, IndexError):
+                    continue
+                yield result, env2
+            else:
+                for result in self.call_function(target[0], target[1], values):
+                    yield result, env2
+
+    def resolve_function(self, package, name):
+        module = self.packages[package]
+        if len(name) == 1:
+            if name[0] in module["rules"]:
+                return package, name[0]
+            return None
+        path = name
+        if name[0] in module["imports"]:
+            path = module["imports"][name[0]] + name[1:]
+        if path[0] != "data":
+            return None
+        target = ".".join(path[1:-1])
+        if target in self.packages and path[-1] in self.packages[target]["rules"]:
+            return target, path[-1]
+        raise RegoError("unknown function %s" % ".".join(name))
+
+    def call_function(self, package, name, values):
+        # Functions are single valued: the first definition that succeeds wins.
+        for rule in self.packages[package]["rules"][name]:
+            if rule["kind"] != "function" or len(rule["args"]) != len(values):
+                continue
+            envs = [{}]
+            for arg, value in zip(rule["args"], values):
+                envs = [e2 for e in envs for e2 in self.bind(package, arg, value, e)]
+            for env in envs:
+                for body in rule["bodies"]:
+                    for env2 in self.eval_body(package, body, 0, env):
+                        if rule["value"] is None:
+                            yield True
+                            return
+                        for value, _ in self.eval_term(package, rule["value"], env2):
+                            yield value
+                            return
+
+
+class Policy:
+    def __init__(self, packages, digest=None):
+        self.packages = packages
+        self.digest = digest
+
+    def failures(self, document, namespace):
+        # Returns the failure messages of every deny/violation rule in the
+        # namespace, the same rules conftest treats as failures.
+        if namespace not in self.packages:
+            raise RegoError("no policies found for namespace %s" % namespace)
+        evaluation = _Evaluation(self.packages, document)
+        messages = []
+        for name in sorted(self.packages[namespace]["rules"]):
+            if not FAILURE_RULE.match(name):
+                continue
+            value = evaluation.rule_value(namespace, name)
+            if value is _MISSING:
+                continue
+            for failure in value if isinstance(value, list) else [value]:
+                if isinstance(failure, dict) and "msg" in failure:
+                    failure = failure["msg"]
+                messages.append(failure)
+        return messages
+
+
+def load_policy(path, namespace=None, cache_dir=None):
+    # Parsed policies are cached as JSON under cache_dir, keyed by the content
+    # hash of the policy directory and the namespace, so they are only parsed
+    # again when a .rego file changes.
+    sources = _read_policy_dir(path)
+    digest = _hash_sources(sources)
+    if not cache_dir:
+        return Policy(_parse_sources(sources), digest)
+
+    key = "%s:%s:%s" % (CACHE_VERSION, digest, namespace)
+    cache_path = os.path.join(
+        cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json"
+    )
+    try:
+        with open(cache_path) as f:
+            return Policy(json.load(f), digest)
+    except (IOError, OSError, ValueError):
+        pass
+
+    packages = _parse_sources(sources)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(packages, f)
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError):
+        # The cache is an optimization, a read-only location is not an error.
+        pass
+    return Policy(packages, digest)
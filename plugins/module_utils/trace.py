@@ -0,0 +1,176 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+# Span tracing for module runs, written in the Chrome trace event format so a
+# run can be opened in chrome://tracing or https://ui.perfetto.dev without a
+# collector. Tracing is off unless start() is called, and span() is then a
+# no-op, so instrumented code paths cost one global lookup.
+
+import functools
+import json
+import os
+import threading
+import time
+
+_TRACER = None
+
+
+class _NoSpan(object):
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span(object):
+    def __init__(self, tracer, name, category, args, lane=None):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.lane = lane
+
+    def __enter__(self):
+        self.start = time.time()
+        return self.args
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not issubclass(exc_type, SystemExit):
+            self.args["error"] = exc_type.__name__
+        self.tracer.add(
+            self.name, self.category, self.start, time.time(), self.args, self.lane
+        )
+        return False
+
+
+class Tracer(object):
+    def __init__(self, name):
+        self.name = name
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.events = []
+        self.threads = {}
+
+    def _tid(self, lane=None):
+        # Spans of concurrent asyncio requests share a thread but overlap, so
+        # each request slot gets a track of its own, shown as a thread.
+        if lane is None:
+            ident = threading.current_thread().ident
+            label = threading.current_thread().name
+        else:
+            ident = ("lane", lane)
+            label = "request lane %d" % lane
+        tid = self.threads.get(ident)
+        if tid is None:
+            tid = self.threads[ident] = len(self.threads) + 1
+            self.events.append(
+                dict(
+                    name="thread_name",
+                    ph="M",
+                    pid=self.pid,
+                    tid=tid,
+                    args=dict(name=label),
+                )
+            )
+        return tid
+
+    def add(self, name, category, start, end, args, lane=None):
+        with self.lock:
+            self.events.append(
+                dict(
+                    name=name,
+                    cat=category,
+                    ph="X",
+                    ts=int(start * 1000000),
+                    dur=int((end - start) * 1000000),
+                    pid=self.pid,
+                    tid=self._tid(lane),
+                    args=args,
+                )
+            )
+
+    def write(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        path = os.path.join(
+            directory,
+            "%s-%s-%d.trace.json"
+            % (self.name, time.strftime("%Y%m%dT%H%M%S"), self.pid),
+        )
+        with self.lock:
+            events = [
+                dict(
+                    name="process_name",
+                    ph="M",
+                    pid=self.pid,
+                    tid=0,
+                    args=dict(name=self.name),
+                )
+            ] + self.events
+        with open(path, "w") as f:
+            json.dump(dict(traceEvents=events, displayTimeUnit="ms"), f)
+        return path
+
+
+def start(name):
+    global _TRACER
+    _TRACER = Tracer(name)
+    return _TRACER
+
+
+def stop():
+    global _TRACER
+    tracer, _TRACER = _TRACER, None
+    return tracer
+
+
+def active():
+    return _TRACER is not None
+
+
+def span(name, category="module", **args):
+    # Context manager timing a block. The value bound by "with ... as" is the
+    # span's args dict, so results known only at the end can be added to it.
+    tracer = _TRACER
+    if tracer is None:
+        return _NO_SPAN
+    return _Span(tracer, name, category, args)
+
+
+def lane_span(lane, name, category="module", **args):
+    # Like span(), on the track of request slot `lane` instead of the
+    # current thread, for requests that run concurrently on one event loop.
+    tracer = _TRACER
+    if tracer is None:
+        return _NO_SPAN
+    return _Span(tracer, name, category, args, lane)
+
+
+def event(name, category, start, end, lane=None, **args):
+    # Records a span whose times are already known, such as a wait that
+    # asynchronous requests share.
+    tracer = _TRACER
+    if tracer is not None:
+        tracer.add(name, category, start, end, args, lane)
+
+
+def traced(name=None, category="module"):
+    # Decorator recording a span for every call of the function.
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _TRACER is None:
+                return func(*args, **kwargs)
+            with span(span_name, category):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
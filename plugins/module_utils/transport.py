@@ -0,0 +1,232 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+# Asynchronous transport for the bulk paths of the modules, such as copying
+# every flag and segment of a project. The requests of a run share one
+# asyncio event loop: at most `concurrency` of them are in flight, and a 429
+# response pauses all of them until the rate limit resets. Requests go
+# through aiohttp when it is installed, so each one in flight costs a
+# coroutine instead of a thread. Without it they run on a thread pool of the
+# concurrency's size, through the generated client's urllib3 connection pool.
+# It uses async/await, so it needs Python 3.5 or later, which the modules that
+# import it list in their requirements.
+
+import asyncio
+import ssl
+import time
+import traceback
+
+import launchdarkly_api
+from ansible.module_utils._text import to_text
+from ansible.module_utils.six.moves.urllib.parse import quote, urlencode
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils import (
+    base,
+    json_codec,
+    trace,
+)
+
+AIOHTTP_IMP_ERR = None
+try:
+    import aiohttp
+
+    HAS_AIOHTTP = True
+except ImportError:
+    AIOHTTP_IMP_ERR = traceback.format_exc()
+    HAS_AIOHTTP = False
+
+DEFAULT_CONCURRENCY = 10
+
+
+class RateLimiter(object):
+    # Shared by every request of a client. After a 429 response, requests
+    # wait until the reset time the API gave instead of retrying at once.
+    def __init__(self):
+        self.resume = 0.0
+
+    async def wait(self):
+        delay = self.resume - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def limited(self, headers, lane=None):
+        reset = headers.get("X-RateLimit-Reset") if headers else None
+        seconds = max(base.reset_rate(reset), 1) if reset else 1
+        resume = time.time() + seconds
+        # Requests in flight when the limit was hit all get a 429, but the
+        # pause is only counted once.
+        if resume > self.resume + 0.5:
+            if base._TIMING is not None:
+                base._TIMING.sleep(seconds)
+            # Recorded on the lane of the request that waits it out first.
+            trace.event(
+                "rate limit wait",
+                "rate_limit",
+                time.time(),
+                resume,
+                lane=lane,
+                seconds=seconds,
+            )
+        self.resume = max(self.resume, resume)
+
+
+class AsyncClient(object):
+    def __init__(self, configuration, concurrency=DEFAULT_CONCURRENCY):
+        self.configuration = configuration
+        self.concurrency = max(concurrency, 1)
+        self.limiter = RateLimiter()
+        self.headers = {
+            "Authorization": configuration.get_api_key_with_prefix("Authorization"),
+            "User-Agent": configuration.user_agent,
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+            "Content-Type": "application/json",
+        }
+        self._session = None
+        self._semaphore = None
+        self._lanes = []
+        self._executor = None
+        self._rest = None
+
+    def run(self, calls):
+        # Runs the coroutines in calls on a new event loop and returns their
+        # results in order. The first exception cancels the calls still
+        # running and is raised.
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self._run(calls))
+        finally:
+            loop.close()
+
+    async def _run(self, calls):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        # Free trace lanes, one per request that can be in flight.
+        self._lanes = list(range(self.concurrency, 0, -1))
+        self._open()
+        tasks = [asyncio.ensure_future(call) for call in calls]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            await self._close()
+
+    def _open(self):
+        if HAS_AIOHTTP:
+            if not self.configuration.verify_ssl:
+                context = False
+            else:
+                context = ssl.create_default_context(
+                    cafile=self.configuration.ssl_ca_cert
+                )
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, ssl=context),
+                headers=self.headers,
+                auto_decompress=True,
+            )
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+            self._rest = launchdarkly_api.rest.RESTClientObject(
+                self.configuration, maxsize=self.concurrency
+            )
+
+    async def _close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _url(self, template, params, query=None):
+        path = template
+        for name, value in (params or {}).items():
+            path = path.replace(
+                "{%s}" % name,
+                quote(str(value), safe=self.configuration.safe_chars_for_path_param),
+            )
+        if query:
+            path += "?" + urlencode(query)
+        return self.configuration.host + path
+
+    async def request(self, method, template, params=None, body=None, query=None):
+        # Sends one API request and returns the decoded JSON response, waiting
+        # out rate limits. template is the resource path with {name}
+        # placeholders, as in the generated client, filled from params.
+        # Errors raise launchdarkly_api.rest.ApiException, like the client.
+        url = self._url(template, params, query)
+        endpoint = "%s %s" % (method, template)
+        data = None if body is None else json_codec.dumps_bytes(body)
+        async with self._semaphore:
+            lane = self._lanes.pop()
+            try:
+                while True:
+                    await self.limiter.wait()
+                    start = time.time()
+                    with trace.lane_span(lane, endpoint, "api", url=url) as span:
+                        status, reason, headers, payload, size = await self._send(
+                            method, url, data
+                        )
+                        span.update(status=status, bytes=size)
+                    if base._TIMING is not None:
+                        base._TIMING.record(endpoint, status, time.time() - start, size)
+                    if status == 429:
+                        self.limiter.limited(headers, lane)
+                        continue
+                    break
+            finally:
+                self._lanes.append(lane)
+        if not 200 <= status <= 299:
+            e = launchdarkly_api.rest.ApiException(status=status, reason=reason)
+            e.body = to_text(payload, errors="surrogate_or_strict")
+            e.headers = headers
+            raise e
+        if not payload:
+            return None
+        return json_codec.loads(payload)
+
+    async def _send(self, method, url, data):
+        if self._session is not None:
+            async with self._session.request(
+                method,
+                url,
+                data=data,
+                proxy=self.configuration.proxy,
+            ) as response:
+                payload = await response.read()
+                size = response.content_length
+                return (
+                    response.status,
+                    response.reason,
+                    response.headers,
+                    payload,
+                    len(payload) if size is None else size,
+                )
+
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(
+            self._executor, self._send_sync, method, url, data
+        )
+        size = response.getheader("Content-Length")
+        return (
+            response.status,
+            response.reason,
+            response.getheaders(),
+            response.data,
+            len(response.data or b"") if size is None else int(size),
+        )
+
+    def _send_sync(self, method, url, data):
+        response = self._rest.pool_manager.request(
+            method,
+            url,
+            body=data,
+            headers=self.headers,
+            preload_content=True,
+        )
+        return launchdarkly_api.rest.RESTResponse(response)
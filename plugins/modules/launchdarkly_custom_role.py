@@ -112,16 +112,21 @@ from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.claus
     clause_argument_spec,
 )
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     fail_exit,
     ld_common_argument_spec,
-    rego_test,
+    PatchOp,
+    profile_main,
+    validate_params,
 )
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.policy import (
     policy_argument_spec,
 )
 
 
+@profile_main
 def main():
     argument_spec = ld_common_argument_spec()
     argument_spec.update(
@@ -134,6 +139,7 @@ def main():
         )
     )
     module = AnsibleModule(argument_spec=argument_spec)
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -141,9 +147,7 @@ def main():
         )
 
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.CustomRolesApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.CustomRolesApi(api_client(configuration))
 
     if module.params["state"] == "present":
         if module.params.get("key") and _fetch_custom_role(module, api_instance):
@@ -164,7 +168,7 @@ def _parse_custom_role_param(module, param_name, key=None):
     else:
         patch = dict(path=path, op="replace", value=module.params[param_name])
 
-    return launchdarkly_api.PatchOperation(**patch)
+    return PatchOp(**patch)
 
 
 def _parse_policies(policies):
@@ -184,7 +188,7 @@ def _delete_custom_role(module, api_instance):
 
 def _create_custom_role(module, api_instance):
     if module.params["conftest"]["enabled"]:
-        rego_test(module)
+        validate_params(module)
     name = (
         module.params["name"]
         if module.params["name"] is not None
@@ -217,7 +221,7 @@ def _configure_custom_role(module, api_instance):
     patches = []
     for key in module.params:
         if (
-            key not in ["state", "api_key", "key", "conftest"]
+            key not in ["state", "api_key", "key", "conftest", "debug_timing"]
             and module.params[key] is not None
         ):
             patches.append(_parse_custom_role_param(module, key))
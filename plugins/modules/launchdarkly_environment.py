@@ -115,10 +115,13 @@ from ansible.module_utils._text import to_native
 from ansible.module_utils.common._json_compat import json
 from ansible.module_utils.six import PY2, iteritems, string_types
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     parse_env_param,
     fail_exit,
     ld_common_argument_spec,
+    profile_main,
 )
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.environment import (
     ld_env_arg_spec,
@@ -126,6 +129,7 @@ from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.envir
 )
 
 
+@profile_main
 def main():
     mutually_exclusive = []
     spec = ld_common_argument_spec()
@@ -149,6 +153,7 @@ def main():
     )
 
     module = AnsibleModule(argument_spec=spec, mutually_exclusive=mutually_exclusive)
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -156,9 +161,7 @@ def main():
         )
 
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.EnvironmentsApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.EnvironmentsApi(api_client(configuration))
 
     if module.params["state"] == "present":
         environment = _fetch_environment(module, api_instance)
@@ -185,19 +188,18 @@ def _delete_environment(module, api_instance):
 
 
 def _create_environment(module, api_instance):
-
-    environment_config = {
-        "name": module.params["name"],
-        "key": module.params["environment_key"],
-        "color": module.params["color"],
-    }
-
-    if module.params["default_ttl"]:
-        environment_config["defaultTtl"] = module.params["default_ttl"]
+    # The create endpoint accepts every setting the module manages, so a new
+    # environment needs no follow-up patch.
+    environment_config = dict(
+        (key, module.params[key])
+        for key in launchdarkly_api.EnvironmentPost.attribute_map
+        if key != "key" and module.params.get(key) is not None
+    )
+    environment_config["key"] = module.params["environment_key"]
     environment_body = launchdarkly_api.EnvironmentPost(**environment_config)
 
     try:
-        _, status, _ = api_instance.post_environment_with_http_info(
+        response, status, _ = api_instance.post_environment_with_http_info(
             project_key=module.params["project_key"], environment_body=environment_body
         )
         if status != 201:
@@ -207,7 +209,11 @@ def _create_environment(module, api_instance):
     except ApiException as e:
         fail_exit(module, e)
 
-    _configure_environment(module, api_instance)
+    module.exit_json(
+        changed=True,
+        msg="environment successfully created",
+        environment=response.to_dict(),
+    )
 
 
 def _configure_environment(module, api_instance, environment=None):
@@ -238,7 +244,14 @@ def _configure_environment(module, api_instance, environment=None):
     for key in module.params:
         if (
             key
-            not in ["state", "api_key", "environment_key", "project_key", "conftest"]
+            not in [
+                "state",
+                "api_key",
+                "environment_key",
+                "project_key",
+                "conftest",
+                "debug_timing",
+            ]
             and module.params[key] is not None
         ):
             patches.append(parse_env_param(module.params, key))
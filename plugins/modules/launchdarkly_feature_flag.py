@@ -130,13 +130,22 @@ from ansible.module_utils.common._json_compat import json
 from ansible.module_utils.six import PY2, iteritems, string_types
 
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
+    _build_comment,
     configure_instance,
+    debug_timing,
     fail_exit,
     ld_common_argument_spec,
+    PatchOp,
+    profile_main,
     validate_params,
 )
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.trace import (
+    traced,
+)
 
 
+@profile_main
 def main():
     required_if = [
         ["kind", "str", ["variations"]],
@@ -174,6 +183,7 @@ def main():
     )
 
     module = AnsibleModule(argument_spec=argument_spec, required_if=required_if)
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -182,9 +192,7 @@ def main():
 
     # Set up API
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.FeatureFlagsApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.FeatureFlagsApi(api_client(configuration))
 
     if module.params["state"] == "present":
         feature_flag = _fetch_flag(module, api_instance)
@@ -196,6 +204,7 @@ def main():
         _delete_flag(module, api_instance)
 
 
+@traced(category="diff")
 def configure_flag(params, feature_flag):
     patches = []
     if feature_flag:
@@ -267,6 +276,7 @@ def configure_flag(params, feature_flag):
                     "clone",
                     "variations",
                     "conftest",
+                    "debug_timing",
                 ]
                 and params[key] is not None
             ):
@@ -299,7 +309,7 @@ def _configure_flag(module, api_instance, feature_flag=None):
 
 def _parse_flag_param(params, param_name, key, op="replace"):
     path = "/" + launchdarkly_api.FeatureFlagBody.attribute_map[key]
-    return launchdarkly_api.PatchOperation(path=path, op=op, value=params[param_name])
+    return PatchOp(path=path, op=op, value=params[param_name])
 
 
 def _create_flag(module, api_instance):
@@ -332,6 +342,10 @@ def _create_flag(module, api_instance):
         "temporary": module.params["temporary"],
         "name": module.params["name"],
     }
+    for key in ["description", "tags", "include_in_snippet"]:
+        if module.params[key] is not None:
+            attr = launchdarkly_api.FeatureFlagBody.attribute_map[key]
+            feature_flag_config[attr] = module.params[key]
 
     try:
         response, status, headers = api_instance.post_feature_flag_with_http_info(
@@ -345,8 +359,20 @@ def _create_flag(module, api_instance):
         else:
             fail_exit(module, e)
 
-    _configure_flag(module, api_instance, response)
-    module.exit_json(msg="flag successfully created", content=api_response.to_dict())
+    # The maintainer cannot be set by the create endpoint.
+    if module.params["maintainer_id"] is not None:
+        patches = [PatchOp("replace", "/maintainerId", module.params["maintainer_id"])]
+        comments = dict(comment=_build_comment(module), patch=patches)
+        try:
+            response, status, headers = api_instance.patch_feature_flag_with_http_info(
+                module.params["project_key"], module.params["key"], comments
+            )
+        except ApiException as e:
+            fail_exit(module, e)
+
+    module.exit_json(
+        changed=True, msg="flag successfully created", content=response.to_dict()
+    )
 
 
 def _fetch_flag(module, api_instance):
@@ -395,30 +421,26 @@ def _patch_variations(new_variations, variations, patches):
     if newIndex < oldVariations:
         # iterating over variations for range to be inclusive
         for i in range(new_variations_len, len(variations)):
-            patches.append(
-                launchdarkly_api.PatchOperation(
-                    op="remove", path="/variations/%d" % i, value="needed_for_call"
-                )
-            )
+            patches.append(PatchOp(op="remove", path="/variations/%d" % i))
     else:
         for i in range(new_variations_len):
             if i <= oldVariations:
                 patches.append(
-                    launchdarkly_api.PatchOperation(
+                    PatchOp(
                         op="replace",
                         path="/variations/%d/name" % i,
                         value=new_variations[i]["name"],
                     )
                 )
                 patches.append(
-                    launchdarkly_api.PatchOperation(
+                    PatchOp(
                         op="replace",
                         path="/variations/%d/description" % i,
                         value=new_variations[i]["description"],
                     )
                 )
                 patches.append(
-                    launchdarkly_api.PatchOperation(
+                    PatchOp(
                         op="replace",
                         path="/variations/%d/value" % i,
                         value=new_variations[i]["value"],
@@ -431,9 +453,7 @@ def _patch_variations(new_variations, variations, patches):
                     value=new_variations[i]["value"],
                 )
                 patches.append(
-                    launchdarkly_api.PatchOperation(
-                        op="add", path="/variations/%d" % i, value=variation
-                    )
+                    PatchOp(op="add", path="/variations/%d" % i, value=variation)
                 )
                 return patches
     return patches
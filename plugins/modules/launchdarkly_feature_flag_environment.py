@@ -34,9 +34,11 @@ options:
         default: 'default'
     environment_key:
         description:
-            - The environment key
+            - The environment key, or a list of environment keys to apply the same configuration to.
+            - The flag is fetched once for all of the environments, and their changes are sent in a single patch.
         required: yes
-        type: str
+        type: list
+        elements: str
     off_variation:
         description:
             - Variation served if flag targeting is turned off
@@ -112,6 +114,19 @@ EXAMPLES = r"""
     prerequisites:
       - variation: 0
         key: example_flag
+
+# Target the same users in several environments with one request
+- launchdarkly_feature_flag_environment:
+    flag_key: example_flag
+    environment_key:
+      - dev
+      - staging
+      - production
+    targets:
+        - variation: 0
+          values:
+            - qa@example.com
+          state: add
 """
 
 RETURN = r"""
@@ -119,6 +134,10 @@ RETURN = r"""
 feature_flag_environment:
     description: Dictionary containing a L(Feature Flag Config, https://github.com/launchdarkly/api-client-python/blob/2.0.30/docs/FeatureFlagConfig.md)
     type: dict
+    returned: on success, when a single environment is given
+feature_flag_environments:
+    description: Dictionary of L(Feature Flag Configs, https://github.com/launchdarkly/api-client-python/blob/2.0.30/docs/FeatureFlagConfig.md) by environment key
+    type: dict
     returned: on success
 """
 
@@ -143,19 +162,27 @@ from ansible.module_utils._text import to_native
 from ansible.module_utils.common._json_compat import json
 
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     _patch_path,
     _patch_op,
     _build_comment,
     fail_exit,
     ld_common_argument_spec,
-    rego_test,
+    PatchOp,
+    profile_main,
+    validate_params,
+)
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.trace import (
+    traced,
 )
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.rule import (
     rule_argument_spec,
 )
 
 
+@profile_main
 def main():
     argument_spec = ld_common_argument_spec()
     argument_spec.update(
@@ -166,7 +193,7 @@ def main():
                 choices=["absent", "present", "enabled", "disabled"],
             ),
             flag_key=dict(type="str", required=True),
-            environment_key=dict(type="str", required=True),
+            environment_key=dict(type="list", elements="str", required=True),
             project_key=dict(type="str", required=True),
             off_variation=dict(type="int"),
             track_events=dict(type="bool"),
@@ -212,6 +239,7 @@ def main():
     )
 
     module = AnsibleModule(argument_spec=argument_spec)
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -219,15 +247,13 @@ def main():
         )
 
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.FeatureFlagsApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.FeatureFlagsApi(api_client(configuration))
 
     if module.params["state"] == "absent":
         _delete_feature_flag_env(module, api_instance)
     else:
-        feature_flag = _fetch_feature_flag(module, api_instance)
-        _configure_feature_flag_env(module, api_instance, feature_flag)
+        environments = _fetch_feature_flag(module, api_instance)
+        _configure_feature_flag_env(module, api_instance, environments)
 
 
 def _toggle_flag(state, patches, feature_flag, env):
@@ -240,9 +266,7 @@ def _toggle_flag(state, patches, feature_flag, env):
 
     if feature_flag.on != value:
         path = _patch_path(env, "on")
-        patches.append(
-            launchdarkly_api.PatchOperation(path=path, op="replace", value=value)
-        )
+        patches.append(PatchOp(path=path, op="replace", value=value))
 
     return patches
 
@@ -250,9 +274,10 @@ def _toggle_flag(state, patches, feature_flag, env):
 def _parse_flag_param(params, env, key, op="replace"):
     path = _patch_path(env, launchdarkly_api.FeatureFlagConfig.attribute_map[key])
 
-    return launchdarkly_api.PatchOperation(path=path, op=op, value=params[key])
+    return PatchOp(path=path, op=op, value=params[key])
 
 
+@traced(category="diff")
 def configure_feature_flag_env(params, feature_flag):
     env = params["environment_key"]
     patches = []
@@ -298,24 +323,21 @@ def configure_feature_flag_env(params, feature_flag):
                     ):
                         continue
                     else:
-                        new_targets = list(
-                            set(target["values"])
-                            - set(flag_var_index[target["variation"]]["targets"])
-                        )
+                        # Each new value is appended with its own add, so
+                        # values added by someone else since the flag was
+                        # read are kept.
+                        seen = set(flag_var_index[target["variation"]]["targets"])
                         target_index = str(flag_var_index[target["variation"]]["index"])
-                        new_targets_idx = len(
-                            flag_var_index[target["variation"]]["targets"]
+                        path = (
+                            _patch_path(env, "targets")
+                            + "/"
+                            + target_index
+                            + "/values/-"
                         )
-                        for val_idx, val in enumerate(new_targets):
-                            new_idx = str(new_targets_idx + val_idx)
-                            path = (
-                                _patch_path(env, "targets")
-                                + "/"
-                                + target_index
-                                + "/values/"
-                                + new_idx
-                            )
-                            patches.append(_patch_op("add", path, new_targets[val_idx]))
+                        for val in target["values"]:
+                            if val not in seen:
+                                seen.add(val)
+                                patches.append(_patch_op("add", path, val))
                         continue
 
                 else:
@@ -403,6 +425,7 @@ def configure_feature_flag_env(params, feature_flag):
                 "comment",
                 "salt",
                 "conftest",
+                "debug_timing",
             ]
             and params[key] is not None
         ):
@@ -411,11 +434,22 @@ def configure_feature_flag_env(params, feature_flag):
     return patches, clauses_list
 
 
-def _configure_feature_flag_env(module, api_instance, feature_flag=None):
+def _configure_feature_flag_env(module, api_instance, environments):
     if module.params["conftest"]["enabled"]:
-        rego_test(module)
+        validate_params(module)
 
-    patches, clauses_list = configure_feature_flag_env(module.params, feature_flag)
+    env_keys = module.params["environment_key"]
+    patches = []
+    clauses_list = []
+    # Each environment is diffed on its own copy of the parameters, which
+    # configure_feature_flag_env consumes, and all of the patches are sent
+    # together.
+    for env in env_keys:
+        params = copy.deepcopy(module.params)
+        params["environment_key"] = env
+        env_patches, env_clauses = configure_feature_flag_env(params, environments[env])
+        patches.extend(env_patches)
+        clauses_list.extend(env_clauses)
 
     if patches:
         comments = dict(comment=_build_comment(module), patch=patches)
@@ -427,27 +461,32 @@ def _configure_feature_flag_env(module, api_instance, feature_flag=None):
             )
         except Exception as e:
             raise AnsibleError("Error applying configuration: %s" % to_native(e))
-        output_patches = []
-        for patch in patches:
-            if type(patch) is dict:
-                output_patches.append(patch)
-            else:
-                output_patches.append(patch.to_dict())
+        result = dict(
+            feature_flag_environments=dict(
+                (env, api_response.environments[env].to_dict()) for env in env_keys
+            )
+        )
+        if len(env_keys) == 1:
+            result["feature_flag_environment"] = api_response.to_dict()
         module.exit_json(
             changed=True,
             msg="flag environment successfully configured",
-            feature_flag_environment=api_response.to_dict(),
-            patches=output_patches,
+            patches=patches,
             clauses=clauses_list,
+            **result
         )
 
-    module.exit_json(
-        changed=False,
-        msg="flag environment unchanged",
-        feature_flag_environment=feature_flag.to_dict(),
+    result = dict(
+        feature_flag_environments=dict(
+            (env, environments[env].to_dict()) for env in env_keys
+        )
     )
+    if len(env_keys) == 1:
+        result["feature_flag_environment"] = environments[env_keys[0]].to_dict()
+    module.exit_json(changed=False, msg="flag environment unchanged", **result)
 
 
+@traced(category="diff")
 def _process_rules(rules, feature_flag, env):
     patches = []
     clauses_list = []
@@ -694,6 +733,7 @@ def _build_rules(rule):
         return temp_rule
 
 
+@traced(category="diff")
 def _check_prereqs(prereqs, feature_flag):
     if prereqs is not None:
         for idx, target in enumerate(prereqs):
@@ -710,13 +750,12 @@ def _check_prereqs(prereqs, feature_flag):
 
 def _fetch_feature_flag(module, api_instance):
     try:
-        # Get an environment given a project and key.
+        # Get the environments given a project and key, in one request.
         feature_flag = api_instance.get_feature_flag(
             module.params["project_key"],
             module.params["flag_key"],
-            env=[module.params["environment_key"]],
+            env=module.params["environment_key"],
         )
-        return feature_flag.environments[module.params["environment_key"]]
     except ApiException as e:
         if e.status == 404:
             raise AnsibleError(
@@ -725,6 +764,18 @@ def _fetch_feature_flag(module, api_instance):
             )
         fail_exit(module, e)
 
+    missing = [
+        env
+        for env in module.params["environment_key"]
+        if env not in feature_flag.environments
+    ]
+    if missing:
+        raise AnsibleError(
+            "Environment: %s does not exist in Project: %s"
+            % (", ".join(missing), module.params["project_key"])
+        )
+    return feature_flag.environments
+
 
 if __name__ == "__main__":
     main()
@@ -88,11 +88,16 @@ from ansible.module_utils._text import to_native
 from ansible.module_utils.common._json_compat import json
 from ansible.module_utils.six import PY2, iteritems, string_types
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     fail_exit,
+    fetch_json,
+    profile_main,
 )
 
 
+@profile_main
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -102,6 +107,11 @@ def main():
                 no_log=True,
                 fallback=(env_fallback, ["LAUNCHDARKLY_ACCESS_TOKEN"]),
             ),
+            debug_timing=dict(
+                type="bool",
+                default=False,
+                fallback=(env_fallback, ["LAUNCHDARKLY_DEBUG_TIMING"]),
+            ),
             env=dict(type="str"),
             project_key=dict(type="str", required=True),
             key=dict(type="str"),
@@ -110,6 +120,7 @@ def main():
             tag=dict(type="str"),
         )
     )
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -118,9 +129,7 @@ def main():
 
     # Set up API
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.FeatureFlagsApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.FeatureFlagsApi(api_client(configuration))
 
     try:
         feature_flags = fetch_flags(module.params, api_instance)
@@ -138,14 +147,19 @@ def fetch_flags(params, api_instance):
     try:
         if params.get("key"):
             if params.get("env"):
-                response = api_instance.get_feature_flag(
+                response = fetch_json(
+                    api_instance.get_feature_flag,
+                    "FeatureFlag",
                     params["project_key"],
                     params["key"],
                     env=params["env"],
                 )
             else:
-                response = api_instance.get_feature_flag(
-                    params["project_key"], params["key"]
+                response = fetch_json(
+                    api_instance.get_feature_flag,
+                    "FeatureFlag",
+                    params["project_key"],
+                    params["key"],
                 )
 
         else:
@@ -153,9 +167,11 @@ def fetch_flags(params, api_instance):
             filtered_keys = dict(
                 (k, params[k]) for k in keys if k in params and params[k] is not None
             )
-            response = api_instance.get_feature_flags(**filtered_keys)
+            response = fetch_json(
+                api_instance.get_feature_flags, "FeatureFlags", **filtered_keys
+            )
 
-        return response.to_dict()
+        return response
     except launchdarkly_api.rest.ApiException as e:
         if e.status == 404:
             return None
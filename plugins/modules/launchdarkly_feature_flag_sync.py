@@ -78,7 +78,6 @@ feature_flag:
 
 import inspect
 import traceback
-import time
 
 LD_IMP_ERR = None
 try:
@@ -96,12 +95,16 @@ from ansible.module_utils._text import to_native
 from ansible.module_utils.common._json_compat import json
 
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
-    reset_rate,
+    debug_timing,
+    profile_main,
+    rate_limited_call,
     fail_exit,
 )
 
 
+@profile_main
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -112,6 +115,11 @@ def main():
                 no_log=True,
                 fallback=(env_fallback, ["LAUNCHDARKLY_ACCESS_TOKEN"]),
             ),
+            debug_timing=dict(
+                type="bool",
+                default=False,
+                fallback=(env_fallback, ["LAUNCHDARKLY_DEBUG_TIMING"]),
+            ),
             environment_key=dict(type="str", required=True),
             project_key=dict(type="str", required=True),
             flag_key=dict(type="str", required=True),
@@ -140,6 +148,7 @@ def main():
             ),
         )
     )
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -147,17 +156,14 @@ def main():
         )
 
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.FeatureFlagsApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.FeatureFlagsApi(api_client(configuration))
 
     _configure_flag_sync(module, api_instance)
 
 
 def _configure_flag_sync(module, api_instance):
-    results = []
-    max_targets = len(module.params["environment_targets"]) - 1
-    for idx, env in enumerate(module.params["environment_targets"]):
+    # Every copy writes to the same flag, so they are sent one at a time.
+    for env in module.params["environment_targets"]:
         source = {"key": module.params["environment_key"]}
 
         target = {"key": env}
@@ -175,29 +181,18 @@ def _configure_flag_sync(module, api_instance):
             ]
 
         try:
-            response, status, headers = api_instance.copy_feature_flag_with_http_info(
+            response = rate_limited_call(
+                api_instance.copy_feature_flag,
                 module.params["project_key"],
                 module.params["flag_key"],
                 launchdarkly_api.FeatureFlagCopyBody(**feature_flag_copy_body),
             )
-
-            if idx == max_targets:
-                # LD Returns a FeatureFlag Object containing all Environments. Only need last one.
-                feature_flag = response.to_dict()
-
         except ApiException as e:
-            if e.status == 429:
-                time.sleep(reset_rate(e.headers["X-RateLimit-Reset"]))
-                api_instance.copy_feature_flag_with_http_info(
-                    module.params["project_key"],
-                    module.params["flag_key"],
-                    launchdarkly_api.FeatureFlagCopyBody(**feature_flag_copy_body),
-                )
-            else:
-                fail_exit(module, e)
+            fail_exit(module, e)
 
+    # LD Returns a FeatureFlag Object containing all Environments. Only need last one.
     module.exit_json(
-        changed=True, msg="feature flags synced", feature_flag=feature_flag
+        changed=True, msg="feature flags synced", feature_flag=response.to_dict()
     )
 
 
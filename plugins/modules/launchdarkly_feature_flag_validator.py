@@ -15,7 +15,8 @@ DOCUMENTATION = r"""
 module: launchdarkly_feature_flag_validator
 short_description: Validate feature flags by running a configuration test
 description:
-     - Validate LaunchDarkly feature flags in a project, using Conftest OPA Policies written in Rego. Conftest 0.18.0 is required as a binary in your C(PATH).
+     - Validate LaunchDarkly feature flags in a project, using Conftest OPA Policies written in Rego. Conftest 0.18.0 is required as a binary in your C(PATH), unless C(conftest.backend) is C(python).
+     - All flags are evaluated in a single Conftest run, instead of one run per flag.
 version_added: "0.3.0"
 options:
     project_key:
@@ -28,6 +29,47 @@ options:
             - The environment key
         required: no
         type: str
+    tag:
+        description:
+            - Only validate flags with this tag.
+        required: no
+        type: str
+    page_size:
+        description:
+            - Number of flags fetched per API request. Pages are validated while the next page is fetched.
+        required: no
+        type: int
+        default: 100
+    workers:
+        description:
+            - Number of pages validated in parallel.
+        required: no
+        type: int
+        default: 4
+    max_failures:
+        description:
+            - Stop validating once this many flags have failed. C(0) validates every flag.
+        required: no
+        type: int
+        default: 0
+    report_path:
+        description:
+            - File to write validation results to as flags are checked.
+        required: no
+        type: path
+    report_format:
+        description:
+            - Format of C(report_path). C(jsonl) writes one line per failing flag, C(junit) writes a test case per flag.
+        required: no
+        type: str
+        choices: [ jsonl, junit ]
+        default: jsonl
+    state_path:
+        description:
+            - File that stores each flag's version and validation result between runs.
+            - When set, only flags whose version changed since the previous run are evaluated again. The stored results are discarded when a policy file, the namespace, the backend, C(env) or C(tag) changes.
+        required: no
+        type: path
 
 extends_documentation_fragment:
     - launchdarkly_labs.collection.launchdarkly
@@ -42,11 +84,28 @@ validated:
 validation:
     description: List of dictionaries, containing the flag key and list of failures as strings.
     returned: failure
+checked:
+    description: Number of flags validated.
+    type: int
+    returned: always
+reused:
+    description: Number of flags whose result was taken from C(state_path) instead of being evaluated again.
+    type: int
+    returned: always
+stopped_early:
+    description: Whether validation stopped after reaching C(max_failures).
+    type: bool
+    returned: failure
 """
 
+import hashlib
 import inspect
+import os
+import tempfile
 import traceback
+import threading
 import time
+from xml.sax.saxutils import quoteattr, escape
 
 LD_IMP_ERR = None
 try:
@@ -58,17 +117,30 @@ except ImportError:
     HAS_LD = False
 
 from ansible.module_utils.basic import AnsibleModule, missing_required_lib, env_fallback
-from ansible.module_utils._text import to_native
+from ansible.module_utils._text import to_bytes, to_native
 from ansible.module_utils.common._json_compat import json
 from ansible.module_utils.six import PY2, iteritems, string_types
+from ansible.module_utils.six.moves import queue
+from ansible.errors import AnsibleError
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     fail_exit,
+    fetch_flag_pages,
     ld_common_argument_spec,
-    rego_test,
+    profile_main,
+    rego_test_batch,
+)
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils import (
+    json_codec,
+)
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.rego import (
+    policy_hash,
 )
 
 
+@profile_main
 def main():
     argument_spec = ld_common_argument_spec()
     argument_spec.update(
@@ -76,10 +148,17 @@ def main():
             env=dict(type="str"),
             project_key=dict(type="str", required=True),
             tag=dict(type="str"),
+            page_size=dict(type="int", default=100),
+            workers=dict(type="int", default=4),
+            max_failures=dict(type="int", default=0),
+            report_path=dict(type="path"),
+            report_format=dict(type="str", default="jsonl", choices=["jsonl", "junit"]),
+            state_path=dict(type="path"),
         )
     )
 
     module = AnsibleModule(argument_spec=argument_spec)
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -88,57 +167,278 @@ def main():
 
     # Set up API
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.FeatureFlagsApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.FeatureFlagsApi(api_client(configuration))
 
-    feature_flags = _fetch_flags(module, api_instance)
+    if module.params["report_path"]:
+        report = _Report(module.params["report_path"], module.params["report_format"])
+    else:
+        report = None
 
-    flags = feature_flags["items"]
-    results = []
-    for flag in flags:
-        result = rego_test(module, flag)
-        if result.results[0].failures:
-            validation_fail = {"key": flag["key"], "failures": []}
-            for failure in result.results[0].failures:
-                validation_fail["failures"].append(failure["msg"])
-            results.append(validation_fail)
+    if module.params["state_path"]:
+        state = _ValidationState(module, module.params["state_path"])
+    else:
+        state = None
+
+    try:
+        checked, results, stopped = _validate_flags(module, api_instance, report, state)
+    finally:
+        if report:
+            report.close()
+
+    reused = 0
+    if state:
+        state.save(partial=stopped)
+        reused = state.reused
 
     if results:
-        module.exit_json(failed=True, validated=False, validation=results)
+        module.exit_json(
+            failed=True,
+            validated=False,
+            validation=results,
+            checked=checked,
+            reused=reused,
+            stopped_early=stopped,
+        )
     else:
-        module.exit_json(changed=True, validated=True)
+        module.exit_json(changed=True, validated=True, checked=checked, reused=reused)
 
 
-def _fetch_flags(module, api_instance):
-    try:
-        if module.params.get("key"):
-            if module.params.get("env"):
-                response = api_instance.get_feature_flag(
-                    module.params["project_key"],
-                    module.params["key"],
-                    env=module.params["env"],
-                )
-            else:
-                response = api_instance.get_feature_flag(
-                    module.params["project_key"], module.params["key"]
-                )
+def _validate_flags(module, api_instance, report, state=None):
+    # Pages are fetched by one producer thread while workers validate the
+    # previous pages, each page in a single policy run. Results are consumed
+    # here so the report only has one writer.
+    workers = max(module.params["workers"], 1)
+    pages = queue.Queue(maxsize=workers * 2)
+    done = queue.Queue()
+    stop = threading.Event()
 
-        else:
-            keys = ["project_key", "env", "summary", "archived", "tag"]
-            filtered_keys = dict(
-                (k, module.params[k])
-                for k in keys
-                if k in module.params and module.params[k] is not None
-            )
-            response = api_instance.get_feature_flags(**filtered_keys)
+    def produce():
+        params = dict(
+            (k, module.params[k])
+            for k in ["env", "tag"]
+            if module.params.get(k) is not None
+        )
+        try:
+            for page in fetch_flag_pages(
+                api_instance,
+                module.params["project_key"],
+                module.params["page_size"],
+                **params
+            ):
+                if stop.is_set():
+                    break
+                pages.put(page)
+        except Exception as e:
+            done.put(("error", (e, traceback.format_exc())))
+        finally:
+            for _ in range(workers):
+                pages.put(None)
+
+    def consume():
+        while True:
+            page = pages.get()
+            if page is None:
+                done.put(("finished", None))
+                return
+            if stop.is_set():
+                continue
+            try:
+                done.put(("page", (page, _check_page(module, page, state))))
+            except Exception as e:
+                stop.set()
+                done.put(("error", (e, traceback.format_exc())))
+
+    threads = [threading.Thread(target=produce)]
+    threads.extend(threading.Thread(target=consume) for _ in range(workers))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    checked = 0
+    results = []
+    error = None
+    finished = 0
+    max_failures = module.params["max_failures"]
+    while finished < workers:
+        kind, item = done.get()
+        if kind == "finished":
+            finished += 1
+        elif kind == "error":
+            stop.set()
+            error = error or item
+        elif not stop.is_set():
+            page, (failures, fingerprints, reused) = item
+            if state:
+                state.reused += reused
+            for flag, flag_failures, fingerprint in zip(page, failures, fingerprints):
+                checked += 1
+                if state:
+                    state.record(flag["key"], fingerprint, flag_failures)
+                if report:
+                    report.write(flag["key"], flag_failures)
+                if flag_failures:
+                    results.append({"key": flag["key"], "failures": flag_failures})
+                    if max_failures and len(results) >= max_failures:
+                        stop.set()
+                        break
+
+    if error is not None:
+        # Errors raised in the threads, such as policy errors from Conftest,
+        # fail the task with the traceback of the thread that raised them.
+        error, error_traceback = error
+        if isinstance(error, launchdarkly_api.rest.ApiException):
+            try:
+                fail_exit(module, error)
+            except AnsibleError as e:
+                error = e
+        module.fail_json(msg=to_native(error), exception=error_traceback)
+
+    # Pages finish in any order, keep the output stable between runs.
+    results.sort(key=lambda result: result["key"])
+    return checked, results, stop.is_set()
+
+
+def _check_page(module, page, state):
+    # Only flags without a stored verdict for their current version go
+    # through the policy.
+    fingerprints = [_fingerprint(flag) for flag in page]
+    failures = [None] * len(page)
+    if state:
+        for idx, flag in enumerate(page):
+            failures[idx] = state.lookup(flag["key"], fingerprints[idx])
+    pending = [
+        idx for idx, flag_failures in enumerate(failures) if flag_failures is None
+    ]
+    reused = len(page) - len(pending)
+    if pending:
+        checked = rego_test_batch(module, [page[idx] for idx in pending])
+        for idx, flag_failures in zip(pending, checked):
+            failures[idx] = flag_failures
+    return failures, fingerprints, reused
+
+
+# Hyperlinks to other resources, which change without the flag changing.
+_LINK_FIELDS = ("_links", "links", "_site")
+
+
+def _without_links(doc):
+    return dict((k, v) for k, v in iteritems(doc) if k not in _LINK_FIELDS)
+
+
+def _fingerprint(flag):
+    version = flag.get("version", flag.get("_version"))
+    if version is not None:
+        return "version:%s" % version
+    content = _without_links(flag)
+    if isinstance(content.get("environments"), dict):
+        content["environments"] = dict(
+            (key, _without_links(env) if isinstance(env, dict) else env)
+            for key, env in iteritems(content["environments"])
+        )
+    encoded = json_codec.dumps_bytes(content, sort_keys=True, default=str)
+    return "sha1:%s" % hashlib.sha1(encoded).hexdigest()
 
-        return response.to_dict()
-    except launchdarkly_api.rest.ApiException as e:
-        if e.status == 404:
-            return None
+
+class _ValidationState:
+    # Verdicts from previous runs keyed by flag key. They are reused while
+    # the flag version, the policy files and the filters are unchanged.
+
+    def __init__(self, module, path):
+        self.module = module
+        self.path = path
+        conftest = module.params["conftest"]
+        self.policy = "%s:%s:%s:%s:%s" % (
+            policy_hash(conftest["dir"]),
+            conftest["namespace"],
+            conftest["backend"],
+            module.params["env"],
+            module.params["tag"],
+        )
+        self.previous = {}
+        self.current = {}
+        self.reused = 0
+        try:
+            with open(path, "rb") as f:
+                data = json_codec.load(f)
+            if data.get("policy") == self.policy:
+                self.previous = data["flags"]
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    def lookup(self, key, fingerprint):
+        entry = self.previous.get(key)
+        if entry and entry["fingerprint"] == fingerprint:
+            return entry["failures"]
+        return None
+
+    def record(self, key, fingerprint, failures):
+        self.current[key] = {"fingerprint": fingerprint, "failures": failures}
+
+    def save(self, partial=False):
+        # After an early stop keep the verdicts of flags that were not reached.
+        flags = dict(self.previous) if partial else {}
+        flags.update(self.current)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+        with os.fdopen(fd, "wb") as f:
+            json_codec.dump({"policy": self.policy, "flags": flags}, f)
+        self.module.atomic_move(tmp_path, self.path)
+
+
+class _Report:
+    # Writes one entry per validated flag as soon as it is checked.
+
+    # The totals are only known at the end, so the testsuite tag is written
+    # with room for them and rewritten in place by close().
+    _SUITE = (
+        '<testsuite name="launchdarkly_feature_flag_validator" tests="%d" failures="%d"'
+    )
+    _SUITE_WIDTH = len(_SUITE % (0, 0)) + 2 * 10
+
+    def __init__(self, path, report_format):
+        self.format = report_format
+        self.tests = 0
+        self.failures = 0
+        self.file = open(path, "wb")
+        if self.format == "junit":
+            self._write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            self.suite_offset = self.file.tell()
+            self._write_suite()
+
+    def _write(self, text):
+        self.file.write(to_bytes(text, errors="surrogate_or_strict"))
+
+    def _write_suite(self):
+        suite = self._SUITE % (self.tests, self.failures)
+        self._write(suite.ljust(self._SUITE_WIDTH) + ">\n")
+
+    def write(self, key, failures):
+        self.tests += 1
+        if failures:
+            self.failures += 1
+        if self.format == "jsonl":
+            if failures:
+                json_codec.dump({"key": key, "failures": failures}, self.file)
+                self.file.write(b"\n")
+        elif failures:
+            self._write(
+                "  <testcase name=%s>\n    <failure message=%s>%s</failure>\n"
+                "  </testcase>\n"
+                % (
+                    quoteattr(key),
+                    quoteattr(failures[0]),
+                    escape("\n".join(failures)),
+                )
+            )
         else:
-            fail_exit(module, e)
+            self._write("  <testcase name=%s/>\n" % quoteattr(key))
+        self.file.flush()
+
+    def close(self):
+        if self.format == "junit":
+            self._write("</testsuite>\n")
+            self.file.seek(self.suite_offset)
+            self._write_suite()
+        self.file.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,248 @@
+#!/usr/bin/python
+
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+ANSIBLE_METADATA = {
+    "metadata_version": "0.1.0",
+    "status": ["preview"],
+    "supported_by": "community",
+}
+
+DOCUMENTATION = r"""
+---
+module: launchdarkly_flag_mirror
+short_description: Keep a local copy of an environment's flag data
+description:
+     - Keep a file with the flags and segments of a LaunchDarkly environment up to date, using the streaming connection the server-side SDKs use.
+     - The file has the same layout as the content returned by M(launchdarkly_test_generator), so it can be used as C(snapshot_path) in M(launchdarkly_variation_info).
+     - Each run applies the initial data and then every change received during C(duration). Run it with C(async) to keep the mirror updating in the background.
+version_added: "0.4.0"
+options:
+    sdk_key:
+        description:
+            - SDK key of the environment to mirror. You may also set this in the C(LAUNCHDARKLY_SDK_KEY) environment variable.
+        required: yes
+        type: str
+    dest:
+        description:
+            - Path of the flag data file. An existing file is loaded first, and is only rewritten when the flag data changes.
+        required: yes
+        type: path
+    duration:
+        description:
+            - Number of seconds to keep applying changes. C(0) returns as soon as the initial flag data has been written.
+        required: no
+        type: int
+        default: 0
+    save_interval:
+        description:
+            - Minimum number of seconds between writes of C(dest) while changes are being applied.
+        required: no
+        type: int
+        default: 5
+    read_timeout:
+        description:
+            - Seconds to wait for data on the stream before reconnecting, and for the initial flag data.
+        required: no
+        type: int
+        default: 300
+    stream_uri:
+        description:
+            - Base URI of the streaming service. Defaults to the C(LAUNCHDARKLY_STREAM_URI) environment variable, or C(https://stream.launchdarkly.com).
+        required: no
+        type: str
+"""
+
+EXAMPLES = r"""
+# Write the current flag data and return
+- launchdarkly_flag_mirror:
+    sdk_key: sdk-12345
+    dest: /var/lib/launchdarkly/flags.json
+
+# Keep the file updated for an hour in the background
+- launchdarkly_flag_mirror:
+    sdk_key: sdk-12345
+    dest: /var/lib/launchdarkly/flags.json
+    duration: 3600
+  async: 3700
+  poll: 0
+
+# Evaluate against the mirrored data
+- launchdarkly_variation_info:
+    snapshot_path: /var/lib/launchdarkly/flags.json
+    engine: local
+    flag_key: example-test-flag
+    user:
+        key: aabbccdd
+"""
+
+RETURN = r"""
+dest:
+    description: Path of the flag data file
+    type: str
+    returned: success
+flags:
+    description: Number of flags in the file
+    type: int
+    returned: success
+segments:
+    description: Number of segments in the file
+    type: int
+    returned: success
+events:
+    description: Number of C(put), C(patch) and C(delete) events received
+    type: dict
+    returned: success
+reconnects:
+    description: Number of times the stream was reopened after an error
+    type: int
+    returned: success
+"""
+
+import threading
+import time
+
+from ansible.module_utils.basic import AnsibleModule, env_fallback
+from ansible.module_utils._text import to_native
+from ansible.module_utils.six.moves import queue
+from ansible.module_utils.six.moves.urllib.error import HTTPError
+from ansible.module_utils.urls import open_url
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    profile_main,
+    stream_uri,
+)
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.mirror import (
+    FlagStore,
+    sse_events,
+)
+
+
+@profile_main
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            sdk_key=dict(
+                required=True,
+                type="str",
+                no_log=True,
+                fallback=(env_fallback, ["LAUNCHDARKLY_SDK_KEY"]),
+            ),
+            dest=dict(required=True, type="path"),
+            duration=dict(type="int", default=0),
+            save_interval=dict(type="int", default=5),
+            read_timeout=dict(type="int", default=300),
+            stream_uri=dict(type="str"),
+        )
+    )
+
+    store = FlagStore(module.params["dest"])
+    existing = store.load()
+
+    messages = queue.Queue()
+    stop = threading.Event()
+    reader = threading.Thread(target=_read_stream, args=(module, messages, stop))
+    reader.daemon = True
+    reader.start()
+
+    try:
+        result = _mirror(module, store, existing, messages)
+    finally:
+        stop.set()
+
+    module.exit_json(dest=module.params["dest"], **result)
+
+
+def _read_stream(module, messages, stop):
+    # Feeds stream events to the main thread, reconnecting with backoff.
+    url = (module.params["stream_uri"] or stream_uri()).rstrip("/") + "/all"
+    headers = {
+        "Authorization": module.params["sdk_key"],
+        "Accept": "text/event-stream",
+    }
+    backoff = 1
+    while not stop.is_set():
+        try:
+            resp = open_url(
+                url,
+                headers=headers,
+                method="GET",
+                timeout=module.params["read_timeout"],
+            )
+            backoff = 1
+            for event, data in sse_events(resp):
+                if stop.is_set():
+                    return
+                messages.put((event, data))
+        except HTTPError as e:
+            if e.code in (401, 403, 404):
+                messages.put(("fatal", "Stream request failed: %s" % to_native(e)))
+                return
+            messages.put(("error", to_native(e)))
+        except Exception as e:
+            messages.put(("error", to_native(e)))
+        stop.wait(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+def _mirror(module, store, existing, messages):
+    duration = module.params["duration"]
+    deadline = time.time() + duration
+    initial_deadline = time.time() + module.params["read_timeout"]
+    events = dict(put=0, patch=0, delete=0)
+    reconnects = 0
+    initialized = False
+    changed = False
+    last_save = 0
+
+    while True:
+        now = time.time()
+        if initialized and (duration == 0 or now >= deadline):
+            break
+        if not initialized and now >= max(deadline, initial_deadline):
+            module.fail_json(msg="Timed out waiting for flag data from the stream")
+
+        wait = (deadline if initialized else max(deadline, initial_deadline)) - now
+        try:
+            event, data = messages.get(timeout=max(wait, 0.1))
+        except queue.Empty:
+            continue
+
+        if event == "fatal":
+            module.fail_json(msg=data)
+        if event == "error":
+            reconnects += 1
+            continue
+        if event not in events:
+            continue
+        events[event] += 1
+
+        try:
+            changed = store.apply(event, data) or changed
+        except (ValueError, AttributeError) as e:
+            module.fail_json(msg="Invalid %s event: %s" % (event, to_native(e)))
+
+        if event == "put" and not initialized:
+            initialized = True
+            if not existing:
+                store.dirty = changed = True
+        if store.dirty and time.time() - last_save >= module.params["save_interval"]:
+            store.save()
+            last_save = time.time()
+
+    if store.dirty:
+        store.save()
+
+    counts = store.counts()
+    return dict(
+        changed=changed,
+        flags=counts["flags"],
+        segments=counts["segments"],
+        events=events,
+        reconnects=reconnects,
+    )
+
+
+if __name__ == "__main__":
+    main()
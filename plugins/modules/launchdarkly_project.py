@@ -51,7 +51,9 @@ options:
         required: no
         type: bool
 
-extends_documentation_fragment: launchdarkly_labs.collection.launchdarkly
+extends_documentation_fragment:
+    - launchdarkly_labs.collection.launchdarkly
+    - launchdarkly_labs.collection.launchdarkly_conftest
 """
 
 EXAMPLES = r"""
@@ -91,9 +93,13 @@ from ansible.module_utils._text import to_native
 from ansible.module_utils.common._json_compat import json
 from ansible.module_utils.six import PY2, iteritems, string_types
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     fail_exit,
     ld_common_argument_spec,
+    PatchOp,
+    profile_main,
     rego_test,
 )
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.environment import (
@@ -102,6 +108,7 @@ from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.envir
 )
 
 
+@profile_main
 def main():
     argument_spec = ld_common_argument_spec()
     argument_spec.update(
@@ -115,6 +122,7 @@ def main():
         )
     )
     module = AnsibleModule(argument_spec=argument_spec)
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -122,9 +130,7 @@ def main():
         )
 
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.ProjectsApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.ProjectsApi(api_client(configuration))
 
     if module.params["environments"]:
         for env in module.params["environments"]:
@@ -148,7 +154,7 @@ def _parse_project_param(module, param_name, key=None):
         value = env_ld_builder(module.params["environments"])
     else:
         value = module.params[param_name]
-    return launchdarkly_api.PatchOperation(path=path, op="replace", value=value)
+    return PatchOp(path=path, op="replace", value=value)
 
 
 def _delete_project(module, api_instance):
@@ -216,6 +222,7 @@ def _configure_project(module, api_instance, project=None, changed=False):
             "environments",
             "project_key",
             "conftest",
+            "debug_timing",
         ]:
             patches.append(_parse_project_param(module, key))
 
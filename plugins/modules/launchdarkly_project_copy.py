@@ -16,6 +16,8 @@ short_description: Copy a project
 description:
      - Copy a LaunchDarkly project within or between accounts. You can use this to make a clone of an existing project, or to copy data from one account to another. Copying a project copies most, but not all, of the project's data. To learn more, read L(Understanding what you can and cannot transfer, https://docs.launchdarkly.com/guides/tutorials/merge-accounts#understanding-what-you-can-and-cannot-transfer).
 version_added: "0.2.2"
+requirements:
+    - python >= 3.5
 options:
     api_key:
         description:
@@ -46,6 +48,11 @@ options:
         description:
             - C(Bool) flag to determine whether to copy source environments to the new project
         default: true
+    concurrency:
+        description:
+            - Maximum number of requests in flight while copying segments and flags. Requests are sent with C(aiohttp) when it is installed on the managed host, and from a thread pool otherwise.
+        type: int
+        default: 10
 
 extends_documentation_fragment: launchdarkly_labs.collection.launchdarkly
 """
@@ -68,7 +75,6 @@ project:
 
 import inspect
 import traceback
-import time
 
 LD_IMP_ERR = None
 try:
@@ -87,15 +93,25 @@ from ansible.module_utils._text import to_native
 from ansible.module_utils.common._json_compat import json
 
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     parse_env_param,
     parse_user_param,
-    reset_rate,
+    PatchOp,
+    profile_main,
+    rate_limited_call,
     fail_exit,
+    fetch_flag_pages,
+    fetch_json,
     ld_common_argument_spec,
 )
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.transport import (
+    AsyncClient,
+)
 
 
+@profile_main
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -105,6 +121,11 @@ def main():
                 no_log=True,
                 fallback=(env_fallback, ["LAUNCHDARKLY_ACCESS_TOKEN"]),
             ),
+            debug_timing=dict(
+                type="bool",
+                default=False,
+                fallback=(env_fallback, ["LAUNCHDARKLY_DEBUG_TIMING"]),
+            ),
             api_key_dest=dict(
                 required=True,
                 type="str",
@@ -116,8 +137,10 @@ def main():
             flag_tag=dict(type="list", elements="str"),
             environments_copy=dict(type="bool", default=True),
             name=dict(type="str"),
+            concurrency=dict(type="int", default=10),
         )
     )
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -126,31 +149,31 @@ def main():
 
     # Setup the necessary API clients
     api_instance_src_user = launchdarkly_api.UserSegmentsApi(
-        launchdarkly_api.ApiClient(configure_instance(module.params["api_key"]))
+        api_client(configure_instance(module.params["api_key"]))
     )
 
     api_instance_src_proj = launchdarkly_api.ProjectsApi(
-        launchdarkly_api.ApiClient(configure_instance(module.params["api_key"]))
+        api_client(configure_instance(module.params["api_key"]))
     )
 
     api_instance_src_fflag = launchdarkly_api.FeatureFlagsApi(
-        launchdarkly_api.ApiClient(configure_instance(module.params["api_key"]))
+        api_client(configure_instance(module.params["api_key"]))
     )
 
     api_instance_dest_user = launchdarkly_api.UserSegmentsApi(
-        launchdarkly_api.ApiClient(configure_instance(module.params["api_key_dest"]))
+        api_client(configure_instance(module.params["api_key_dest"]))
     )
 
     api_instance_dest_proj = launchdarkly_api.ProjectsApi(
-        launchdarkly_api.ApiClient(configure_instance(module.params["api_key_dest"]))
+        api_client(configure_instance(module.params["api_key_dest"]))
     )
 
     api_instance_dest_fflag = launchdarkly_api.FeatureFlagsApi(
-        launchdarkly_api.ApiClient(configure_instance(module.params["api_key_dest"]))
+        api_client(configure_instance(module.params["api_key_dest"]))
     )
 
     api_instance_dest_env = launchdarkly_api.EnvironmentsApi(
-        launchdarkly_api.ApiClient(configure_instance(module.params["api_key_dest"]))
+        api_client(configure_instance(module.params["api_key_dest"]))
     )
 
     _project_sync(
@@ -175,7 +198,12 @@ def _project_sync(
     src_fflags,
     dest_fflags,
 ):
-    src_project = src_proj.get_project(module.params["project_key"]).to_dict()
+    try:
+        src_project = rate_limited_call(
+            fetch_json, src_proj.get_project, "Project", module.params["project_key"]
+        )
+    except ApiException as e:
+        fail_exit(module, e)
     name = module.params.get("name", src_project["name"])
     dest_proj_body = dict(
         name=name, key=module.params["project_key_dest"], tags=src_project["tags"]
@@ -216,9 +244,7 @@ def _project_sync(
     ld_proj = launchdarkly_api.ProjectBody(**dest_proj_body)
 
     try:
-        response, status, headers = dest_proj.post_project_with_http_info(
-            project_body=ld_proj
-        )
+        rate_limited_call(dest_proj.post_project, project_body=ld_proj)
 
     except ApiException as e:
         fail_exit(module, e)
@@ -232,240 +258,70 @@ def _project_sync(
 
         if len(patches) > 0:
             try:
-                api_response = dest_env_api.patch_environment(
-                    module.params["project_key_dest"], env["key"], patch_delta=patches
+                rate_limited_call(
+                    dest_env_api.patch_environment,
+                    module.params["project_key_dest"],
+                    env["key"],
+                    patch_delta=patches,
                 )
             except ApiException as e:
-                if status == 429:
-                    time.sleep(reset_rate(headers["X-RateLimit-Reset"]))
-                    # Retry
-                    dest_env_api.patch_environment(
-                        module.params["project_key_dest"],
-                        env["key"],
-                        patch_delta=patches,
-                    )
-                else:
-                    fail_exit(module, e)
+                fail_exit(module, e)
             # Reset patches
             patches = []
 
-        # User Segment Processing
-    if module.params["environments_copy"]:
-        for env in src_project["environments"]:
-            get_segments = src_user_sgmt.get_user_segments(
-                module.params["project_key"], env["key"]
-            ).to_dict()
-
-            patch_sgmts = []
-            for segment in get_segments["items"]:
-                new_segment_body = dict(key=segment["key"], name=segment["name"])
-
-                if segment["description"]:
-                    new_segment_body["description"] = segment["description"]
-
-                if segment["tags"]:
-                    new_segment_body["tags"] = segment["tags"]
-                try:
-                    dest_user_sgmt.post_user_segment(
-                        module.params["project_key_dest"], env["key"], new_segment_body
-                    )
-                except ApiException as e:
-                    if status == 429:
-                        time.sleep(reset_rate(headers["X-RateLimit-Reset"]))
-                        # Retry
-                        dest_user_sgmt.post_user_segment(
-                            module.params["project_key_dest"],
-                            env["key"],
-                            new_segment_body,
-                        )
-                    else:
-                        fail_exit(module, e)
-
-                patch_sgmt = dict(key=segment["key"])
-                if segment["included"] is not None:
-                    patch_sgmt["included"] = segment["included"]
-
-                if segment["excluded"] is not None:
-                    patch_sgmt["excluded"] = segment["excluded"]
-
-                if segment["rules"] is not None:
-                    patch_sgmt["rules"] = segment["rules"]
-
-                patch_sgmts.append(patch_sgmt)
-
-            for sgmt in patch_sgmts:
-                patches = []
-                for key in sgmt:
-                    if key not in ["key"] and len(sgmt[key]) > 0:
-                        if key == "rules":
-                            for rule in sgmt["rules"]:
-                                patch = dict(
-                                    path="/rules/-",
-                                    op="add",
-                                    value=launchdarkly_api.UserSegmentRule(**rule),
-                                )
-                                patches.append(launchdarkly_api.PatchOperation(**patch))
-                                del patch
-                        else:
-                            patches.append(parse_user_param(sgmt, key))
-                if len(patches) > 0:
-                    try:
-                        (
-                            response,
-                            status,
-                            headers,
-                        ) = dest_user_sgmt.patch_user_segment_with_http_info(
-                            module.params["project_key_dest"],
-                            env["key"],
-                            sgmt["key"],
-                            patch_only=patches,
-                        )
-
-                    except ApiException as e:
-                        if status == 429:
-                            time.sleep(reset_rate(headers["X-RateLimit-Reset"]))
-                            # Retry
-                            dest_user_sgmt.patch_user_segment_with_http_info(
-                                module.params["project_key_dest"],
-                                env["key"],
-                                sgmt["key"],
-                                patch_only=patches,
-                            )
-                        else:
-                            fail_exit(module, e)
-                # Reset patches
-                del patches
-
-    tag = module.params.get("flag_tag", None)
-    src_ff = {}
-    try:
-        if tag:
-            tag = ",".join(tag)
-            src_ff = src_fflags.get_feature_flags(
-                module.params["project_key"], summary=0, tag=tag
-            ).to_dict()
-        else:
-            src_ff = src_fflags.get_feature_flags(
-                module.params["project_key"], summary=0
-            ).to_dict()
-    except ApiException as e:
-        if status == 429:
-            time.sleep(reset_rate(headers["X-RateLimit-Reset"]))
-            if tag:
-                tag = ",".join(tag)
-                src_ff = src_fflags.get_feature_flags(
-                    module.params["project_key"], summary=0, tag=tag
-                ).to_dict()
-            else:
-                src_ff = src_fflags.get_feature_flags(
-                    module.params["project_key"], summary=0
-                ).to_dict()
-
-    for flag in src_ff["items"]:
-        fflag_body = dict(
-            name=flag["name"],
-            key=flag["key"],
-            description=flag["description"],
-            variations=flag["variations"],
-            temporary=flag["temporary"],
-            tags=flag["tags"],
-            include_in_snippet=flag["include_in_snippet"],
-        )
-
-        fflag_body_mapped = dict(
-            (launchdarkly_api.FeatureFlagBody.attribute_map[k], v)
-            for k, v in fflag_body.items()
-            if v is not None
-        )
+    # Segments and flags are copied through the asynchronous transport, with
+    # up to `concurrency` requests in flight. The source data is kept as
+    # returned by the API, so it can be sent back unchanged.
+    client = AsyncClient(
+        configure_instance(module.params["api_key_dest"]),
+        module.params["concurrency"],
+    )
 
+    # User Segment Processing
+    if module.params["environments_copy"]:
+        calls = []
         try:
-            response, status, headers = dest_fflags.post_feature_flag_with_http_info(
-                module.params["project_key_dest"], fflag_body_mapped
-            )
-        except ApiException as e:
-            if e.status == 429:
-                time.sleep(reset_rate(headers["X-RateLimit-Reset"]))
-                # Retry
-                (
-                    response,
-                    status,
-                    headers,
-                ) = dest_fflags.post_feature_flag_with_http_info(
-                    module.params["project_key_dest"], fflag_body
+            for env in src_project["environments"]:
+                get_segments = rate_limited_call(
+                    fetch_json,
+                    src_user_sgmt.get_user_segments,
+                    None,
+                    module.params["project_key"],
+                    env["key"],
                 )
-            else:
-                fail_exit(module, e)
+                for segment in get_segments["items"]:
+                    calls.append(_copy_segment(client, module, env["key"], segment))
+            client.run(calls)
+        except ApiException as e:
+            fail_exit(module, e)
 
+    params = dict(summary=0)
+    if module.params["flag_tag"]:
+        params["tag"] = ",".join(module.params["flag_tag"])
+    try:
+        src_flags = []
+        for page in fetch_flag_pages(
+            src_fflags, module.params["project_key"], response_type=None, **params
+        ):
+            src_flags.extend(page)
+
+        # Every flag is created before any is configured, so prerequisites
+        # can refer to flags that come later in the list.
+        client.run([_create_flag(client, module, flag) for flag in src_flags])
         if module.params["environments_copy"]:
-            patches = []
-            for fenv_key in flag["environments"]:
-                fflag_env = dict(
-                    on=flag["environments"][fenv_key]["on"],
-                    targets=flag["environments"][fenv_key]["targets"],
-                    off_variation=flag["environments"][fenv_key]["off_variation"],
-                    track_events=flag["environments"][fenv_key]["track_events"],
-                    prerequisites=flag["environments"][fenv_key]["prerequisites"],
-                    fallthrough=flag["environments"][fenv_key]["fallthrough"],
-                )
+            client.run([_configure_flag(client, module, flag) for flag in src_flags])
+    except ApiException as e:
+        fail_exit(module, e)
 
-                fflag_env_mapped = dict(
-                    (launchdarkly_api.FeatureFlagConfig.attribute_map[k], v)
-                    for k, v in fflag_env.items()
-                    if v is not None
-                )
-                path = "/environments/" + fenv_key + "/"
-                for key in fflag_env_mapped:
-                    if fflag_env_mapped.get(key) is not None:
-                        patch = dict(
-                            path=path + key, op="replace", value=fflag_env_mapped[key]
-                        )
-                        patches.append(launchdarkly_api.PatchOperation(**patch))
-                        del patch
-                try:
-                    for rule in flag["environments"][fenv_key]["rules"]:
-                        new_rule = dict(clauses=rule["clauses"])
-
-                        if rule["rollout"] is not None:
-                            new_rule["rollout"] = rule["rollout"]
-                        if rule["variation"] is not None:
-                            new_rule["variation"] = rule["variation"]
-
-                        patch = dict(
-                            path=path + "rules/-",
-                            op="add",
-                            value=launchdarkly_api.Rule(**new_rule),
-                        )
-                        patches.append(launchdarkly_api.PatchOperation(**patch))
-                except KeyError:
-                    pass
-
-            if len(patches) > 0:
-                try:
-                    (
-                        response,
-                        status,
-                        headers,
-                    ) = dest_fflags.patch_feature_flag_with_http_info(
-                        module.params["project_key_dest"],
-                        flag["key"],
-                        patch_comment=patches,
-                    )
-
-                except ApiException as e:
-                    if e.status == 429:
-                        time.sleep(reset_rate(headers["X-RateLimit-Reset"]))
-                        # Retry
-                        dest_fflags.patch_feature_flag_with_http_info(
-                            module.params["project_key_dest"],
-                            flag["key"],
-                            patch_comment=patches,
-                        )
-                    else:
-                        fail_exit(module, e)
-                # Reset patches
-                del patches
-
-    new_project = dest_proj.get_project(module.params["project_key_dest"]).to_dict()
+    try:
+        new_project = rate_limited_call(
+            fetch_json,
+            dest_proj.get_project,
+            "Project",
+            module.params["project_key_dest"],
+        )
+    except ApiException as e:
+        fail_exit(module, e)
     module.exit_json(
         changed=True,
         project=new_project,
@@ -474,5 +330,98 @@ def _project_sync(
     )
 
 
+async def _copy_segment(client, module, env_key, segment):
+    params = dict(projectKey=module.params["project_key_dest"], environmentKey=env_key)
+    new_segment_body = dict(key=segment["key"], name=segment["name"])
+
+    if segment.get("description"):
+        new_segment_body["description"] = segment["description"]
+
+    if segment.get("tags"):
+        new_segment_body["tags"] = segment["tags"]
+
+    await client.request(
+        "POST", "/segments/{projectKey}/{environmentKey}", params, new_segment_body
+    )
+
+    patches = []
+    for key in ["included", "excluded"]:
+        if segment.get(key):
+            patches.append(parse_user_param(segment, key))
+    for rule in segment.get("rules") or []:
+        patches.append(PatchOp(op="add", path="/rules/-", value=rule))
+
+    if len(patches) > 0:
+        params["userSegmentKey"] = segment["key"]
+        await client.request(
+            "PATCH",
+            "/segments/{projectKey}/{environmentKey}/{userSegmentKey}",
+            params,
+            patches,
+        )
+
+
+async def _create_flag(client, module, flag):
+    fflag_body_mapped = {}
+    for attr in [
+        "name",
+        "key",
+        "description",
+        "variations",
+        "temporary",
+        "tags",
+        "include_in_snippet",
+    ]:
+        key = launchdarkly_api.FeatureFlagBody.attribute_map[attr]
+        if flag.get(key) is not None:
+            fflag_body_mapped[key] = flag[key]
+
+    await client.request(
+        "POST",
+        "/flags/{projectKey}",
+        dict(projectKey=module.params["project_key_dest"]),
+        fflag_body_mapped,
+    )
+
+
+async def _configure_flag(client, module, flag):
+    patches = []
+    for fenv_key, fflag_env in flag["environments"].items():
+        path = "/environments/" + fenv_key + "/"
+        for attr in [
+            "on",
+            "targets",
+            "off_variation",
+            "track_events",
+            "prerequisites",
+            "fallthrough",
+        ]:
+            key = launchdarkly_api.FeatureFlagConfig.attribute_map[attr]
+            if fflag_env.get(key) is not None:
+                patches.append(
+                    PatchOp(op="replace", path=path + key, value=fflag_env[key])
+                )
+
+        for rule in fflag_env.get("rules") or []:
+            new_rule = dict(clauses=rule["clauses"])
+
+            if rule.get("rollout") is not None:
+                new_rule["rollout"] = rule["rollout"]
+            if rule.get("variation") is not None:
+                new_rule["variation"] = rule["variation"]
+
+            patches.append(PatchOp(op="add", path=path + "rules/-", value=new_rule))
+
+    if len(patches) > 0:
+        await client.request(
+            "PATCH",
+            "/flags/{projectKey}/{featureFlagKey}",
+            dict(
+                projectKey=module.params["project_key_dest"], featureFlagKey=flag["key"]
+            ),
+            patches,
+        )
+
+
 if __name__ == "__main__":
     main()
@@ -90,11 +90,16 @@ from ansible.module_utils._text import to_native
 from ansible.module_utils.common._json_compat import json
 from ansible.module_utils.six import PY2, iteritems, string_types
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     fail_exit,
+    fetch_json,
+    profile_main,
 )
 
 
+@profile_main
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -104,11 +109,17 @@ def main():
                 no_log=True,
                 fallback=(env_fallback, ["LAUNCHDARKLY_ACCESS_TOKEN"]),
             ),
+            debug_timing=dict(
+                type="bool",
+                default=False,
+                fallback=(env_fallback, ["LAUNCHDARKLY_DEBUG_TIMING"]),
+            ),
             project_key=dict(type="str", required=False),
             tags=dict(type="list", required=False),
             environment_tags=dict(type="list", required=False),
         )
     )
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -117,9 +128,7 @@ def main():
 
     # Set up API
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.ProjectsApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.ProjectsApi(api_client(configuration))
 
     project = _fetch_projects(module, api_instance)
 
@@ -129,11 +138,12 @@ def main():
 def _fetch_projects(module, api_instance):
     try:
         if module.params.get("project_key"):
-            response = api_instance.get_project(module.params["project_key"]).to_dict()
+            response = fetch_json(
+                api_instance.get_project, "Project", module.params["project_key"]
+            )
 
         else:
-            get_projects = api_instance.get_projects()
-            projects = [proj.to_dict() for proj in get_projects.items]
+            projects = fetch_json(api_instance.get_projects, "Projects")["items"]
             final_projects = []
             if module.params.get("tags"):
 
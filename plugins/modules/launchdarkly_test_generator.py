@@ -29,6 +29,27 @@ options:
             - Override specific flag keys
         required: no
         type: list
+    overrides_segment:
+        description:
+            - Override segments, keyed by segment key. Each value is a dictionary with any of C(included), C(excluded) and C(rules), which replace the segment's own.
+            - Segments that do not exist are created.
+        required: no
+        type: list
+        elements: dict
+    dest:
+        description:
+            - Write the flag data to this file instead of returning it in C(content). Only a checksum and counts are returned.
+            - Without overrides the download is written to the file as it arrives, without holding or parsing the whole of it in memory.
+            - The file is replaced only when its content changes.
+            - The ETag and checksums of the download are kept in C(dest).etag. Later runs send a conditional request, and return C(changed=false) without rewriting the file when the flag data has not changed.
+        required: no
+        type: path
+    compress:
+        description:
+            - Compress the file written to C(dest) with gzip.
+        required: no
+        type: bool
+        default: false
 """
 
 EXAMPLES = r"""
@@ -38,17 +59,58 @@ EXAMPLES = r"""
       sdk_key: sdk-test-123456
       overrides_flag:
         - example_test_flag: True
+      overrides_segment:
+        - beta-users:
+            included:
+              - aabbccdd
+            rules: []
     register: results
+
+# Write a compressed flag data file without returning its content
+  - name: Generate Test File
+    launchdarkly_test_generator:
+      sdk_key: sdk-test-123456
+      dest: /tmp/flags.json.gz
+      compress: true
 """
 
 RETURN = r"""
 content:
     description: Dictionary containing a JSON object that can be used as a file source
     type: json
-    returned: on success
+    returned: when C(dest) is not set
+dest:
+    description: Path of the written flag data file
+    type: str
+    returned: when C(dest) is set
+checksum:
+    description: SHA-256 checksum of the written file
+    type: str
+    returned: when C(dest) is set
+size:
+    description: Size of the written file in bytes
+    type: int
+    returned: when C(dest) is set
+flags:
+    description: Number of flags in the file, not counting overridden flags
+    type: int
+    returned: when C(dest) is set
+flag_values:
+    description: Number of overridden flag values in the file
+    type: int
+    returned: when C(dest) is set
+segments:
+    description: Number of segments in the file
+    type: int
+    returned: when C(dest) is set
 """
 
+import gzip
+import hashlib
 import inspect
+import os
+import re
+import tempfile
 import traceback
 
 LD_IMP_ERR = None
@@ -62,13 +124,18 @@ except ImportError:
     HAS_LD = False
 
 from ansible.module_utils.basic import AnsibleModule, missing_required_lib, env_fallback
-from ansible.errors import AnsibleError
 from ansible.module_utils._text import to_native
 from ansible.module_utils.common._json_compat import json
 from ansible.module_utils.six import PY2, iteritems, string_types
 from ansible.module_utils.urls import *
+from ansible.module_utils.six.moves.urllib.error import HTTPError
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    base_uri,
     configure_instance,
+    profile_main,
+)
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils import (
+    json_codec,
 )
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.environment import (
     ld_env_arg_spec,
@@ -76,6 +143,7 @@ from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.envir
 )
 
 
+@profile_main
 def main():
 
     module = AnsibleModule(
@@ -87,7 +155,9 @@ def main():
                 fallback=(env_fallback, ["LAUNCHDARKLY_SDK_KEY"]),
             ),
             overrides_flag=dict(type="list", elements="dict"),
-            overrides_segment=dict(type="list", elem="dict"),
+            overrides_segment=dict(type="list", elements="dict"),
+            dest=dict(type="path"),
+            compress=dict(type="bool", default=False),
         )
     )
 
@@ -97,26 +167,315 @@ def main():
         )
 
     headers = {"Authorization": module.params["sdk_key"]}
-    resp = open_url(
-        "https://app.launchdarkly.com/sdk/latest-all", headers=headers, method="GET"
+    meta = _read_meta(module) if module.params["dest"] else None
+    if meta and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    try:
+        resp = open_url(base_uri() + "/sdk/latest-all", headers=headers, method="GET")
+    except HTTPError as e:
+        if e.code == 304 and meta:
+            module.exit_json(
+                changed=False, dest=module.params["dest"], **meta["result"]
+            )
+        raise
+
+    overrides = module.params["overrides_flag"] or module.params["overrides_segment"]
+    if module.params["dest"] and not overrides:
+        # Nothing to change in the data, so it goes to the file as it arrives.
+        result, source = _stream_snapshot(module, resp)
+        _write_meta(module, resp.headers.get("ETag"), source, result)
+        module.exit_json(**result)
+
+    payload = resp.read()
+    source = hashlib.sha256(payload).hexdigest()
+    # Servers without ETag support still get a cheap no-op on identical data.
+    if meta and meta.get("source") == source:
+        module.exit_json(changed=False, dest=module.params["dest"], **meta["result"])
+
+    test_data = json_codec.loads(payload)
+    errors = _override_flags(test_data, module.params["overrides_flag"] or [])
+    errors.extend(
+        _override_segments(test_data, module.params["overrides_segment"] or [])
+    )
+    if errors:
+        module.fail_json(msg="Invalid overrides: %s" % "; ".join(errors), errors=errors)
+
+    if module.params["dest"]:
+        result = _write_snapshot(module, lambda stream: _encode(test_data, stream))
+        result.update(
+            flags=len(test_data.get("flags") or {}),
+            flag_values=len(test_data.get("flagValues") or {}),
+            segments=len(test_data.get("segments") or {}),
+        )
+        _write_meta(module, resp.headers.get("ETag"), source, result)
+        module.exit_json(**result)
+
+    module.exit_json(changed=True, content=test_data)
+
+
+def _options_digest(module):
+    options = dict(
+        (k, module.params[k])
+        for k in ("overrides_flag", "overrides_segment", "compress")
+    )
+    return hashlib.sha256(_canonical(options).encode("utf-8")).hexdigest()
+
+
+def _read_meta(module):
+    # The sidecar is only trusted if dest still has the content it describes
+    # and was generated with the same options.
+    dest = module.params["dest"]
+    try:
+        with open(dest + ".etag", "r") as f:
+            meta = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if (
+        not isinstance(meta, dict)
+        or meta.get("options") != _options_digest(module)
+        or not os.path.exists(dest)
+        or module.sha256(dest) != meta.get("result", {}).get("checksum")
+    ):
+        return None
+    return meta
+
+
+def _write_meta(module, etag, source, result):
+    meta = dict(
+        etag=etag,
+        source=source,
+        options=_options_digest(module),
+        result=dict((k, v) for k, v in result.items() if k not in ("changed", "dest")),
+    )
+    dest = module.params["dest"]
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=".ld-snapshot-", dir=os.path.dirname(os.path.abspath(dest))
     )
+    with os.fdopen(fd, "w") as f:
+        json.dump(meta, f)
+    module.atomic_move(tmp_path, dest + ".etag")
 
-    test_data = json.loads(resp.read())
-    if module.params.get("overrides_flag"):
-        for k, v in [
-            (k, v) for x in module.params["overrides_flag"] for (k, v) in x.items()
-        ]:
-            if v not in test_data["flags"][k]["variations"]:
-                raise AnsibleError("Override variation does not match flag variations")
 
-            if "flagValues" in test_data.keys():
-                test_data["flagValues"][k] = v
+def _canonical(value):
+    return json_codec.dumps(value, sort_keys=True)
+
+
+def _override_flags(test_data, overrides):
+    # Checks every override against a set of each flag's variation values and
+    # returns all the errors instead of stopping at the first one.
+    flags = test_data.get("flags") or {}
+    flag_values = test_data.get("flagValues") or {}
+    variations = {}
+    errors = []
+    for override in overrides:
+        for k, v in override.items():
+            if k not in variations:
+                if k in flags:
+                    variations[k] = set(
+                        _canonical(x) for x in flags[k].get("variations") or []
+                    )
+                elif k not in flag_values:
+                    errors.append("flag %s does not exist" % k)
+                    continue
+            if k in variations and _canonical(v) not in variations[k]:
+                errors.append(
+                    "value %s is not a variation of flag %s" % (_canonical(v), k)
+                )
+                continue
+            flag_values[k] = v
+
+    if errors:
+        return errors
+    for k in flag_values:
+        flags.pop(k, None)
+    if flag_values:
+        test_data["flagValues"] = flag_values
+    return errors
+
+
+def _override_segments(test_data, overrides):
+    # Replaces the included, excluded or rules of a segment, creating it if needed.
+    segments = test_data.setdefault("segments", {})
+    errors = []
+    for override in overrides:
+        for k, fields in override.items():
+            if not isinstance(fields, dict):
+                errors.append("override for segment %s must be a dictionary" % k)
+                continue
+            unknown = sorted(set(fields) - set(["included", "excluded", "rules"]))
+            if unknown:
+                errors.append(
+                    "unsupported fields for segment %s: %s" % (k, ", ".join(unknown))
+                )
+                continue
+            segment = segments.setdefault(
+                k, dict(key=k, version=1, salt=k, included=[], excluded=[], rules=[])
+            )
+            segment.update(fields)
+    return errors
+
+
+class _HashingWriter(object):
+    # Buffers writes to a file and hashes the bytes that reach it.
+    def __init__(self, f, buffer_size=65536):
+        self._f = f
+        self._buffer = []
+        self._buffered = 0
+        self._buffer_size = buffer_size
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self._buffer_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        data = b"".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        self.digest.update(data)
+        self.size += len(data)
+        self._f.write(data)
+
+
+class _SectionCounter(object):
+    # Counts the entries of the top-level flags, flagValues and segments
+    # objects of a latest-all payload fed to it in chunks, without parsing it.
+    # Strings are skipped in one regex match. Below the sections only the
+    # brackets matter, so everything up to the next one is skipped at once.
+    _SHALLOW = re.compile(b'["{}\\[\\],]')
+    _DEEP = re.compile(b'(?:[^"{}\\[\\]]+|"[^"\\\\]*(?:\\\\.[^"\\\\]*)*")*')
+    _STRING = re.compile(b'[^"\\\\]*(?:\\\\.[^"\\\\]*)*', re.S)
+
+    def __init__(self):
+        self.counts = {b"flags": 0, b"flagValues": 0, b"segments": 0}
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._expect_key = False
+        self._section = None
+        self._key = None
+
+    def feed(self, data):
+        pos = 0
+        start = 0
+        size = len(data)
+        while pos < size:
+            if self._in_string:
+                if self._escaped:
+                    # The character after a backslash that ended the last chunk.
+                    self._escaped = False
+                    pos += 1
+                    continue
+                end = self._STRING.match(data, pos).end()
+                if end >= size or data[end : end + 1] != b'"':
+                    # The string goes on in the next chunk.
+                    self._escaped = end < size
+                    break
+                self._in_string = False
+                if self._key is not None:
+                    self._key.append(data[start:end])
+                    self._section = b"".join(self._key)
+                    self._key = None
+                pos = end + 1
+                continue
+            if self._depth > 2:
+                pos = self._DEEP.match(data, pos).end()
+                if pos >= size:
+                    break
+                char = data[pos : pos + 1]
+                pos += 1
+            else:
+                match = self._SHALLOW.search(data, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                char = match.group()
+            if char == b'"':
+                self._in_string = True
+                if self._expect_key and self._depth == 1:
+                    self._key = []
+                    start = pos
+                elif self._expect_key and self._depth == 2:
+                    if self._section in self.counts:
+                        self.counts[self._section] += 1
+                self._expect_key = False
+            elif char in (b"{", b"["):
+                self._depth += 1
+                self._expect_key = char == b"{"
+            elif char in (b"}", b"]"):
+                self._depth -= 1
+                self._expect_key = False
             else:
-                test_data["flagValues"] = {}
-                test_data["flagValues"][k] = v
-            del test_data["flags"][k]
+                self._expect_key = True
+        if self._key is not None:
+            self._key.append(data[start:])
 
-    module.exit_json(changed=True, content=test_data)
+
+def _stream_snapshot(module, resp, chunk_size=65536):
+    # Copies the response to dest in chunks, hashing and counting it on the
+    # way, so the payload is never held in memory as a whole.
+    source = hashlib.sha256()
+    counter = _SectionCounter()
+
+    def copy(stream):
+        while True:
+            chunk = resp.read(chunk_size)
+            if not chunk:
+                break
+            source.update(chunk)
+            counter.feed(chunk)
+            stream.write(chunk)
+
+    result = _write_snapshot(module, copy)
+    result.update(
+        flags=counter.counts[b"flags"],
+        flag_values=counter.counts[b"flagValues"],
+        segments=counter.counts[b"segments"],
+    )
+    return result, source.hexdigest()
+
+
+def _encode(test_data, stream):
+    for chunk in json_codec.iterencode(test_data):
+        stream.write(chunk)
+
+
+def _write_snapshot(module, write):
+    # write(stream) writes the JSON document to stream.
+    dest = module.params["dest"]
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=".ld-snapshot-", dir=os.path.dirname(os.path.abspath(dest))
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            out = _HashingWriter(f)
+            stream = out
+            if module.params["compress"]:
+                # No name or timestamp in the header, so equal data gives equal files.
+                stream = gzip.GzipFile(filename="", mode="wb", fileobj=out, mtime=0)
+            write(stream)
+            if stream is not out:
+                stream.close()
+            out.flush()
+
+        checksum = out.digest.hexdigest()
+        changed = not (os.path.exists(dest) and module.sha256(dest) == checksum)
+        if changed:
+            module.atomic_move(tmp_path, dest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return dict(
+        changed=changed,
+        dest=dest,
+        checksum=checksum,
+        size=out.size,
+    )
 
 
 if __name__ == "__main__":
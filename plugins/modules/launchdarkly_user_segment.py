@@ -116,11 +116,14 @@ from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.claus
     clause_argument_spec,
 )
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     parse_user_param,
     fail_exit,
     ld_common_argument_spec,
-    rego_test,
+    profile_main,
+    validate_params,
 )
 
 
@@ -136,6 +139,7 @@ def usr_argument_spec():
     )
 
 
+@profile_main
 def main():
     argument_spec = ld_common_argument_spec()
     argument_spec.update(
@@ -154,6 +158,7 @@ def main():
     )
 
     module = AnsibleModule(argument_spec=argument_spec)
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -161,9 +166,7 @@ def main():
         )
 
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.UserSegmentsApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.UserSegmentsApi(api_client(configuration))
 
     if module.params["state"] == "present":
         user_segment = _fetch_user_segment(module, api_instance)
@@ -189,7 +192,7 @@ def _delete_user_segment(module, api_instance):
 
 def _create_user_segment(module, api_instance):
     if module.params["conftest"]["enabled"]:
-        rego_test(module)
+        validate_params(module)
 
     name = (
         module.params["name"]
@@ -208,7 +211,7 @@ def _create_user_segment(module, api_instance):
     user_segment_body = launchdarkly_api.UserSegmentBody(**user_segment_config)
 
     try:
-        api_response = api_instance.post_user_segment(
+        segment = api_instance.post_user_segment(
             module.params["project_key"],
             module.params["environment_key"],
             user_segment_body,
@@ -216,7 +219,29 @@ def _create_user_segment(module, api_instance):
     except ApiException as e:
         fail_exit(module, e)
 
-    _configure_user_segment(module, api_instance, api_response, True)
+    # Targets and rules cannot be set by the create endpoint, so they are
+    # patched in afterwards.
+    patches = []
+    for key in ["included", "excluded", "rules"]:
+        if module.params[key]:
+            patches.append(parse_user_param(module.params, key))
+
+    if len(patches) > 0:
+        try:
+            segment = api_instance.patch_user_segment(
+                module.params["project_key"],
+                module.params["environment_key"],
+                module.params["user_segment_key"],
+                patch_only=patches,
+            )
+        except ApiException as e:
+            fail_exit(module, e)
+
+    module.exit_json(
+        changed=True,
+        msg="user segment successfully created",
+        user_segment=to_native(segment.to_dict()),
+    )
 
 
 def _configure_user_segment(module, api_instance, api_response=None, ans_changed=False):
@@ -271,6 +296,7 @@ def _configure_user_segment(module, api_instance, api_response=None, ans_changed
                     "version",
                     "user_segment_key",
                     "conftest",
+                    "debug_timing",
                 ]
             ),
         )
@@ -284,6 +310,7 @@ def _configure_user_segment(module, api_instance, api_response=None, ans_changed
             "project_key",
             "user_segment_key",
             "conftest",
+            "debug_timing",
         ]:
             if module.params[key] is not None:
                 patches.append(parse_user_param(module.params, key))
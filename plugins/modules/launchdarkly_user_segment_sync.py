@@ -16,6 +16,8 @@ short_description: Copy a user segment across environments
 description:
      - Copy a LaunchDarkly user segment across environments
 version_added: "0.1.0"
+requirements:
+    - python >= 3.5
 options:
     project_key:
         description:
@@ -49,6 +51,11 @@ options:
         required: no
         type: list
         choices: [updateTargets', 'updateRules']
+    concurrency:
+        description:
+            - Maximum number of environments updated at the same time. Requests are sent with C(aiohttp) when it is installed on the managed host, and from a thread pool otherwise.
+        type: int
+        default: 10
 
 extends_documentation_fragment: launchdarkly_labs.collection.launchdarkly
 """
@@ -89,12 +96,23 @@ from ansible.module_utils._text import to_native
 from ansible.module_utils.common._json_compat import json
 
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     fail_exit,
+    fetch_json,
     ld_common_argument_spec,
+    model_dict,
+    PatchOp,
+    profile_main,
+    rate_limited_call,
+)
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.transport import (
+    AsyncClient,
 )
 
 
+@profile_main
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -105,6 +123,11 @@ def main():
                 no_log=True,
                 fallback=(env_fallback, ["LAUNCHDARKLY_ACCESS_TOKEN"]),
             ),
+            debug_timing=dict(
+                type="bool",
+                default=False,
+                fallback=(env_fallback, ["LAUNCHDARKLY_DEBUG_TIMING"]),
+            ),
             environment_key=dict(type="str", required=True),
             project_key=dict(type="str", required=True),
             user_segment_key=dict(type="str", required=True),
@@ -115,8 +138,10 @@ def main():
             excluded_actions=dict(
                 type="list", choices=["updateTargets", "updateRules"]
             ),
+            concurrency=dict(type="int", default=10),
         )
     )
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -124,100 +149,115 @@ def main():
         )
 
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.UserSegmentsApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.UserSegmentsApi(api_client(configuration))
+    client = AsyncClient(configuration, module.params["concurrency"])
 
-    _configure_user_sync(module, api_instance)
+    _configure_user_sync(module, api_instance, client)
 
 
-def _configure_user_sync(module, api_instance):
+def _configure_user_sync(module, api_instance, client):
+    try:
+        user_segment = rate_limited_call(
+            fetch_json,
+            api_instance.get_user_segment,
+            None,
+            module.params["project_key"],
+            module.params["environment_key"],
+            module.params["user_segment_key"],
+        )
+    except ApiException as e:
+        fail_exit(module, e)
 
-    user_segment = api_instance.get_user_segment(
-        module.params["project_key"],
-        module.params["environment_key"],
-        module.params["user_segment_key"],
-    )
+    # Each environment has its own copy of the segment, so the environments
+    # are updated concurrently.
+    try:
+        responses = client.run(
+            [
+                _sync_segment(client, module, user_segment, env)
+                for env in module.params["environment_targets"]
+            ]
+        )
+    except ApiException as e:
+        if e.status == 404:
+            module.exit_json(
+                failed=True,
+                msg="user segment key: %s not found"
+                % module.params["user_segment_key"],
+            )
+        else:
+            fail_exit(module, e)
 
-    new_segment = launchdarkly_api.UserSegmentBody(
-        name=user_segment.name,
-        key=user_segment.key,
-        description=user_segment.description,
-        tags=user_segment.tags,
+    module.exit_json(
+        changed=True,
+        msg="feature flags synced",
+        user_segment=model_dict("UserSegment", responses[-1]),
     )
 
-    for idx, env in enumerate(module.params["environment_targets"]):
-        patches = []
-        try:
-            response, status, headers = api_instance.post_user_segment_with_http_info(
-                module.params["project_key"], env, new_segment
-            )
-        except ApiException as e:
-            if e.status == 409:
-                (
-                    response,
-                    status,
-                    headers,
-                ) = api_instance.get_user_segment_with_http_info(
-                    module.params["project_key"], env, module.params["user_segment_key"]
-                )
-                if user_segment.name is not None and user_segment.name != response.name:
-                    patches.append(_patch_op("replace", "/name", user_segment.name))
-                if (
-                    user_segment.description is not None
-                    and user_segment.description != response.description
-                ):
-                    patches.append(
-                        _patch_op("replace", "/description", user_segment.description)
-                    )
-                if user_segment.tags is not None and set(user_segment.tags) != set(
-                    response.tags
-                ):
-                    patches.append(_patch_op("replace", "/tags", user_segment.tags))
-            else:
-                fail_exit(module, e)
 
+async def _sync_segment(client, module, user_segment, env):
+    params = dict(projectKey=module.params["project_key"], environmentKey=env)
+    new_segment = dict(
+        (key, user_segment[key])
+        for key in ["name", "key", "description", "tags"]
+        if user_segment.get(key) is not None
+    )
+
+    patches = []
+    try:
+        response = await client.request(
+            "POST", "/segments/{projectKey}/{environmentKey}", params, new_segment
+        )
+    except ApiException as e:
+        if e.status != 409:
+            raise
+        response = await client.request(
+            "GET",
+            "/segments/{projectKey}/{environmentKey}/{userSegmentKey}",
+            dict(params, userSegmentKey=module.params["user_segment_key"]),
+        )
         if (
-            module.params["included_actions"] is None
-            or (
-                "updateTargets" in module.params["included_actions"]
-                or "updateTargets" not in module.params["excluded_actions"]
-            )
-            and (
-                set(response.included) != set(user_segment.included)
-                or set(response.excluded) != set(user_segment.excluded)
+            user_segment.get("name") is not None
+            and user_segment["name"] != response["name"]
+        ):
+            patches.append(PatchOp("replace", "/name", user_segment["name"]))
+        if user_segment.get("description") is not None and user_segment[
+            "description"
+        ] != response.get("description"):
+            patches.append(
+                PatchOp("replace", "/description", user_segment["description"])
             )
+        if user_segment.get("tags") is not None and set(user_segment["tags"]) != set(
+            response.get("tags") or []
         ):
-            patches.append(_patch_op("replace", "/included", user_segment.included))
-            patches.append(_patch_op("replace", "/excluded", user_segment.excluded))
+            patches.append(PatchOp("replace", "/tags", user_segment["tags"]))
 
-        if module.params["included_actions"] is None or (
-            "updateRules" in module.params["included_actions"]
-            or "updateRules" not in module.params["excluded_actions"]
-        ):
-            for rule in user_segment.rules:
-                patches.append(
-                    launchdarkly_api.PatchOperation(
-                        op="add", path="/rules", value=user_segment.rules
-                    )
-                )
-
-        try:
-            response, status, headers = api_instance.patch_user_segment_with_http_info(
-                module.params["project_key"], env, user_segment.key, patches
-            )
-        except ApiException as e:
-            if e.status == 404:
-                module.exit_json(
-                    failed=True,
-                    msg="user segment key: %s not found"
-                    % module.params["user_segment_key"],
-                )
-            else:
-                fail_exit(module, e)
+    included = user_segment.get("included") or []
+    excluded = user_segment.get("excluded") or []
+    if (
+        module.params["included_actions"] is None
+        or (
+            "updateTargets" in module.params["included_actions"]
+            or "updateTargets" not in module.params["excluded_actions"]
+        )
+        and (
+            set(response.get("included") or []) != set(included)
+            or set(response.get("excluded") or []) != set(excluded)
+        )
+    ):
+        patches.append(PatchOp("replace", "/included", included))
+        patches.append(PatchOp("replace", "/excluded", excluded))
 
-    module.exit_json(
-        changed=True, msg="feature flags synced", user_segment=response.to_dict()
+    if module.params["included_actions"] is None or (
+        "updateRules" in module.params["included_actions"]
+        or "updateRules" not in module.params["excluded_actions"]
+    ):
+        patches.append(PatchOp("replace", "/rules", user_segment.get("rules") or []))
+
+    return await client.request(
+        "PATCH",
+        "/segments/{projectKey}/{environmentKey}/{userSegmentKey}",
+        dict(params, userSegmentKey=user_segment["key"]),
+        patches,
     )
 
 
@@ -21,9 +21,40 @@ options:
     sdk_key:
         description:
             - The SDK key for the environment where the flag evaluation occurs. You may also set this in the C(LAUNCHDARKLY_SDK_KEY) environment variable.
-        default: 'default'
-        required: yes
+            - Required unless C(snapshot_path) is set.
+        required: no
         type: str
+    snapshot_path:
+        description:
+            - Path to a flag data file, such as the C(content) returned by M(launchdarkly_test_generator) saved as JSON.
+            - Files compressed with gzip, such as those written by M(launchdarkly_test_generator) with C(compress=true), are decompressed when read.
+            - When set, flags are evaluated offline from the file. No connection to LaunchDarkly is opened and no events are sent.
+        required: no
+        type: path
+    send_events:
+        description:
+            - Whether the SDK sends analytics events for the evaluations. With C(false) no event processor is started and nothing is flushed when the task finishes.
+            - Events are never sent when using C(snapshot_path) or the C(local) engine.
+        required: no
+        type: bool
+        default: true
+    data_mode:
+        description:
+            - How the SDK gets flag data when C(snapshot_path) is not set.
+            - C(streaming) opens a streaming connection. C(polling) requests the flag data when the client starts, and again every 30 seconds until the task finishes, instead of keeping a connection open.
+            - C(offline) opens no connection and sends no events, so every flag returns its default value, C(false), with the C(CLIENT_NOT_READY) error reason, and C(all_flags) returns no flags. With the C(local) engine no flag data is downloaded and every flag is reported as not found.
+        required: no
+        type: str
+        choices: ['streaming', 'polling', 'offline']
+        default: 'streaming'
+    engine:
+        description:
+            - How flags are evaluated. C(sdk) uses the LaunchDarkly server-side SDK.
+            - C(local) evaluates the flag data from C(snapshot_path), or downloaded with C(sdk_key), with the collection's own evaluator. It needs no SDK and sends no events, which suits evaluating many users and flags.
+        required: no
+        type: str
+        choices: ['sdk', 'local']
+        default: 'sdk'
     start_wait:
         description:
             - How long to wait for the SDK to connect to LaunchDarkly
@@ -35,11 +66,29 @@ options:
             - The feature flag key
         required: no
         type: str
+    flag_keys:
+        description:
+            - List of feature flag keys to evaluate. Every flag is evaluated for every user with a single SDK client, and the values are returned in C(results).
+        required: no
+        type: list
+        elements: str
+    all_flags:
+        description:
+            - Evaluate every flag in the environment for each user, and return the values in C(results).
+        required: no
+        type: bool
+        default: false
     user:
         description:
             - The user for whom the flag is being evaluated. Must include the user C(key). May also include a dictionary of C(custom) user attributes, illustrated in the example below.
         required: no
         type: dict
+    users:
+        description:
+            - List of users to evaluate the flags for, in the same format as C(user). Values are returned in C(results).
+        required: no
+        type: list
+        elements: dict
 """
 
 EXAMPLES = r"""
@@ -53,30 +102,85 @@ EXAMPLES = r"""
         custom:
             test-attribute: green
             plan: free
+
+# Evaluate several flags for several users with one SDK client
+- launchdarkly_variation_info:
+    sdk_key: sdk-12345
+    flag_keys:
+      - example-test-flag
+      - example-json-flag
+    users:
+      - key: aabbccdd
+      - key: eeffgghh
+        custom:
+          plan: free
+
+# Evaluate every flag for a user
+- launchdarkly_variation_info:
+    sdk_key: sdk-12345
+    all_flags: true
+    user:
+        key: aabbccdd
+
+# Evaluate offline from a snapshot written by launchdarkly_test_generator
+- launchdarkly_test_generator:
+    sdk_key: sdk-12345
+  register: snapshot
+
+- copy:
+    content: "{{ snapshot.content | to_json }}"
+    dest: /tmp/flags.json
+
+- launchdarkly_variation_info:
+    snapshot_path: /tmp/flags.json
+    flag_key: example-test-flag
+    user:
+        key: aabbccdd
+
+# Short-lived check with no streaming connection and no analytics events
+- launchdarkly_variation_info:
+    sdk_key: sdk-12345
+    data_mode: polling
+    send_events: false
+    flag_key: example-test-flag
+    user:
+        key: aabbccdd
+
+# Audit every flag for many users without the SDK
+- launchdarkly_variation_info:
+    snapshot_path: /tmp/flags.json
+    engine: local
+    all_flags: true
+    users: "{{ audit_users }}"
 """
 
 RETURN = r"""
 type:
     description: Type of return value
     type: string
-    returned: always
+    returned: when evaluating a single C(flag_key) for a single C(user)
 value:
     description: Value returned from variation. Type is set in C(type) return.
-    returned: always
+    returned: when evaluating a single C(flag_key) for a single C(user)
 variation_index:
     description: Index value of variation
     type: int
-    returned: always
+    returned: when evaluating a single C(flag_key) for a single C(user)
 reason:
     description: Describes why the value was returned. To learn more, read L(Flag evaluation reasons, https://docs.launchdarkly.com/sdk/features/evaluation-reasons).
     type: dict
-    returned: always
+    returned: when evaluating a single C(flag_key) for a single C(user)
 is_default_value:
     description: Whether the returned value is the default, or fallback, value provided as part of the evaluation request.
     type: bool
-    returned: always
+    returned: when evaluating a single C(flag_key) for a single C(user)
+results:
+    description: Dictionary keyed by user key, then by flag key, containing the C(type), C(value), C(variation_index) and C(reason) of each evaluation.
+    type: dict
+    returned: when using C(flag_keys), C(users) or C(all_flags)
 """
 
+import gzip
 import inspect
 import traceback
 import time
@@ -84,73 +188,268 @@ import time
 LD_IMP_ERR = None
 try:
     import ldclient
+    from ldclient.config import Config
+    from ldclient.interfaces import UpdateProcessor
+    from ldclient.versioned_data_kind import FEATURES, SEGMENTS
 
     HAS_LD = True
 except ImportError:
     LD_IMP_ERR = traceback.format_exc()
     HAS_LD = False
+    UpdateProcessor = object
 
 from ansible.module_utils.basic import AnsibleModule, missing_required_lib, env_fallback
 from ansible.module_utils._text import to_native
 from ansible.module_utils.common._json_compat import json
 from ansible.module_utils.six import PY2, iteritems, string_types
+from ansible.module_utils.urls import open_url
 from ansible.errors import AnsibleError
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    base_uri,
+    profile_main,
+    stream_uri,
+)
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils import (
+    json_codec,
+)
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.evaluator import (
+    Evaluator,
+    snapshot_items,
+)
 
 
+@profile_main
 def main():
     module = AnsibleModule(
         argument_spec=dict(
             sdk_key=dict(
-                required=True,
                 type="str",
                 no_log=True,
                 fallback=(env_fallback, ["LAUNCHDARKLY_SDK_KEY"]),
             ),
-            flag_key=dict(type="str", required=True),
-            user=dict(type="dict", required=True),
+            snapshot_path=dict(type="path"),
+            flag_key=dict(type="str"),
+            flag_keys=dict(type="list", elements="str"),
+            all_flags=dict(type="bool", default=False),
+            user=dict(type="dict"),
+            users=dict(type="list", elements="dict"),
             start_wait=dict(type="int", default=5),
-        )
+            send_events=dict(type="bool", default=True),
+            data_mode=dict(
+                type="str",
+                default="streaming",
+                choices=["streaming", "polling", "offline"],
+            ),
+            engine=dict(type="str", default="sdk", choices=["sdk", "local"]),
+        ),
+        required_one_of=[
+            ["flag_key", "flag_keys", "all_flags"],
+            ["user", "users"],
+            ["sdk_key", "snapshot_path"],
+        ],
+        mutually_exclusive=[["user", "users"]],
     )
 
+    if module.params["engine"] == "local":
+        evaluator = Evaluator.from_snapshot(_read_snapshot(module))
+        result = _evaluate_params(
+            module,
+            lambda flag_key, user: _evaluate_local(evaluator, flag_key, user),
+            lambda user: _evaluate_all_local(evaluator, user),
+        )
+        module.exit_json(**result)
+
     if not HAS_LD:
         module.fail_json(
             msg=missing_required_lib("launchdarkly-server-sdk"), exception=LD_IMP_ERR
         )
 
-    ldclient.set_sdk_key(module.params["sdk_key"])
-    ldclient.start_wait = 5
-    ld_client = ldclient.get()
+    ld_client = _init_client(module)
+    try:
+        result = _evaluate_params(
+            module,
+            lambda flag_key, user: _evaluate(ld_client, flag_key, user),
+            lambda user: _evaluate_all(ld_client, user),
+        )
+        if _sends_events(module):
+            ld_client.flush()
+    finally:
+        ld_client.close()
+
+    module.exit_json(**result)
+
+
+def _evaluate_params(module, evaluate, evaluate_all):
+    if not (
+        module.params["flag_keys"]
+        or module.params["all_flags"]
+        or module.params["users"]
+    ):
+        return evaluate(module.params["flag_key"], module.params["user"])
+    return dict(results=_evaluate_matrix(module, evaluate, evaluate_all))
+
+
+def _evaluate_matrix(module, evaluate, evaluate_all):
+    # Every user against every flag with the same client or evaluator.
+    users = module.params["users"] or [module.params["user"]]
+    flag_keys = list(module.params["flag_keys"] or [])
+    if module.params["flag_key"]:
+        flag_keys.insert(0, module.params["flag_key"])
+
+    results = {}
+    for user in users:
+        if module.params["all_flags"]:
+            results[user["key"]] = evaluate_all(user)
+        else:
+            results[user["key"]] = dict(
+                (flag_key, evaluate(flag_key, user)) for flag_key in flag_keys
+            )
+    return results
+
+
+def _init_client(module):
+    if module.params["snapshot_path"]:
+        flags, segments = snapshot_items(_read_snapshot(module))
+        data = {FEATURES: flags, SEGMENTS: segments}
+        config = Config(
+            sdk_key=module.params["sdk_key"],
+            send_events=False,
+            update_processor_class=lambda config, store, ready: _SnapshotDataSource(
+                store, ready, data
+            ),
+        )
+    else:
+        config = Config(
+            sdk_key=module.params["sdk_key"],
+            base_uri=base_uri(),
+            stream_uri=stream_uri(),
+            send_events=_sends_events(module),
+            stream=module.params["data_mode"] == "streaming",
+            offline=module.params["data_mode"] == "offline",
+        )
+    ld_client = ldclient.LDClient(config=config, start_wait=module.params["start_wait"])
 
     if not ld_client.is_initialized():
+        ld_client.close()
         raise AnsibleError("Error: Not Connected to LaunchDarkly")
+    return ld_client
+
+
+def _sends_events(module):
+    return (
+        module.params["send_events"]
+        and module.params["data_mode"] != "offline"
+        and not module.params["snapshot_path"]
+    )
+
+
+def _read_snapshot(module):
+    # Same layout as the SDK file data source: flags, segments and flagValues.
+    path = module.params["snapshot_path"]
+    if not path and module.params["data_mode"] == "offline":
+        return {}
+    if not path:
+        headers = {"Authorization": module.params["sdk_key"]}
+        resp = open_url(base_uri() + "/sdk/latest-all", headers=headers, method="GET")
+        return json_codec.loads(resp.read())
+
+    try:
+        with open(path, "rb") as f:
+            magic = f.read(2)
+        # Files written by launchdarkly_test_generator with compress=true.
+        opener = gzip.open if magic == b"\x1f\x8b" else open
+        with opener(path, "rb") as f:
+            return json_codec.load(f)
+    except (IOError, OSError, EOFError, ValueError) as e:
+        module.fail_json(
+            msg="Unable to load flag data from %s: %s" % (path, to_native(e))
+        )
+
+
+class _SnapshotDataSource(UpdateProcessor):
+    # The SDK file data source parses with yaml.load, which fails on PyYAML 6.
+    def __init__(self, store, ready, data):
+        self._store = store
+        self._ready = ready
+        self._data = data
+        self._inited = False
+
+    def start(self):
+        self._store.init(self._data)
+        self._inited = True
+        self._ready.set()
+
+    def stop(self):
+        pass
+
+    def initialized(self):
+        return self._inited
 
-    show_feature = ld_client.variation_detail(
-        module.params["flag_key"], module.params["user"], False
+
+def _value_type(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, string_types):
+        return "string"
+    return "json"
+
+
+def _evaluate(ld_client, flag_key, user):
+    detail = ld_client.variation_detail(flag_key, user, False)
+    return dict(
+        type=_value_type(detail.value),
+        value=detail.value,
+        variation_index=detail.variation_index,
+        reason=detail.reason,
+        is_default_value=detail.is_default_value(),
     )
 
-    ld_client.flush()
-
-    ff_type = type(show_feature.value).__name__
-    value = show_feature.value
-    ld_client.close()
-
-    if ff_type == "dict":
-        ff_end_type = "json"
-    elif ff_type == "unicode":
-        ff_end_type = "string"
-    elif ff_type == "int":
-        ff_end_type = "number"
-    elif ff_type == "bool":
-        ff_end_type = "bool"
-
-    module.exit_json(
-        type=ff_end_type,
-        value=show_feature.value,
-        variation_index=show_feature.variation_index,
-        reason=show_feature.reason,
-        is_default_value=show_feature.is_default_value(),
+
+def _evaluate_all(ld_client, user):
+    # One evaluation pass over every flag for the user.
+    state = ld_client.all_flags_state(user, with_reasons=True).to_json_dict()
+    metadata = state.get("$flagsState", {})
+    results = {}
+    for flag_key, value in state.items():
+        if flag_key.startswith("$"):
+            continue
+        results[flag_key] = dict(
+            type=_value_type(value),
+            value=value,
+            variation_index=metadata.get(flag_key, {}).get("variation"),
+            reason=metadata.get(flag_key, {}).get("reason"),
+        )
+    return results
+
+
+def _evaluate_local(evaluator, flag_key, user):
+    value, variation_index, reason = evaluator.evaluate(flag_key, user)
+    if variation_index is None and value is None:
+        value = False
+    return dict(
+        type=_value_type(value),
+        value=value,
+        variation_index=variation_index,
+        reason=dict(reason),
+        is_default_value=variation_index is None,
     )
 
 
+def _evaluate_all_local(evaluator, user):
+    results = {}
+    for flag_key, (value, variation_index, reason) in iteritems(
+        evaluator.evaluate_all(user)
+    ):
+        results[flag_key] = dict(
+            type=_value_type(value),
+            value=value,
+            variation_index=variation_index,
+            reason=dict(reason),
+        )
+    return results
+
+
 if __name__ == "__main__":
     main()
@@ -91,15 +91,20 @@ from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.claus
     clause_argument_spec,
 )
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.base import (
+    api_client,
     configure_instance,
+    debug_timing,
     fail_exit,
     ld_common_argument_spec,
+    PatchOp,
+    profile_main,
 )
 from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.policy import (
     policy_argument_spec,
 )
 
 
+@profile_main
 def main():
     argument_spec = ld_common_argument_spec()
     argument_spec.update(
@@ -118,6 +123,7 @@ def main():
         )
     )
     module = AnsibleModule(argument_spec=argument_spec)
+    debug_timing(module)
 
     if not HAS_LD:
         module.fail_json(
@@ -125,9 +131,7 @@ def main():
         )
 
     configuration = configure_instance(module.params["api_key"])
-    api_instance = launchdarkly_api.WebhooksApi(
-        launchdarkly_api.ApiClient(configuration)
-    )
+    api_instance = launchdarkly_api.WebhooksApi(api_client(configuration))
 
     if module.params["state"] in ["present", "enabled"]:
         webhook = _fetch_webhook(module, api_instance)
@@ -145,7 +149,7 @@ def _parse_webhook_param(module, param_name, key=None):
     path = "/" + key
     patch = dict(path=path, op="replace", value=module.params[param_name])
     print(patch)
-    return launchdarkly_api.PatchOperation(**patch)
+    return PatchOp(**patch)
 
 
 def _delete_webhook(module, api_instance):
@@ -221,10 +225,9 @@ def _configure_webhook(module, api_instance, webhook=None):
                     # iterating over statements for range to be inclusive
                     for i in range(newStatements, len(webhook.statements)):
                         patches.append(
-                            launchdarkly_api.PatchOperation(
+                            PatchOp(
                                 op="remove",
                                 path="/statements/%d" % i,
-                                value="needed_for_call",
                             )
                         )
             for idx, statement in enumerate(module.params["statements"]):
@@ -237,7 +240,7 @@ def _configure_webhook(module, api_instance, webhook=None):
                 del module.params["statements"]
 
     for key in module.params:
-        if key not in ["state", "api_key", "sign", "webhook_id"]:
+        if key not in ["state", "api_key", "sign", "webhook_id", "debug_timing"]:
             if module.params[key] is not None:
                 patches.append(_parse_webhook_param(module, key))
 
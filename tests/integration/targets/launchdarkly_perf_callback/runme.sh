@@ -0,0 +1,40 @@
+#!/bin/bash
+
+FILE=test_perf_callback.yml
+OUTPUT="$(mktemp -d)/perf.json"
+
+export ANSIBLE_CALLBACKS_ENABLED=launchdarkly_labs.collection.launchdarkly_perf
+export LAUNCHDARKLY_DEBUG_TIMING=true
+export LAUNCHDARKLY_PERF_OUTPUT="${OUTPUT}"
+
+if [ ! -z "$LAUNCHDARKLY_ACCESS_TOKEN" ] && [ ! -z "$LAUNCHDARKLY_DEST_ACCESS_TOKEN" ] && [ ! -z "$LAUNCHDARKLY_SDK_KEY" ];
+then
+    ansible-playbook -vvvv ${FILE}
+elif [[ -f vars.yml ]]
+then
+    ansible-playbook -vvvv ${FILE} --extra-vars "@vars.yml"
+else
+    envdir="$(git rev-parse --show-toplevel)"
+    filename=env.sh
+
+    if [[ -z "${envdir}" ]]
+    then
+    echo "Not in git repository."
+    exit 1
+    fi
+
+    file="$(find "${envdir}" -name "${filename}" -type f -print -quit)"
+
+    if [[ -z "${file}" ]]
+    then
+    echo "Source file: env.sh not found."
+    exit 1
+    fi
+
+    # shellcheck disable=SC1090
+    source "${file}"
+    ansible-playbook -vvvv ${FILE} --extra-vars "ld_api_key=${LAUNCHDARKLY_ACCESS_TOKEN}"
+fi
+
+unset ANSIBLE_CALLBACKS_ENABLED
+ansible-playbook -vvvv verify_perf_summary.yml --extra-vars "perf_output=${OUTPUT}"
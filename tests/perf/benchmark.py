@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# Times the collection's modules against the mock server in mock_server.py,
+# for projects of increasing size. Each module runs in its own process, the
+# way Ansible runs it, and the table reports wall time together with the
+# number of API requests and rate limited responses the run caused.
+#
+#   python tests/perf/benchmark.py
+#   python tests/perf/benchmark.py --sizes 10 1000 --latency-ms 20 --rate-limit-every 50
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_server import DEFAULT_ENVIRONMENTS, MockLaunchDarkly, MockServer
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+MODULES = "ansible_collections.launchdarkly_labs.collection.plugins.modules."
+API_KEY = "api-benchmark"
+PROJECT = "perf-project"
+
+
+def _collections_path(workdir):
+    # Modules import themselves as ansible_collections.launchdarkly_labs.collection,
+    # so link the checkout into that layout unless it is already installed there.
+    parts = REPO.split(os.sep)
+    if parts[-3:] == ["ansible_collections", "launchdarkly_labs", "collection"]:
+        return os.sep.join(parts[:-3])
+    namespace = os.path.join(workdir, "ansible_collections", "launchdarkly_labs")
+    os.makedirs(namespace)
+    os.symlink(REPO, os.path.join(namespace, "collection"))
+    return workdir
+
+
+def _cases(workdir, env_key, sdk_key):
+    policy = os.path.join(
+        REPO, "tests", "integration", "targets", "launchdarkly_feature_flag_validator"
+    )
+    other_env = [key for key, _ in DEFAULT_ENVIRONMENTS if key != env_key][0]
+    return [
+        ("project_info", "launchdarkly_project_info", dict(project_key=PROJECT)),
+        (
+            "feature_flag_info",
+            "launchdarkly_feature_flag_info",
+            dict(project_key=PROJECT, env=env_key),
+        ),
+        (
+            "feature_flag_info summary",
+            "launchdarkly_feature_flag_info",
+            dict(project_key=PROJECT, env=env_key, summary=True),
+        ),
+        (
+            "feature_flag_validator",
+            "launchdarkly_feature_flag_validator",
+            dict(
+                project_key=PROJECT,
+                env=env_key,
+                conftest=dict(
+                    enabled=True,
+                    backend="python",
+                    dir=os.path.join(policy, "policy"),
+                    cache_dir=os.path.join(workdir, "policy_cache"),
+                ),
+            ),
+        ),
+        (
+            "test_generator",
+            "launchdarkly_test_generator",
+            dict(sdk_key=sdk_key, dest=os.path.join(workdir, "snapshot.json")),
+        ),
+        (
+            "test_generator unchanged",
+            "launchdarkly_test_generator",
+            dict(sdk_key=sdk_key, dest=os.path.join(workdir, "snapshot.json")),
+        ),
+        (
+            "variation_info local",
+            "launchdarkly_variation_info",
+            dict(
+                snapshot_path=os.path.join(workdir, "snapshot.json"),
+                engine="local",
+                all_flags=True,
+                users=[dict(key="user-%d" % i, country="us") for i in range(10)],
+            ),
+        ),
+        (
+            "feature_flag create",
+            "launchdarkly_feature_flag",
+            dict(
+                project_key=PROJECT,
+                key="benchmark-flag",
+                name="Benchmark flag",
+                kind="bool",
+                tags=["benchmark"],
+            ),
+        ),
+        (
+            "feature_flag_environment",
+            "launchdarkly_feature_flag_environment",
+            dict(
+                project_key=PROJECT,
+                flag_key="flag-00000",
+                environment_key=[env_key, other_env],
+                off_variation=1,
+                fallthrough=dict(variation=0),
+                targets=[dict(values=["user-1", "user-2"], variation=0)],
+            ),
+        ),
+        (
+            "feature_flag_sync",
+            "launchdarkly_feature_flag_sync",
+            dict(
+                project_key=PROJECT,
+                environment_key=env_key,
+                flag_key="flag-00000",
+                environment_targets=[other_env],
+            ),
+        ),
+        (
+            "environment create",
+            "launchdarkly_environment",
+            dict(
+                project_key=PROJECT,
+                environment_key="benchmark",
+                name="Benchmark",
+                color="00ff00",
+                tags=["benchmark"],
+            ),
+        ),
+        (
+            "user_segment create",
+            "launchdarkly_user_segment",
+            dict(
+                project_key=PROJECT,
+                environment_key=env_key,
+                user_segment_key="benchmark-segment",
+                name="Benchmark segment",
+                tags=["benchmark"],
+                included=["user-1", "user-2"],
+            ),
+        ),
+        (
+            "webhook create",
+            "launchdarkly_webhook",
+            dict(
+                name="Benchmark webhook",
+                url="https://example.com/launchdarkly",
+                tags=["benchmark"],
+            ),
+        ),
+        (
+            "custom_role create",
+            "launchdarkly_custom_role",
+            dict(
+                key="benchmark-role",
+                name="Benchmark role",
+                policy=[
+                    dict(resources=["proj/*"], actions=["*"], effect="allow"),
+                ],
+            ),
+        ),
+        (
+            "project_copy",
+            "launchdarkly_project_copy",
+            dict(
+                project_key=PROJECT,
+                project_key_dest=PROJECT + "-copy",
+                name="Benchmark copy",
+            ),
+        ),
+    ]
+
+
+def _run(workdir, pythonpath, module, args):
+    path = os.path.join(workdir, "args.json")
+    with open(path, "w") as f:
+        json.dump({"ANSIBLE_MODULE_ARGS": args}, f)
+    env = dict(
+        os.environ,
+        PYTHONPATH=pythonpath,
+        LAUNCHDARKLY_ACCESS_TOKEN=API_KEY,
+        LAUNCHDARKLY_DEST_ACCESS_TOKEN=API_KEY,
+    )
+    start = time.time()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", MODULES + module, path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=workdir,
+        env=env,
+    )
+    out, err = proc.communicate()
+    elapsed = time.time() - start
+    try:
+        result = json.loads(out.decode("utf-8"))
+    except ValueError:
+        result = dict(failed=True, msg=(err or out).decode("utf-8").strip()[-300:])
+    return elapsed, result
+
+
+def benchmark(size, options, pythonpath, verbose=False):
+    ld = MockLaunchDarkly(
+        latency=options.latency_ms / 1000.0,
+        rate_limit_every=options.rate_limit_every,
+        rate_limit_reset=options.rate_limit_reset_ms,
+        bandwidth=options.bandwidth_kbps * 1000,
+    )
+    project = ld.seed(PROJECT, flags=size, segments=options.segments)
+    env = project["environments"][0]
+    server = MockServer(("127.0.0.1", 0), ld).start()
+    os.environ["LAUNCHDARKLY_BASE_URI"] = server.uri
+    os.environ["LAUNCHDARKLY_STREAM_URI"] = server.uri
+    workdir = tempfile.mkdtemp(prefix="ld-benchmark-")
+    rows = []
+    try:
+        for name, module, args in _cases(workdir, env["key"], env["apiKey"]):
+            if options.cases and not any(name.startswith(c) for c in options.cases):
+                continue
+            ld.reset_stats()
+            elapsed, result = _run(workdir, pythonpath, module, args)
+            rows.append(
+                dict(
+                    size=size,
+                    case=name,
+                    seconds=round(elapsed, 3),
+                    requests=ld.stats["requests"],
+                    rate_limited=ld.stats["rate_limited"],
+                    bytes=ld.stats["bytes_sent"],
+                    status=_status(result),
+                    msg=result.get("msg"),
+                )
+            )
+            if verbose:
+                print(json.dumps(rows[-1]), file=sys.stderr)
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def _status(result):
+    # Policy violations are the validator's normal output, not a failed run.
+    if not result.get("failed"):
+        return "ok"
+    return "violations" if "validation" in result else "failed"
+
+
+def _table(rows):
+    header = ("flags", "case", "seconds", "requests", "429s", "bytes", "status")
+    lines = [
+        (
+            str(r["size"]),
+            r["case"],
+            "%.3f" % r["seconds"],
+            str(r["requests"]),
+            str(r["rate_limited"]),
+            str(r["bytes"]),
+            r["status"],
+        )
+        for r in rows
+    ]
+    widths = [max(len(c) for c in column) for column in zip(header, *lines)]
+    out = []
+    for line in [header] + lines:
+        out.append("  ".join(c.ljust(w) for c, w in zip(line, widths)).rstrip())
+    return "\n".join(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark modules against the mock server"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--segments", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--rate-limit-reset-ms", type=int, default=200)
+    parser.add_argument("--bandwidth-kbps", type=float, default=0)
+    parser.add_argument(
+        "--cases", nargs="+", help="only run cases whose name starts with these"
+    )
+    parser.add_argument(
+        "--json-backend",
+        choices=("orjson", "ujson", "json"),
+        help="JSON library for the modules to use, instead of the fastest installed",
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    options = parser.parse_args()
+    if options.json_backend:
+        os.environ["LAUNCHDARKLY_JSON_BACKEND"] = options.json_backend
+
+    workdir = tempfile.mkdtemp(prefix="ld-collections-")
+    try:
+        pythonpath = _collections_path(workdir)
+        rows = []
+        for size in options.sizes:
+            rows.extend(benchmark(size, options, pythonpath, options.verbose))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(_table(rows))
+    for row in rows:
+        if row["status"] == "failed":
+            print("%s (%d flags): %s" % (row["case"], row["size"], row["msg"]))
+    if options.json:
+        with open(options.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# Times the JSON backends of module_utils/json_codec.py on the payloads the
+# modules handle: a page of flags from the REST API, and the /sdk/latest-all
+# flag data that launchdarkly_test_generator writes to snapshot files. Only
+# the backends installed here are measured.
+#
+#   python tests/perf/json_benchmark.py
+#   python tests/perf/json_benchmark.py --flags 10000 --repeat 5
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import timeit
+
+from benchmark import PROJECT, _collections_path
+from mock_server import MockLaunchDarkly
+
+
+def _payloads(flags):
+    ld = MockLaunchDarkly()
+    ld.seed(PROJECT, flags=flags)
+    rest = ld.list_flags(PROJECT, {})
+    sdk = ld._sdk_data(PROJECT, "production")
+    return json.dumps(rest).encode("utf-8"), json.dumps(sdk).encode("utf-8")
+
+
+def _cases(codec, base, rest, sdk):
+    rest_data = codec.loads(rest)
+    sdk_data = codec.loads(sdk)
+    cases = [
+        ("decode flag list", lambda: codec.loads(rest)),
+        ("decode snapshot", lambda: codec.loads(sdk)),
+        ("encode snapshot", lambda: b"".join(codec.iterencode(sdk_data))),
+        ("encode sorted", lambda: codec.dumps_bytes(rest_data, sort_keys=True)),
+    ]
+    if base is not None:
+        convert = base._converter("FeatureFlags")
+        cases.insert(
+            1, ("decode flag list to dicts", lambda: convert(codec.loads(rest)))
+        )
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the JSON backends")
+    parser.add_argument("--flags", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ld-collections-")
+    try:
+        sys.path.insert(0, _collections_path(workdir))
+        from ansible_collections.launchdarkly_labs.collection.plugins.module_utils import (
+            json_codec,
+        )
+
+        try:
+            from ansible_collections.launchdarkly_labs.collection.plugins.module_utils import (
+                base,
+            )
+        except ImportError:
+            base = None
+
+        rest, sdk = _payloads(options.flags)
+        print(
+            "%d flags: flag list %d bytes, snapshot %d bytes"
+            % (options.flags, len(rest), len(sdk))
+        )
+        rows = []
+        for name in json_codec.BACKENDS:
+            if json_codec._select(name) != name:
+                print("%s is not installed" % name)
+                continue
+            json_codec.BACKEND = name
+            for case, func in _cases(json_codec, base, rest, sdk):
+                seconds = min(timeit.repeat(func, number=1, repeat=options.repeat))
+                rows.append((case, name, "%.3f" % seconds))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    header = ("case", "backend", "seconds")
+    widths = [max(len(c) for c in column) for column in zip(header, *rows)]
+    for line in [header] + rows:
+        print("  ".join(c.ljust(w) for c, w in zip(line, widths)).rstrip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1181 @@
+#!/usr/bin/env python
+# Stand-in for the LaunchDarkly REST API (/api/v2), the SDK polling endpoint
+# (/sdk/latest-all) and the streaming endpoint (/all), so the collection's
+# modules can run without an account. It covers the requests the modules make
+# and returns the same status codes for the common errors, with configurable
+# latency and rate limiting.
+#
+# Run it standalone and point the modules at it:
+#
+#   python tests/perf/mock_server.py --port 8765 --flags 1000
+#   export LAUNCHDARKLY_BASE_URI=http://127.0.0.1:8765
+#   export LAUNCHDARKLY_STREAM_URI=http://127.0.0.1:8765
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import copy
+import gzip
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, unquote, urlsplit
+    import queue
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+    from urlparse import parse_qs, urlsplit
+    import Queue as queue
+
+DEFAULT_ENVIRONMENTS = (("production", "Production"), ("test", "Test"))
+
+
+class ApiError(Exception):
+    def __init__(self, status, code, message):
+        super(ApiError, self).__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def _not_found():
+    return ApiError(404, "not_found", "Unknown resource")
+
+
+def _pointer(path):
+    if not path.startswith("/"):
+        raise ApiError(400, "invalid_request", "Invalid patch path %s" % path)
+    return [p.replace("~1", "/").replace("~0", "~") for p in path[1:].split("/")]
+
+
+def _resolve(doc, parts, path):
+    for part in parts:
+        try:
+            doc = doc[int(part)] if isinstance(doc, list) else doc[part]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise ApiError(400, "invalid_request", "Invalid patch path %s" % path)
+    return doc
+
+
+def apply_patch(doc, operations):
+    # JSON Patch (RFC 6902) on a copy of doc.
+    doc = copy.deepcopy(doc)
+    for operation in operations:
+        op = operation.get("op")
+        path = operation.get("path", "")
+        parts = _pointer(path)
+        if op in ("move", "copy"):
+            source = _pointer(operation.get("from", ""))
+            value = copy.deepcopy(_resolve(doc, source, path))
+            if op == "move":
+                apply_patch_inplace(doc, [dict(op="remove", path=operation["from"])])
+            apply_patch_inplace(doc, [dict(op="add", path=path, value=value)])
+            continue
+        if op == "test":
+            if _resolve(doc, parts, path) != operation.get("value"):
+                raise ApiError(400, "invalid_request", "Patch test failed at %s" % path)
+            continue
+        apply_patch_inplace(doc, [operation])
+    return doc
+
+
+def apply_patch_inplace(doc, operations):
+    for operation in operations:
+        op = operation.get("op")
+        path = operation.get("path", "")
+        parts = _pointer(path)
+        parent = _resolve(doc, parts[:-1], path)
+        last = parts[-1]
+        value = copy.deepcopy(operation.get("value"))
+        if isinstance(parent, list):
+            if last == "-":
+                index = len(parent)
+            else:
+                try:
+                    index = int(last)
+                except ValueError:
+                    raise ApiError(
+                        400, "invalid_request", "Invalid patch path %s" % path
+                    )
+                if index > len(parent) or (op != "add" and index >= len(parent)):
+                    raise ApiError(
+                        400, "invalid_request", "Invalid patch path %s" % path
+                    )
+            if op == "add":
+                parent.insert(index, value)
+            elif op == "replace":
+                parent[index] = value
+            elif op == "remove":
+                del parent[index]
+            else:
+                raise ApiError(400, "invalid_request", "Unsupported patch op %s" % op)
+        elif isinstance(parent, dict):
+            if op in ("add", "replace"):
+                parent[last] = value
+            elif op == "remove":
+                if last not in parent:
+                    raise ApiError(
+                        400, "invalid_request", "Invalid patch path %s" % path
+                    )
+                del parent[last]
+            else:
+                raise ApiError(400, "invalid_request", "Unsupported patch op %s" % op)
+        else:
+            raise ApiError(400, "invalid_request", "Invalid patch path %s" % path)
+
+
+def _gzip(payload):
+    # gzip.compress is Python 3 only.
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6) as f:
+        f.write(payload)
+    return buf.getvalue()
+
+
+def _patch_operations(body):
+    # Flag patches may wrap the operations with a comment.
+    if isinstance(body, dict):
+        return body.get("patch") or []
+    return body or []
+
+
+class MockLaunchDarkly(object):
+    def __init__(
+        self, latency=0.0, rate_limit_every=0, rate_limit_reset=1000, bandwidth=0
+    ):
+        self.latency = latency
+        # Bytes per second sent to clients, 0 for no limit.
+        self.bandwidth = bandwidth
+        self.rate_limit_every = rate_limit_every
+        self.rate_limit_reset = rate_limit_reset
+        self.lock = threading.RLock()
+        self.projects = {}
+        self.flags = {}
+        self.segments = {}
+        self.webhooks = {}
+        self.roles = {}
+        self.subscribers = []
+        self.reset_stats()
+
+    # Statistics
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = dict(requests=0, rate_limited=0, bytes_sent=0, routes={})
+
+    def _count(self, route, size):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_sent"] += size
+            self.stats["routes"][route] = self.stats["routes"].get(route, 0) + 1
+
+    def _rate_limited(self):
+        with self.lock:
+            if not self.rate_limit_every:
+                return False
+            if (self.stats["requests"] + 1) % self.rate_limit_every:
+                return False
+            self.stats["rate_limited"] += 1
+            return True
+
+    # Representations
+
+    def _environment(self, project_key, body):
+        key = body["key"]
+        return {
+            "_links": {},
+            "_id": uuid.uuid4().hex,
+            "key": key,
+            "name": body.get("name") or key,
+            "apiKey": "sdk-%s-%s" % (project_key, key),
+            "mobileKey": "mob-%s-%s" % (project_key, key),
+            "color": body.get("color") or "417505",
+            "defaultTtl": body.get("defaultTtl") or 0,
+            "secureMode": bool(body.get("secureMode")),
+            "defaultTrackEvents": bool(body.get("defaultTrackEvents")),
+            "tags": body.get("tags") or [],
+            "requireComments": bool(body.get("requireComments")),
+            "confirmChanges": bool(body.get("confirmChanges")),
+        }
+
+    def _flag_config(self, flag, environment):
+        defaults = flag.get("defaults") or {}
+        return {
+            "on": False,
+            "archived": False,
+            "salt": uuid.uuid4().hex,
+            "sel": uuid.uuid4().hex,
+            "lastModified": _now(),
+            "version": 1,
+            "targets": [],
+            "rules": [],
+            "fallthrough": {"variation": defaults.get("onVariation", 0)},
+            "offVariation": defaults.get(
+                "offVariation", 1 if len(flag["variations"]) > 1 else 0
+            ),
+            "prerequisites": [],
+            "trackEvents": False,
+            "trackEventsFallthrough": False,
+            "_site": {"href": "/", "type": "text/html"},
+            "_environmentName": environment["name"],
+        }
+
+    def _sdk_flag(self, flag, env_key):
+        config = flag["environments"][env_key]
+        return {
+            "key": flag["key"],
+            "version": config["version"],
+            "on": config["on"],
+            "salt": config["salt"],
+            "sel": config["sel"],
+            "targets": config["targets"],
+            "rules": [
+                dict(
+                    (k, v)
+                    for k, v in (("id", r.get("_id")),) + tuple(r.items())
+                    if k != "_id" and v is not None
+                )
+                for r in config["rules"]
+            ],
+            "fallthrough": config["fallthrough"],
+            "offVariation": config["offVariation"],
+            "prerequisites": config["prerequisites"],
+            "variations": [v["value"] for v in flag["variations"]],
+            "trackEvents": config["trackEvents"],
+            "trackEventsFallthrough": config["trackEventsFallthrough"],
+            "clientSide": False,
+            "deleted": False,
+        }
+
+    def _sdk_segment(self, segment):
+        return {
+            "key": segment["key"],
+            "version": segment["version"],
+            "salt": segment["_salt"],
+            "included": segment["included"],
+            "excluded": segment["excluded"],
+            "rules": segment["rules"],
+            "deleted": False,
+        }
+
+    def sdk_data(self, sdk_key):
+        with self.lock:
+            for project_key, project in self.projects.items():
+                for env in project["environments"]:
+                    if env["apiKey"] == sdk_key:
+                        return self._sdk_data(project_key, env["key"])
+        raise ApiError(401, "unauthorized", "Invalid SDK key")
+
+    def _sdk_data(self, project_key, env_key):
+        flags = self.flags.get(project_key, {})
+        segments = self.segments.get((project_key, env_key), {})
+        return {
+            "flags": dict(
+                (k, self._sdk_flag(f, env_key))
+                for k, f in flags.items()
+                if env_key in f["environments"]
+            ),
+            "segments": dict((k, self._sdk_segment(s)) for k, s in segments.items()),
+        }
+
+    # Streaming
+
+    def subscribe(self, sdk_key):
+        data = self.sdk_data(sdk_key)
+        with self.lock:
+            for project_key, project in self.projects.items():
+                for env in project["environments"]:
+                    if env["apiKey"] == sdk_key:
+                        events = queue.Queue()
+                        self.subscribers.append((project_key, env["key"], events))
+                        return events, data
+        raise ApiError(401, "unauthorized", "Invalid SDK key")
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s[2] is not events]
+
+    def _publish_flag(self, project_key, flag_key, deleted_version=None):
+        for sub_project, env_key, events in list(self.subscribers):
+            if sub_project != project_key:
+                continue
+            flag = self.flags.get(project_key, {}).get(flag_key)
+            if flag is None or env_key not in flag["environments"]:
+                events.put(
+                    (
+                        "delete",
+                        {"path": "/flags/" + flag_key, "version": deleted_version or 0},
+                    )
+                )
+            else:
+                events.put(
+                    (
+                        "patch",
+                        {
+                            "path": "/flags/" + flag_key,
+                            "data": self._sdk_flag(flag, env_key),
+                        },
+                    )
+                )
+
+    def _publish_segment(self, project_key, env_key, segment_key, deleted_version=None):
+        segment = self.segments.get((project_key, env_key), {}).get(segment_key)
+        for sub_project, sub_env, events in list(self.subscribers):
+            if (sub_project, sub_env) != (project_key, env_key):
+                continue
+            if segment is None:
+                events.put(
+                    (
+                        "delete",
+                        {
+                            "path": "/segments/" + segment_key,
+                            "version": deleted_version or 0,
+                        },
+                    )
+                )
+            else:
+                events.put(
+                    (
+                        "patch",
+                        {
+                            "path": "/segments/" + segment_key,
+                            "data": self._sdk_segment(segment),
+                        },
+                    )
+                )
+
+    # Projects and environments
+
+    def _project(self, project_key):
+        project = self.projects.get(project_key)
+        if project is None:
+            raise _not_found()
+        return project
+
+    def list_projects(self, query):
+        return {"_links": {}, "items": list(self.projects.values())}
+
+    def create_project(self, body):
+        key = body.get("key")
+        if not key or not body.get("name"):
+            raise ApiError(400, "invalid_request", "name and key are required")
+        if key in self.projects:
+            raise ApiError(409, "conflict", "Project with key %s already exists" % key)
+        environments = body.get("environments") or [
+            dict(key=k, name=n) for k, n in DEFAULT_ENVIRONMENTS
+        ]
+        project = {
+            "_links": {},
+            "_id": uuid.uuid4().hex,
+            "key": key,
+            "name": body["name"],
+            "includeInSnippetByDefault": bool(body.get("includeInSnippetByDefault")),
+            "environments": [self._environment(key, e) for e in environments],
+            "tags": body.get("tags") or [],
+            "defaultClientSideAvailability": body.get("defaultClientSideAvailability")
+            or {"usingEnvironmentId": False, "usingMobileKey": True},
+        }
+        self.projects[key] = project
+        self.flags[key] = {}
+        for env in project["environments"]:
+            self.segments[(key, env["key"])] = {}
+        return 201, project
+
+    def patch_project(self, project_key, body):
+        project = self._project(project_key)
+        patched = apply_patch(project, _patch_operations(body))
+        patched["key"] = project_key
+        self.projects[project_key] = patched
+        return patched
+
+    def delete_project(self, project_key):
+        self._project(project_key)
+        del self.projects[project_key]
+        self.flags.pop(project_key, None)
+        for key in [k for k in self.segments if k[0] == project_key]:
+            del self.segments[key]
+
+    def _env(self, project_key, env_key):
+        for env in self._project(project_key)["environments"]:
+            if env["key"] == env_key:
+                return env
+        raise _not_found()
+
+    def create_environment(self, project_key, body):
+        project = self._project(project_key)
+        if not body.get("key") or not body.get("name") or not body.get("color"):
+            raise ApiError(400, "invalid_request", "name, key and color are required")
+        if any(e["key"] == body["key"] for e in project["environments"]):
+            raise ApiError(
+                409, "conflict", "Environment with key %s already exists" % body["key"]
+            )
+        env = self._environment(project_key, body)
+        project["environments"].append(env)
+        self.segments[(project_key, env["key"])] = {}
+        for flag in self.flags[project_key].values():
+            flag["environments"][env["key"]] = self._flag_config(flag, env)
+        return 201, env
+
+    def patch_environment(self, project_key, env_key, body):
+        env = self._env(project_key, env_key)
+        patched = apply_patch(env, _patch_operations(body))
+        env.clear()
+        env.update(patched)
+        return env
+
+    def delete_environment(self, project_key, env_key):
+        project = self._project(project_key)
+        self._env(project_key, env_key)
+        project["environments"] = [
+            e for e in project["environments"] if e["key"] != env_key
+        ]
+        self.segments.pop((project_key, env_key), None)
+        for flag in self.flags[project_key].values():
+            flag["environments"].pop(env_key, None)
+
+    # Flags
+
+    def _flag(self, project_key, flag_key):
+        self._project(project_key)
+        flag = self.flags[project_key].get(flag_key)
+        if flag is None:
+            raise _not_found()
+        return flag
+
+    def _flag_view(self, flag, query):
+        envs = query.get("env")
+        if not envs:
+            return flag
+        view = dict(flag)
+        view["environments"] = dict(
+            (k, v) for k, v in flag["environments"].items() if k in envs
+        )
+        return view
+
+    def list_flags(self, project_key, query):
+        self._project(project_key)
+        flags = list(self.flags[project_key].values())
+        tags = set(t for tag in query.get("tag", []) for t in tag.split(","))
+        if tags:
+            flags = [f for f in flags if tags.intersection(f["tags"])]
+        archived = query.get("archived", [None])[0]
+        if archived not in (None, "true", "1"):
+            flags = [f for f in flags if not f["archived"]]
+        total = len(flags)
+        offset = int(query.get("offset", [0])[0])
+        limit = query.get("limit")
+        end = offset + int(limit[0]) if limit else None
+        return {
+            "_links": {},
+            "items": [self._flag_view(f, query) for f in flags[offset:end]],
+            "totalCount": total,
+        }
+
+    def create_flag(self, project_key, body, query=None):
+        project = self._project(project_key)
+        key = body.get("key")
+        if not key or not body.get("name"):
+            raise ApiError(400, "invalid_request", "name and key are required")
+        if key in self.flags[project_key]:
+            raise ApiError(409, "conflict", "Flag with key %s already exists" % key)
+        variations = body.get("variations") or [{"value": True}, {"value": False}]
+        variations = [
+            dict(
+                {"_id": uuid.uuid4().hex},
+                **dict((k, v) for k, v in x.items() if k != "_id")
+            )
+            for x in variations
+        ]
+        values = [v.get("value") for v in variations]
+        flag = {
+            "key": key,
+            "name": body["name"],
+            "description": body.get("description") or "",
+            "kind": (
+                "boolean"
+                if all(isinstance(v, bool) for v in values)
+                else "multivariate"
+            ),
+            "creationDate": _now(),
+            "includeInSnippet": bool(body.get("includeInSnippet")),
+            "temporary": body.get("temporary", True),
+            "maintainerId": uuid.uuid4().hex[:24],
+            "tags": body.get("tags") or [],
+            "variations": variations,
+            "goalIds": [],
+            "_version": 1,
+            "customProperties": {},
+            "_links": {},
+            "environments": {},
+            "archived": False,
+            "clientSideAvailability": body.get("clientSideAvailability")
+            or {"usingEnvironmentId": False, "usingMobileKey": True},
+            "defaults": body.get("defaults"),
+        }
+        for env in project["environments"]:
+            flag["environments"][env["key"]] = self._flag_config(flag, env)
+        self.flags[project_key][key] = flag
+        self._publish_flag(project_key, key)
+        return 201, flag
+
+    def patch_flag(self, project_key, flag_key, body):
+        flag = self._flag(project_key, flag_key)
+        patched = apply_patch(flag, _patch_operations(body))
+        if patched == flag:
+            return flag
+        patched["key"] = flag_key
+        patched["_version"] = flag["_version"] + 1
+        for env_key, config in patched.get("environments", {}).items():
+            if config != flag["environments"].get(env_key):
+                config["version"] = config.get("version", 0) + 1
+                config["lastModified"] = _now()
+        self.flags[project_key][flag_key] = patched
+        self._publish_flag(project_key, flag_key)
+        return patched
+
+    def delete_flag(self, project_key, flag_key):
+        flag = self._flag(project_key, flag_key)
+        del self.flags[project_key][flag_key]
+        self._publish_flag(project_key, flag_key, flag["_version"] + 1)
+
+    def copy_flag(self, project_key, flag_key, body):
+        flag = self._flag(project_key, flag_key)
+        source = (body.get("source") or {}).get("key")
+        target = (body.get("target") or {}).get("key")
+        if source not in flag["environments"] or target not in flag["environments"]:
+            raise ApiError(
+                400, "invalid_request", "Unknown source or target environment"
+            )
+        copied = copy.deepcopy(flag["environments"][source])
+        fields = (
+            "on",
+            "targets",
+            "rules",
+            "fallthrough",
+            "offVariation",
+            "prerequisites",
+        )
+        included = body.get("includedActions")
+        excluded = body.get("excludedActions") or []
+        operations = [
+            dict(
+                op="replace", path="/environments/%s/%s" % (target, f), value=copied[f]
+            )
+            for f in fields
+            if (not included or f in included) and f not in excluded
+        ]
+        return self.patch_flag(project_key, flag_key, operations)
+
+    # Segments
+
+    def _segments(self, project_key, env_key):
+        self._env(project_key, env_key)
+        return self.segments[(project_key, env_key)]
+
+    def _segment(self, project_key, env_key, key):
+        segment = self._segments(project_key, env_key).get(key)
+        if segment is None:
+            raise _not_found()
+        return segment
+
+    def list_segments(self, project_key, env_key, query):
+        return {
+            "_links": {},
+            "items": list(self._segments(project_key, env_key).values()),
+        }
+
+    def create_segment(self, project_key, env_key, body):
+        segments = self._segments(project_key, env_key)
+        key = body.get("key")
+        if not key or not body.get("name"):
+            raise ApiError(400, "invalid_request", "name and key are required")
+        if key in segments:
+            raise ApiError(409, "conflict", "Segment with key %s already exists" % key)
+        segment = {
+            "key": key,
+            "name": body["name"],
+            "description": body.get("description") or "",
+            "tags": body.get("tags") or [],
+            "creationDate": _now(),
+            "included": [],
+            "excluded": [],
+            "rules": [],
+            "unbounded": bool(body.get("unbounded")),
+            "version": 1,
+            "_links": {},
+            "_flags": [],
+            "_salt": uuid.uuid4().hex,
+        }
+        segments[key] = segment
+        self._publish_segment(project_key, env_key, key)
+        return 201, segment
+
+    def patch_segment(self, project_key, env_key, key, body):
+        segment = self._segment(project_key, env_key, key)
+        patched = apply_patch(segment, _patch_operations(body))
+        if patched != segment:
+            patched["key"] = key
+            patched["version"] = segment["version"] + 1
+            self.segments[(project_key, env_key)][key] = patched
+            self._publish_segment(project_key, env_key, key)
+        return patched
+
+    def delete_segment(self, project_key, env_key, key):
+        segment = self._segment(project_key, env_key, key)
+        del self.segments[(project_key, env_key)][key]
+        self._publish_segment(project_key, env_key, key, segment["version"] + 1)
+
+    # Webhooks and custom roles
+
+    def _by_key(self, collection, key):
+        item = collection.get(key)
+        if item is None:
+            raise _not_found()
+        return item
+
+    def create_webhook(self, body):
+        if not body.get("url"):
+            raise ApiError(400, "invalid_request", "url is required")
+        webhook = {
+            "_links": {},
+            "_id": uuid.uuid4().hex,
+            "url": body["url"],
+            "secret": body.get("secret")
+            or (uuid.uuid4().hex if body.get("sign") else None),
+            "on": body.get("on", True),
+            "name": body.get("name"),
+            "statements": body.get("statements") or [],
+            "tags": body.get("tags") or [],
+        }
+        self.webhooks[webhook["_id"]] = webhook
+        return 201, webhook
+
+    def create_role(self, body):
+        key = body.get("key")
+        if not key or not body.get("name") or body.get("policy") is None:
+            raise ApiError(400, "invalid_request", "name, key and policy are required")
+        if key in self.roles:
+            raise ApiError(409, "conflict", "Role with key %s already exists" % key)
+        role = {
+            "_links": {},
+            "_id": uuid.uuid4().hex,
+            "key": key,
+            "name": body["name"],
+            "description": body.get("description") or "",
+            "policy": body["policy"],
+        }
+        self.roles[key] = role
+        return 201, role
+
+    def patch_item(self, collection, key, body, fixed):
+        item = self._by_key(collection, key)
+        patched = apply_patch(item, _patch_operations(body))
+        patched[fixed] = item[fixed]
+        collection[key] = patched
+        return patched
+
+    def delete_item(self, collection, key):
+        self._by_key(collection, key)
+        del collection[key]
+
+    # Synthetic data
+
+    def seed(self, project_key, flags=10, segments=5, environments=None, seed=0):
+        # Creates a project with flags and segments that exercise targets,
+        # rules, rollouts, prerequisites and segment matches.
+        rand = random.Random(seed)
+        environments = environments or [k for k, _ in DEFAULT_ENVIRONMENTS]
+        with self.lock:
+            if project_key in self.projects:
+                self.delete_project(project_key)
+            self.create_project(
+                dict(
+                    key=project_key,
+                    name=project_key,
+                    environments=[dict(key=e, name=e.title()) for e in environments],
+                )
+            )
+            for env in environments:
+                for i in range(segments):
+                    _, segment = self.create_segment(
+                        project_key,
+                        env,
+                        dict(key="segment-%d" % i, name="Segment %d" % i),
+                    )
+                    segment["included"] = [
+                        "user-%d" % rand.randrange(1000) for _ in range(5)
+                    ]
+                    segment["rules"] = [
+                        dict(
+                            clauses=[
+                                dict(
+                                    attribute="email",
+                                    op="endsWith",
+                                    values=["@example%d.com" % i],
+                                    negate=False,
+                                )
+                            ],
+                            weight=rand.choice([None, 50000]),
+                        )
+                    ]
+            for i in range(flags):
+                self._seed_flag(project_key, "flag-%05d" % i, i, segments, rand)
+        return self.projects[project_key]
+
+    def _seed_flag(self, project_key, key, index, segments, rand):
+        if index % 3:
+            variations = [{"value": True}, {"value": False}]
+        else:
+            variations = [
+                {"value": "v%d" % n, "name": "Variation %d" % n} for n in range(3)
+            ]
+        _, flag = self.create_flag(
+            project_key,
+            dict(
+                key=key,
+                name="Flag %d" % index,
+                description="Synthetic flag %d" % index,
+                tags=[rand.choice(["ops", "release", "experiment", "test"])],
+                variations=variations,
+            ),
+        )
+        count = len(variations)
+        for config in flag["environments"].values():
+            config["on"] = rand.random() < 0.8
+            config["targets"] = [
+                dict(
+                    values=["user-%d" % rand.randrange(1000) for _ in range(3)],
+                    variation=rand.randrange(count),
+                )
+            ]
+            rules = []
+            for n in range(rand.randint(0, 3)):
+                clauses = [
+                    rand.choice(
+                        [
+                            dict(
+                                attribute="country",
+                                op="in",
+                                values=["us", "ca"],
+                                negate=False,
+                            ),
+                            dict(
+                                attribute="email",
+                                op="endsWith",
+                                values=["@example.com"],
+                                negate=False,
+                            ),
+                            dict(
+                                attribute="version",
+                                op="semVerGreaterThan",
+                                values=["2.0.0"],
+                                negate=False,
+                            ),
+                            dict(
+                                attribute="plan",
+                                op="matches",
+                                values=["^pro"],
+                                negate=True,
+                            ),
+                        ]
+                    )
+                ]
+                if segments and rand.random() < 0.3:
+                    clauses.append(
+                        dict(
+                            attribute="segmentMatch",
+                            op="segmentMatch",
+                            values=["segment-%d" % rand.randrange(segments)],
+                            negate=False,
+                        )
+                    )
+                rule = dict(_id=uuid.uuid4().hex, clauses=clauses, trackEvents=False)
+                if rand.random() < 0.5:
+                    rule["variation"] = rand.randrange(count)
+                else:
+                    rule["rollout"] = dict(
+                        variations=[
+                            dict(
+                                variation=v,
+                                weight=100000 // count + (v < 100000 % count),
+                            )
+                            for v in range(count)
+                        ]
+                    )
+                rules.append(rule)
+            config["rules"] = rules
+            if index and rand.random() < 0.1:
+                config["prerequisites"] = [
+                    dict(key="flag-%05d" % rand.randrange(index), variation=0)
+                ]
+
+
+# Routes: (method, pattern, handler name). Patterns are matched against the
+# path after /api/v2.
+ROUTES = [
+    ("GET", r"/projects", "get_projects"),
+    ("POST", r"/projects", "post_projects"),
+    ("GET", r"/projects/([^/]+)", "get_project"),
+    ("PATCH", r"/projects/([^/]+)", "patch_project"),
+    ("DELETE", r"/projects/([^/]+)", "delete_project"),
+    ("POST", r"/projects/([^/]+)/environments", "post_environment"),
+    ("GET", r"/projects/([^/]+)/environments/([^/]+)", "get_environment"),
+    ("PATCH", r"/projects/([^/]+)/environments/([^/]+)", "patch_environment"),
+    ("DELETE", r"/projects/([^/]+)/environments/([^/]+)", "delete_environment"),
+    ("GET", r"/flags/([^/]+)", "get_flags"),
+    ("POST", r"/flags/([^/]+)", "post_flag"),
+    ("GET", r"/flags/([^/]+)/([^/]+)", "get_flag"),
+    ("PATCH", r"/flags/([^/]+)/([^/]+)", "patch_flag"),
+    ("DELETE", r"/flags/([^/]+)/([^/]+)", "delete_flag"),
+    ("POST", r"/flags/([^/]+)/([^/]+)/copy", "copy_flag"),
+    ("GET", r"/segments/([^/]+)/([^/]+)", "get_segments"),
+    ("POST", r"/segments/([^/]+)/([^/]+)", "post_segment"),
+    ("GET", r"/segments/([^/]+)/([^/]+)/([^/]+)", "get_segment"),
+    ("PATCH", r"/segments/([^/]+)/([^/]+)/([^/]+)", "patch_segment"),
+    ("DELETE", r"/segments/([^/]+)/([^/]+)/([^/]+)", "delete_segment"),
+    ("GET", r"/webhooks", "get_webhooks"),
+    ("POST", r"/webhooks", "post_webhook"),
+    ("GET", r"/webhooks/([^/]+)", "get_webhook"),
+    ("PATCH", r"/webhooks/([^/]+)", "patch_webhook"),
+    ("DELETE", r"/webhooks/([^/]+)", "delete_webhook"),
+    ("GET", r"/roles", "get_roles"),
+    ("POST", r"/roles", "post_role"),
+    ("GET", r"/roles/([^/]+)", "get_role"),
+    ("PATCH", r"/roles/([^/]+)", "patch_role"),
+    ("DELETE", r"/roles/([^/]+)", "delete_role"),
+]
+ROUTES = [(m, re.compile("^" + p + "$"), h, p) for m, p, h in ROUTES]
+
+
+class _Api(object):
+    # Maps routes to MockLaunchDarkly calls. Handlers return (status, body).
+    def __init__(self, ld):
+        self.ld = ld
+
+    def get_projects(self, q, b):
+        return 200, self.ld.list_projects(q)
+
+    def post_projects(self, q, b):
+        return self.ld.create_project(b)
+
+    def get_project(self, q, b, p):
+        return 200, self.ld._project(p)
+
+    def patch_project(self, q, b, p):
+        return 200, self.ld.patch_project(p, b)
+
+    def delete_project(self, q, b, p):
+        self.ld.delete_project(p)
+        return 204, None
+
+    def post_environment(self, q, b, p):
+        return self.ld.create_environment(p, b)
+
+    def get_environment(self, q, b, p, e):
+        return 200, self.ld._env(p, e)
+
+    def patch_environment(self, q, b, p, e):
+        return 200, self.ld.patch_environment(p, e, b)
+
+    def delete_environment(self, q, b, p, e):
+        self.ld.delete_environment(p, e)
+        return 204, None
+
+    def get_flags(self, q, b, p):
+        return 200, self.ld.list_flags(p, q)
+
+    def post_flag(self, q, b, p):
+        return self.ld.create_flag(p, b, q)
+
+    def get_flag(self, q, b, p, f):
+        return 200, self.ld._flag_view(self.ld._flag(p, f), q)
+
+    def patch_flag(self, q, b, p, f):
+        return 200, self.ld.patch_flag(p, f, b)
+
+    def delete_flag(self, q, b, p, f):
+        self.ld.delete_flag(p, f)
+        return 204, None
+
+    def copy_flag(self, q, b, p, f):
+        return 201, self.ld.copy_flag(p, f, b)
+
+    def get_segments(self, q, b, p, e):
+        return 200, self.ld.list_segments(p, e, q)
+
+    def post_segment(self, q, b, p, e):
+        return self.ld.create_segment(p, e, b)
+
+    def get_segment(self, q, b, p, e, s):
+        return 200, self.ld._segment(p, e, s)
+
+    def patch_segment(self, q, b, p, e, s):
+        return 200, self.ld.patch_segment(p, e, s, b)
+
+    def delete_segment(self, q, b, p, e, s):
+        self.ld.delete_segment(p, e, s)
+        return 204, None
+
+    def get_webhooks(self, q, b):
+        return 200, {"_links": {}, "items": list(self.ld.webhooks.values())}
+
+    def post_webhook(self, q, b):
+        return self.ld.create_webhook(b)
+
+    def get_webhook(self, q, b, w):
+        return 200, self.ld._by_key(self.ld.webhooks, w)
+
+    def patch_webhook(self, q, b, w):
+        return 200, self.ld.patch_item(self.ld.webhooks, w, b, "_id")
+
+    def delete_webhook(self, q, b, w):
+        self.ld.delete_item(self.ld.webhooks, w)
+        return 204, None
+
+    def get_roles(self, q, b):
+        return 200, {"_links": {}, "items": list(self.ld.roles.values())}
+
+    def post_role(self, q, b):
+        return self.ld.create_role(b)
+
+    def get_role(self, q, b, r):
+        return 200, self.ld._by_key(self.ld.roles, r)
+
+    def patch_role(self, q, b, r):
+        return 200, self.ld.patch_item(self.ld.roles, r, b, "key")
+
+    def delete_role(self, q, b, r):
+        self.ld.delete_item(self.ld.roles, r)
+        return 204, None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    heartbeat = 15
+
+    def log_message(self, *args):
+        pass
+
+    def _write(self, status, payload, headers):
+        # Compresses the body when the client accepts gzip, and paces it to
+        # the configured bandwidth. Returns the number of bytes sent.
+        headers = dict(headers)
+        accept = self.headers.get("Accept-Encoding") or ""
+        if len(payload) > 1024 and "gzip" in accept:
+            payload = _gzip(payload)
+            headers["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        bandwidth = self.server.ld.bandwidth
+        if bandwidth:
+            time.sleep(len(payload) / float(bandwidth))
+        self.wfile.write(payload)
+        return len(payload)
+
+    def _send(self, status, body=None, headers=None, route=None):
+        payload = b"" if body is None else json.dumps(body).encode("utf-8")
+        size = self._write(status, payload, headers or {})
+        self.server.ld._count(route or self.path, size)
+
+    def _error(self, e, route=None):
+        self._send(e.status, {"code": e.code, "message": e.message}, route=route)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return None
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except ValueError:
+            raise ApiError(400, "invalid_request", "Invalid JSON body")
+
+    def _handle(self, method):
+        ld = self.server.ld
+        if ld.latency:
+            time.sleep(ld.latency)
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        try:
+            body = self._body()
+            if url.path == "/sdk/latest-all":
+                return self._sdk_latest_all()
+            if url.path == "/all":
+                return self._stream()
+            if not url.path.startswith("/api/v2/"):
+                raise _not_found()
+            path = url.path[len("/api/v2") :]
+            if not self.headers.get("Authorization"):
+                raise ApiError(401, "unauthorized", "Invalid account ID header")
+            for route_method, pattern, handler, template in ROUTES:
+                match = pattern.match(path)
+                if route_method != method or match is None:
+                    continue
+                route = "%s %s" % (method, template)
+                if ld._rate_limited():
+                    reset = _now() + ld.rate_limit_reset
+                    return self._send(
+                        429,
+                        {"code": "rate_limited", "message": "Rate limit exceeded"},
+                        {
+                            "X-RateLimit-Reset": str(reset),
+                            "Retry-After": str(max(ld.rate_limit_reset // 1000, 1)),
+                        },
+                        route=route,
+                    )
+                args = [unquote(g) for g in match.groups()]
+                with ld.lock:
+                    status, result = getattr(_Api(ld), handler)(query, body, *args)
+                return self._send(status, result, route=route)
+            raise ApiError(405 if path else 404, "not_found", "Unknown resource")
+        except ApiError as e:
+            self._error(e)
+
+    def _sdk_latest_all(self):
+        data = self.server.ld.sdk_data(self.headers.get("Authorization"))
+        payload = json.dumps(data, sort_keys=True).encode("utf-8")
+        etag = '"%s"' % hashlib.sha1(payload).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            self.server.ld._count("GET /sdk/latest-all", 0)
+            return
+        size = self._write(200, payload, {"ETag": etag})
+        self.server.ld._count("GET /sdk/latest-all", size)
+
+    def _stream(self):
+        ld = self.server.ld
+        events, data = ld.subscribe(self.headers.get("Authorization"))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        ld._count("GET /all", 0)
+        try:
+            self._event("put", {"path": "/", "data": data})
+            while not self.server.stopping:
+                try:
+                    event, message = events.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    self.wfile.write(b":\n\n")
+                    self.wfile.flush()
+                    continue
+                self._event(event, message)
+        except (IOError, OSError):
+            pass
+        finally:
+            ld.unsubscribe(events)
+
+    def _event(self, event, message):
+        self.wfile.write(
+            ("event: %s\ndata: %s\n\n" % (event, json.dumps(message))).encode("utf-8")
+        )
+        self.wfile.flush()
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class MockServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Room for the connections opened at once by concurrent clients.
+    request_queue_size = 128
+
+    def __init__(self, address, ld):
+        HTTPServer.__init__(self, address, _Handler)
+        self.ld = ld
+        self.stopping = False
+
+    @property
+    def uri(self):
+        return "http://%s:%d" % self.server_address[:2]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.stopping = True
+        self.shutdown()
+        self.server_close()
+
+
+def serve(port=0, host="127.0.0.1", **options):
+    return MockServer((host, port), MockLaunchDarkly(**options)).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock LaunchDarkly API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--rate-limit-every",
+        type=int,
+        default=0,
+        help="answer every Nth API request with 429",
+    )
+    parser.add_argument("--rate-limit-reset-ms", type=int, default=1000)
+    parser.add_argument(
+        "--bandwidth-kbps",
+        type=float,
+        default=0,
+        help="limit responses to this many kilobytes per second",
+    )
+    parser.add_argument("--project", default="perf-project")
+    parser.add_argument("--flags", type=int, default=10)
+    parser.add_argument("--segments", type=int, default=5)
+    args = parser.parse_args()
+
+    ld = MockLaunchDarkly(
+        latency=args.latency_ms / 1000.0,
+        rate_limit_every=args.rate_limit_every,
+        rate_limit_reset=args.rate_limit_reset_ms,
+        bandwidth=args.bandwidth_kbps * 1000,
+    )
+    project = ld.seed(args.project, flags=args.flags, segments=args.segments)
+    server = MockServer((args.host, args.port), ld)
+    print("Serving %s on %s" % (args.project, server.uri))
+    for env in project["environments"]:
+        print("  %s SDK key: %s" % (env["key"], env["apiKey"]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
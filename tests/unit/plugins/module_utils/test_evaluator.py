@@ -0,0 +1,145 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+# Edge cases of the local evaluator, checked against the server-side SDK on
+# the same flag JSON where the SDK behaves the same way.
+
+import pytest
+
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.evaluator import (
+    Evaluator,
+)
+
+ldclient = pytest.importorskip("ldclient")
+
+from ldclient.impl.event_factory import _EventFactory
+
+try:
+    from ldclient.impl.evaluator import Evaluator as SdkEvaluator
+except ImportError:
+    # ldclient 6
+    from ldclient.flag import evaluate as sdk_evaluate
+
+    SdkEvaluator = None
+
+SDK_VERSION = tuple(int(p) for p in ldclient.VERSION.split(".")[:2])
+
+# ldclient 6 fails with MALFORMED_FLAG past the last bucket and buckets
+# booleans as strings. Later versions behave like the local evaluator.
+sdk7 = pytest.mark.skipif(SDK_VERSION < (7, 0), reason="needs ldclient 7")
+
+
+class _Store(object):
+    # The read-only store ldclient 6 evaluates against.
+    def __init__(self, flags, segments):
+        self.items = dict(features=flags, segments=segments)
+
+    def get(self, kind, key, callback=lambda x: x):
+        return callback(self.items[kind.namespace].get(key))
+
+
+def _flag(key="rollout-flag", rules=None, fallthrough=None):
+    return dict(
+        key=key,
+        version=1,
+        on=True,
+        salt="salt",
+        variations=["a", "b", "c"],
+        offVariation=2,
+        targets=[],
+        prerequisites=[],
+        rules=rules or [],
+        fallthrough=fallthrough or dict(variation=0),
+    )
+
+
+def _rollout(*weights, **kwargs):
+    variations = [dict(variation=i, weight=w) for i, w in enumerate(weights)]
+    return dict(rollout=dict(variations=variations, **kwargs))
+
+
+def _local(flag, user, segments=None):
+    return Evaluator({flag["key"]: flag}, segments).evaluate(flag["key"], user)
+
+
+def _sdk(flag, user, segments=None):
+    flags = {flag["key"]: flag}
+    segments = segments or {}
+    if SdkEvaluator is not None:
+        evaluator = SdkEvaluator(
+            flags.get, segments.get, lambda key: (None, "NOT_CONFIGURED")
+        )
+        detail = evaluator.evaluate(flag, user, _EventFactory(False)).detail
+    else:
+        detail = sdk_evaluate(
+            flag, user, _Store(flags, segments), _EventFactory(False)
+        ).detail
+    return detail.value, detail.variation_index, detail.reason
+
+
+def test_rollout_matches_sdk():
+    flag = _flag(fallthrough=_rollout(30000, 30000, 40000))
+    for i in range(200):
+        user = {"key": "user-%d" % i}
+        assert _local(flag, user) == _sdk(flag, user)
+
+
+def test_rollout_past_last_bucket_gets_last_variation():
+    # Weights add up to half, and user-0 buckets at 0.65.
+    flag = _flag(fallthrough=_rollout(25000, 25000))
+    assert _local(flag, {"key": "user-0"}) == ("b", 1, {"kind": "FALLTHROUGH"})
+
+
+@sdk7
+def test_rollout_past_last_bucket_matches_sdk():
+    flag = _flag(fallthrough=_rollout(25000, 25000))
+    for i in range(50):
+        user = {"key": "user-%d" % i}
+        assert _local(flag, user) == _sdk(flag, user)
+
+
+def test_bool_attribute_is_not_bucketed():
+    # "True" buckets at 0.35 for this flag, a bool buckets at 0.
+    flag = _flag(key="bool-flag", fallthrough=_rollout(30000, 70000, bucketBy="beta"))
+    assert _local(flag, {"key": "u", "custom": {"beta": "True"}})[1] == 1
+    assert _local(flag, {"key": "u", "custom": {"beta": True}})[1] == 0
+
+
+@sdk7
+def test_bool_attribute_matches_sdk():
+    flag = _flag(key="bool-flag", fallthrough=_rollout(30000, 70000, bucketBy="beta"))
+    for beta in [True, False, "True", 7]:
+        user = {"key": "u", "custom": {"beta": beta}}
+        assert _local(flag, user) == _sdk(flag, user)
+
+
+def test_clause_without_attribute_does_not_match():
+    # The SDK skips such clauses, which would make this rule match everyone.
+    rules = [
+        dict(
+            id="rule",
+            variation=1,
+            clauses=[
+                dict(attribute="country", op="in", values=["us"]),
+                dict(attribute=None, op="in", values=["x"]),
+            ],
+        )
+    ]
+    flag = _flag(rules=rules)
+    user = {"key": "u", "country": "us"}
+    assert _local(flag, user) == ("a", 0, {"kind": "FALLTHROUGH"})
+
+
+def test_segment_match_without_attribute():
+    segments = {"beta": dict(key="beta", included=["in"], excluded=[], rules=[])}
+    rules = [
+        dict(
+            id="rule",
+            variation=1,
+            clauses=[dict(attribute=None, op="segmentMatch", values=["beta"])],
+        )
+    ]
+    flag = _flag(rules=rules)
+    assert _local(flag, {"key": "in"}, segments)[1] == 1
+    assert _local(flag, {"key": "out"}, segments)[1] == 0
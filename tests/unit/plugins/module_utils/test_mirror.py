@@ -0,0 +1,176 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+# Stream events applied to the mirror store, read from the /all route of the
+# mock server in tests/perf.
+
+import io
+import json
+import os
+import sys
+
+import pytest
+
+from ansible.module_utils.six.moves.urllib.request import Request, urlopen
+
+from ansible_collections.launchdarkly_labs.collection.plugins.module_utils.mirror import (
+    FlagStore,
+    sse_events,
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "perf"))
+
+from mock_server import MockLaunchDarkly, MockServer
+
+
+class _Mock(object):
+    def __init__(self):
+        self.ld = MockLaunchDarkly()
+        project = self.ld.seed("mirror", flags=3, segments=2)
+        self.sdk_key = project["environments"][0]["apiKey"]
+        self.server = MockServer(("127.0.0.1", 0), self.ld).start()
+
+    def stream(self):
+        request = Request(
+            self.server.uri + "/all",
+            headers={"Authorization": self.sdk_key, "Accept": "text/event-stream"},
+        )
+        resp = urlopen(request, timeout=10)
+        return resp, sse_events(resp)
+
+    def sdk_data(self):
+        return self.ld.sdk_data(self.sdk_key)
+
+
+@pytest.fixture
+def mock():
+    mock = _Mock()
+    yield mock
+    mock.server.stop()
+
+
+def _store(tmp_path):
+    return FlagStore(str(tmp_path / "flags.json"))
+
+
+def _toggle(ld, flag_key):
+    on = ld.flags["mirror"][flag_key]["environments"]["production"]["on"]
+    ld.patch_flag(
+        "mirror",
+        flag_key,
+        [dict(op="replace", path="/environments/production/on", value=not on)],
+    )
+
+
+def test_sse_events():
+    fp = io.BytesIO(
+        b": comment\n\n"
+        b'event: put\ndata: {"a":\ndata: 1}\n\n'
+        b"data:no-space\r\n\r\n"
+        b"event: patch\ndata: {}"
+    )
+    assert list(sse_events(fp)) == [
+        ("put", '{"a":\n1}'),
+        ("message", "no-space"),
+        ("patch", "{}"),
+    ]
+
+
+def test_stale_patch_is_ignored(mock, tmp_path):
+    store = _store(tmp_path)
+    resp, events = mock.stream()
+    try:
+        assert store.apply(*next(events))
+        assert store.counts() == {"flags": 3, "segments": 2}
+        flag_key = sorted(store.data["flags"])[0]
+        old = store.data["flags"][flag_key]
+
+        _toggle(mock.ld, flag_key)
+        event, data = next(events)
+        assert event == "patch"
+        assert store.apply(event, data)
+        new = store.data["flags"][flag_key]
+        assert new["version"] > old["version"]
+        assert new["on"] is not old["on"]
+
+        # A replayed older version and a repeat of the current one are no-ops.
+        stale = json.dumps({"path": "/flags/" + flag_key, "data": old})
+        assert not store.apply("patch", stale)
+        assert not store.apply(event, data)
+        assert store.data["flags"][flag_key] == new
+    finally:
+        resp.close()
+
+
+def test_delete_then_older_patch_stays_deleted(mock, tmp_path):
+    store = _store(tmp_path)
+    resp, events = mock.stream()
+    try:
+        store.apply(*next(events))
+        flag_key = sorted(store.data["flags"])[0]
+        old = store.data["flags"][flag_key]
+
+        mock.ld.delete_flag("mirror", flag_key)
+        event, data = next(events)
+        assert event == "delete"
+        assert store.apply(event, data)
+        assert flag_key not in store.data["flags"]
+
+        stale = json.dumps({"path": "/flags/" + flag_key, "data": old})
+        assert not store.apply("patch", stale)
+        assert flag_key not in store.data["flags"]
+
+        # A newer version brings it back.
+        newer = dict(old, version=json.loads(data)["version"] + 1)
+        assert store.apply(
+            "patch", json.dumps({"path": "/flags/" + flag_key, "data": newer})
+        )
+        assert store.data["flags"][flag_key] == newer
+    finally:
+        resp.close()
+
+
+def test_put_replaces_store_after_delete(mock, tmp_path):
+    store = _store(tmp_path)
+    resp, events = mock.stream()
+    try:
+        put = next(events)
+        store.apply(*put)
+        flag_key = sorted(store.data["flags"])[0]
+
+        mock.ld.delete_flag("mirror", flag_key)
+        store.apply(*next(events))
+        assert flag_key not in store.data["flags"]
+    finally:
+        resp.close()
+
+    # A put is the full state, so it wins over remembered deletes even when
+    # its items are older.
+    assert store.apply(*put)
+    assert flag_key in store.data["flags"]
+    assert store.deleted == {"flags": {}, "segments": {}}
+
+
+def test_reconnect_put_resyncs(mock, tmp_path):
+    store = _store(tmp_path)
+    resp, events = mock.stream()
+    try:
+        store.apply(*next(events))
+    finally:
+        resp.close()
+
+    # Changes made while disconnected arrive in the put of the next stream.
+    flag_keys = sorted(store.data["flags"])
+    mock.ld.delete_flag("mirror", flag_keys[0])
+    _toggle(mock.ld, flag_keys[1])
+
+    resp, events = mock.stream()
+    try:
+        event, data = next(events)
+        assert event == "put"
+        assert store.apply(event, data)
+        assert store.data == mock.sdk_data()
+        assert not store.apply(event, data)
+    finally:
+        resp.close()